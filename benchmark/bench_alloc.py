@@ -0,0 +1,147 @@
+# 事件处理内存分配统计:稳定运行时 bt_hfp_demo 处理 HFP 状态指示事件(回调入队、取出、分发、处理函数)过程中的堆分配次数,
+# 回调直接把固件创建的 args 元组入队,之后的处理不应再分配内存:分配次数必须为 0,否则以非 0 状态退出
+#
+# CPython 与 MicroPython 的内存管理差别较大:CPython 中大于 256 的整数也是堆对象,元组、列表从空闲链表复用时 tracemalloc 看不到,
+# 因此这里不统计 CPython 实际的分配,而是跟踪示例程序模块中执行的每条字节码,按 MicroPython 会在堆上创建对象的操作计数:
+#   构造元组/列表/字典/集合/切片/字符串(BUILD_*、FORMAT_VALUE)、创建函数和闭包、f(*args) 调用、
+#   调用带 *args/**kwargs 的函数时打包参数、创建类实例、调用 bytes/tuple/list 等构造函数、调用 str.format 等返回新对象的方法
+# 小整数运算、for i in range(...) 在 MicroPython 上不分配堆内存,不计数;回调的 args 元组由固件创建,不在统计范围内
+# 在设备上可以用 micropython.heap_lock() 包住同样的循环验证,期间任何堆分配都会抛出 MemoryError
+# 运行方式(CPython): python benchmark/bench_alloc.py
+
+import dis
+import os
+import sys
+
+import common
+
+import bt_hfp_demo
+
+BT_EVENT = bt_hfp_demo.BT_EVENT
+ADDR = b'\x11\x22\x33\x44\x55\x66'
+IND_EVENTS = (
+    'BT_HFP_CALL_SETUP_IND',
+    'BT_HFP_CALLHELD_IND',
+    'BT_HFP_NETWORK_IND',
+    'BT_HFP_NETWORK_SIGNAL_IND',
+    'BT_HFP_BATTERY_IND',
+    'BT_HFP_AUDIO_IND',
+    'BT_HFP_VOLUME_IND',
+    'BT_HFP_NETWORK_TYPE',
+    'BT_HFP_CODEC_IND',
+)
+ROUNDS = 200
+
+ALLOC_OPS = ('BUILD_TUPLE', 'BUILD_LIST', 'BUILD_MAP', 'BUILD_CONST_KEY_MAP', 'BUILD_SET', 'BUILD_SLICE',
+             'BUILD_STRING', 'FORMAT_VALUE', 'MAKE_FUNCTION', 'LIST_TO_TUPLE', 'CALL_FUNCTION_EX')
+ALLOC_CALLS = ('bytes', 'bytearray', 'tuple', 'list', 'dict', 'set', 'str', 'memoryview')
+ALLOC_METHODS = ('format', 'join', 'encode', 'decode', 'hex', 'copy', 'split', 'replace', 'strip',
+                 'items', 'keys', 'values')
+CO_VARARGS = 0x04
+CO_VARKEYWORDS = 0x08
+
+
+class AllocCounter(object):
+    # 只统计示例程序目录下模块中的分配,benchmark 和桌面端替身模块(对应设备上的 native 模块)不计入
+    def __init__(self):
+        self._root = os.path.dirname(common.BENCH_DIR) + os.sep
+        self._sites = {}  # code -> {字节码偏移: 分配类型}
+        self.counts = {}  # (文件:行号, 分配类型) -> 次数
+
+    def _ours(self, code):
+        name = code.co_filename
+        return name.startswith(self._root) and not name.startswith(common.BENCH_DIR)
+
+    def _code_sites(self, code):
+        sites = self._sites.get(code)
+        if sites is None:
+            sites = {}
+            for ins in dis.get_instructions(code):
+                if ins.opname in ALLOC_OPS:
+                    sites[ins.offset] = ins.opname
+                elif ins.opname == 'LOAD_GLOBAL' and ins.arg & 1 and ins.argval in ALLOC_CALLS:
+                    # 3.11 中 LOAD_GLOBAL 的最低位表示随后调用该对象
+                    sites[ins.offset] = ins.argval + '()'
+            self._sites[code] = sites
+        return sites
+
+    def _count(self, frame, kind):
+        key = ('{}:{}'.format(os.path.basename(frame.f_code.co_filename), frame.f_lineno), kind)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _trace(self, frame, event, arg):
+        code = frame.f_code
+        if not self._ours(code):
+            return None
+        if event == 'call':
+            frame.f_trace_opcodes = True
+            if code.co_name == '__init__':
+                self._count(frame, 'instance')
+            # *args/**kwargs 紧跟在普通参数之后;没有额外参数时 MicroPython 使用空元组常量,不分配
+            index = code.co_argcount + code.co_kwonlyargcount
+            if code.co_flags & CO_VARARGS:
+                if frame.f_locals[code.co_varnames[index]]:
+                    self._count(frame, '*args')
+                index += 1
+            if code.co_flags & CO_VARKEYWORDS and frame.f_locals[code.co_varnames[index]]:
+                self._count(frame, '**kwargs')
+        elif event == 'opcode':
+            kind = self._code_sites(code).get(frame.f_lasti)
+            if kind is not None:
+                self._count(frame, kind)
+        return self._trace
+
+    def _profile(self, frame, event, arg):
+        if event == 'c_call' and self._ours(frame.f_code) and arg.__name__ in ALLOC_METHODS:
+            self._count(frame, arg.__name__ + '()')
+
+    def __enter__(self):
+        sys.setprofile(self._profile)
+        sys.settrace(self._trace)
+        return self
+
+    def __exit__(self, *exc):
+        sys.settrace(None)
+        sys.setprofile(None)
+
+    def total(self):
+        return sum(self.counts.values())
+
+
+def step(dispatcher, args):
+    # 与 bt_event_proc_task 中处理一个事件的流程相同,回调先把事件放入队列
+    bt_hfp_demo.bt_callback(args)
+    bt_hfp_demo.log.debug('wait msg...')
+    msg = bt_hfp_demo.msg_queue.get()
+    dispatcher.dispatch(msg, bt_hfp_demo.msg_queue.last_stamp)
+
+
+def measure():
+    dispatcher = bt_hfp_demo.hfp_dispatcher_init()
+    # 设备上回调的地址为 bytearray,每个事件都是新的 args 元组
+    events = [(BT_EVENT[name], 0, i % 5, bytearray(ADDR)) for i, name in enumerate(IND_EVENTS)]
+    for _ in range(4):
+        for args in events:
+            step(dispatcher, args)
+    with AllocCounter() as counter:
+        for _ in range(ROUNDS):
+            for args in events:
+                step(dispatcher, args)
+    return counter
+
+
+def main():
+    count = ROUNDS * len(IND_EVENTS)
+    counter = measure()
+    common.report('HFP indicator events, steady state heap allocations (MicroPython model)',
+                  [('tuple', count, counter.total(), '{:.2f}'.format(counter.total() / float(count)))],
+                  ('ingress', 'events', 'allocs', 'allocs/event'))
+    if counter.counts:
+        rows = sorted(((site, kind, n) for (site, kind), n in counter.counts.items()), key=lambda r: -r[2])
+        common.report('allocation sites', rows, ('site', 'kind', 'count'))
+        raise SystemExit('FAIL: steady state dispatch allocates')
+    print('OK: steady state dispatch of HFP indicator events allocates nothing')
+
+
+if __name__ == '__main__':
+    main()
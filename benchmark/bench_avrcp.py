@@ -0,0 +1,101 @@
+# AVRCP 命令管道测试:控制台连续输入播放控制命令时,原来每条命令都调用一次 native 接口,
+# 现在经过 bt_avrcp.AvrcpPipeline 合并音量、丢弃不改变播放状态的命令并限制切歌间隔
+# 每个场景在 bt_a2dp_avrcp_demo 的事件处理线程和 AVRCP 工作线程中运行,命令与控制台输入一样通过 msg_queue.post 入队,
+# 每次 AVRCP 调用模拟 AVRCP_CALL_MS 的往返耗时,命令间隔 INPUT_GAP_MS(例如按住音量键);同时检查最终发出的命令与最后一条输入一致
+# 运行方式(CPython): python benchmark/bench_avrcp.py
+
+import threading
+import time
+
+import common
+
+import bt
+import bt_a2dp_avrcp_demo as demo
+from bt_avrcp import AvrcpPipeline, AVRCP_SKIP_INTERVAL_MS
+
+AVRCP_CALL_MS = 30
+INPUT_GAP_MS = 5
+CALLS = {
+    'avrcpStart': 'play',
+    'avrcpPause': 'pause',
+    'avrcpPrev': 'prev',
+    'avrcpNext': 'next',
+    'avrcpSetVolume': 'volume',
+}
+
+SCENARIOS = (
+    ('volume ramp', [('5', v) for v in range(12)] + [('5', v) for v in range(11, 3, -1)]),
+    ('play x5', [('1', 0)] * 5),
+    ('play/pause mash', [('1', 0), ('2', 0)] * 3),
+    ('next x6', [('4', 0)] * 6),
+    ('mixed', [('1', 0), ('5', 3), ('5', 4), ('1', 0), ('4', 0), ('5', 5), ('2', 0), ('5', 5)]),
+)
+
+sent = []
+
+
+def traced(name):
+    def call(*args):
+        sent.append((CALLS[name], args[0] if args else None, time.perf_counter()))
+        time.sleep(AVRCP_CALL_MS / 1000.0)
+        return 0
+    return call
+
+
+def wait_idle(timeout=10):
+    deadline = time.time() + timeout
+    idle = 0
+    while idle < 3:
+        if time.time() > deadline:
+            raise RuntimeError('timeout')
+        busy = demo.avrcp_pipeline.pending() or not demo.msg_queue.empty() or demo.avrcp_executor.pending()
+        idle = 0 if busy else idle + 1
+        time.sleep(0.05)
+
+
+def expected_last(cmds):
+    # 每类命令的最后一条输入,与实际最后发出的同类调用比较
+    last = {}
+    for cmd, arg in cmds:
+        if cmd == '5':
+            last['volume'] = arg
+        elif cmd in ('1', '2'):
+            last['toggle'] = 'play' if cmd == '1' else 'pause'
+    return last
+
+
+def run(name, cmds):
+    del sent[:]
+    demo.avrcp_pipeline = AvrcpPipeline(demo.avrcp_executor, demo.msg_queue.post, demo.avrcp_cmd_done)
+    for cmd in cmds:
+        if not demo.msg_queue.post(cmd):
+            raise RuntimeError('command {} dropped'.format(cmd))
+        time.sleep(INPUT_GAP_MS / 1000.0)
+    wait_idle()
+    stats = demo.avrcp_pipeline.stats()
+
+    last = expected_last(cmds)
+    volumes = [arg for kind, arg, _ in sent if kind == 'volume']
+    toggles = [kind for kind, _, _ in sent if kind in ('play', 'pause')]
+    ok = (not volumes or volumes[-1] == last.get('volume')) and (not toggles or toggles[-1] == last.get('toggle'))
+    skips = [t for kind, _, t in sent if kind in ('prev', 'next')]
+    gap = min((b - a) * 1000 for a, b in zip(skips, skips[1:])) if len(skips) > 1 else None
+    return (name, len(cmds), len(cmds), len(sent), stats['suppressed'],
+            '-' if gap is None else '{:.0f}'.format(gap), 'ok' if ok else 'MISMATCH')
+
+
+def main():
+    bt.reset()
+    for func in CALLS:
+        setattr(bt, func, traced(func))
+    with common.quiet():
+        demo.avrcp_executor.start()
+        threading.Thread(target=demo.bt_a2dp_avrcp_proc_task, daemon=True).start()
+        rows = [run(name, cmds) for name, cmds in SCENARIOS]
+    common.report('AVRCP commands from the console, native calls ({} ms per call, input every {} ms, skip interval {} ms)'.format(
+        AVRCP_CALL_MS, INPUT_GAP_MS, AVRCP_SKIP_INTERVAL_MS), rows,
+        ('scenario', 'commands', 'direct calls', 'pipeline calls', 'suppressed', 'min skip gap ms', 'last cmd'))
+
+
+if __name__ == '__main__':
+    main()
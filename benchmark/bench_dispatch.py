@@ -0,0 +1,91 @@
+# 事件分发性能对比:原 if/elif 链式比较 与 EventDispatcher 查表分发
+#
+# 运行方式(CPython): python benchmark/bench_dispatch.py
+
+import common
+
+from bt_event import EventDispatcher, EVENT_CONTINUE
+
+import bt_hfp_demo
+
+BT_EVENT = bt_hfp_demo.BT_EVENT
+ADDR = bytearray(b'\x11\x22\x33\x44\x55\x66')
+
+
+def legacy_chain(msg):
+    # 与原 bt_event_proc_task 相同的比较顺序,每次比较都要查一次 BT_EVENT 字典,分支体为空
+    event_id = msg[0]
+    if event_id == BT_EVENT['BT_START_STATUS_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_STOP_STATUS_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_CONNECT_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_DISCONNECT_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_CALL_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_CALL_SETUP_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_CALLHELD_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_NETWORK_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_NETWORK_SIGNAL_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_BATTERY_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_AUDIO_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_VOLUME_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_NETWORK_TYPE']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_RING_IND']:
+        pass
+    elif event_id == BT_EVENT['BT_HFP_CODEC_IND']:
+        pass
+    return EVENT_CONTINUE
+
+
+def noop(msg):
+    return EVENT_CONTINUE
+
+
+def table_dispatcher():
+    dispatcher = EventDispatcher()
+    for name in BT_EVENT:
+        dispatcher.register(BT_EVENT[name], noop)
+    return dispatcher
+
+
+def run_events(func, msg):
+    def loop(count):
+        for _ in range(count):
+            func(msg)
+    return loop
+
+
+def main():
+    count = 200000
+    dispatcher = table_dispatcher()
+    rows = []
+    for name in ('BT_START_STATUS_IND', 'BT_HFP_NETWORK_SIGNAL_IND', 'BT_HFP_RING_IND', 'BT_HFP_CODEC_IND'):
+        msg = (BT_EVENT[name], 0, 1, ADDR)
+        chain = common.rate(run_events(legacy_chain, msg), count)
+        table = common.rate(run_events(dispatcher.dispatch, msg), count)
+        rows.append((name, int(chain), int(table), '{:.2f}x'.format(table / chain)))
+    common.report('dispatch only (empty handlers), events/sec', rows, ('event', 'if/elif', 'table', 'speedup'))
+
+    # 使用示例程序中真实的处理函数,标准输出被丢弃
+    hfp = bt_hfp_demo.hfp_dispatcher_init()
+    rows = []
+    for name in ('BT_HFP_NETWORK_SIGNAL_IND', 'BT_HFP_BATTERY_IND', 'BT_HFP_CODEC_IND'):
+        msg = (BT_EVENT[name], 0, 3, ADDR)
+        with common.quiet():
+            rows.append((name, int(common.rate(run_events(hfp.dispatch, msg), count // 4))))
+    common.report('bt_hfp_demo handlers, events/sec', rows, ('event', 'table'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# 来电接听时延测量:状态上报事件洪泛时,从 BT_HFP_RING_IND 入队到把 bt.hfpAnswerCall 提交给 hfp_executor 的时间
+# (不启动工作线程,只比较事件队列带来的时延)
+#
+# 对比三种入队方式:单一 FIFO 环形队列、状态类事件合并、按优先级分类(bt_hfp_demo 当前使用)
+# 运行方式(CPython): python benchmark/bench_priority.py
+
+import time
+
+import common
+
+import bt
+import bt_hfp_demo
+from bt_queue import EventRing, CoalescingQueue, DROP_OLDEST
+
+BT_EVENT = bt_hfp_demo.BT_EVENT
+PEERS = [bytes([i, 0x22, 0x33, 0x44, 0x55, 0x66]) for i in range(4)]
+FLOOD_EVENTS = (
+    'BT_HFP_NETWORK_SIGNAL_IND',
+    'BT_HFP_BATTERY_IND',
+    'BT_HFP_NETWORK_IND',
+    'BT_HFP_VOLUME_IND',
+    'BT_HFP_CODEC_IND',
+    'BT_HFP_NETWORK_TYPE',
+)
+
+
+def fifo_queue():
+    return EventRing(30, DROP_OLDEST)
+
+
+def coalescing_queue():
+    return CoalescingQueue(30, DROP_OLDEST, bt_hfp_demo.HFP_COALESCE_EVENTS, bt_hfp_demo.hfp_coalesce_key)
+
+
+def priority_queue():
+    # 直接使用 bt_hfp_demo 构造 msg_queue 的函数,与示例程序的队列完全一致
+    return bt_hfp_demo.hfp_queue_init()
+
+
+def measure(make_queue, flood, trials):
+    dispatcher = bt_hfp_demo.hfp_dispatcher_init()
+    answered = []
+    executor = bt_hfp_demo.hfp_executor
+    submit = executor.submit
+
+    def traced_submit(func, args=(), done=None):
+        if func is bt.hfpAnswerCall:
+            answered.append(time.perf_counter())
+        del executor._jobs[:]
+        return submit(func, args, done)
+
+    executor.submit = traced_submit
+    ring = (BT_EVENT['BT_HFP_RING_IND'], 0, 0, PEERS[0])
+    samples = []
+    for _ in range(trials):
+        queue = make_queue()
+        for i in range(flood):
+            name = FLOOD_EVENTS[i % len(FLOOD_EVENTS)]
+            queue.put_nowait((BT_EVENT[name], 0, i & 0x7, PEERS[i % len(PEERS)]))
+        del answered[:]
+        start = time.perf_counter()
+        queue.put_nowait(ring)
+        with common.quiet():
+            while not answered:
+                dispatcher.dispatch(queue.get())
+        samples.append((answered[0] - start) * 1000000)
+    executor.submit = submit
+    return samples
+
+
+def main():
+    rows = []
+    for flood in (10, 29, 200):
+        for name, make_queue in (('fifo', fifo_queue), ('coalesce', coalescing_queue), ('priority', priority_queue)):
+            samples = measure(make_queue, flood, 300)
+            rows.append((flood, name, '{:.1f}'.format(common.percentile(samples, 50)),
+                         '{:.1f}'.format(common.percentile(samples, 99))))
+    common.report('ring-to-answer latency under indicator flood (us)', rows, ('flood', 'queue', 'p50', 'p99'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# 事件记录回放:把记录文件中的事件直接交给示例程序的事件处理函数,统计每种事件的处理耗时
+#
+# 运行方式(CPython):
+#   python benchmark/bench_replay.py hfp|spp [记录文件] [--realtime]
+# 不指定记录文件时,先用 TraceRecorder 录制一段模拟的会话(HFP:连接、状态上报、来电、挂断;SPP:搜索、连接、收发数据)
+
+import os
+import sys
+import tempfile
+
+import common
+
+import bt_hfp_demo
+import bt_spp_demo
+from bt_trace import TraceRecorder, replay
+from bt_devcache import DeviceCache
+
+PEER = bytes([0x11, 0x22, 0x33, 0x44, 0x55, 0x66])
+
+
+def hfp_session():
+    ev = bt_hfp_demo.BT_EVENT
+    yield (ev['BT_START_STATUS_IND'], 0)
+    yield (ev['BT_HFP_CONNECT_IND'], 0, 2, PEER)
+    for i in range(200):
+        yield (ev['BT_HFP_NETWORK_SIGNAL_IND'], 0, i % 5, PEER)
+        yield (ev['BT_HFP_BATTERY_IND'], 0, i % 5, PEER)
+        if i % 50 == 0:
+            yield (ev['BT_HFP_RING_IND'], 0, 0, PEER)
+            yield (ev['BT_HFP_CALL_IND'], 0, 1, PEER)
+            yield (ev['BT_HFP_AUDIO_IND'], 0, 2, PEER)
+            yield (ev['BT_HFP_CALL_IND'], 0, 0, PEER)
+    yield (ev['BT_HFP_DISCONNECT_IND'], 0, 0, PEER)
+
+
+def spp_session():
+    ev = bt_spp_demo.BT_EVENT
+    yield (ev['BT_START_STATUS_IND'], 0)
+    for i in range(20):
+        yield (ev['BT_SPP_INQUIRY_IND'], 0, -60 - i, 0, 'device-{}'.format(i), bytes([i, 1, 2, 3, 4, 5]))
+    yield (ev['BT_SPP_INQUIRY_END_IND'], 0, 0)
+    yield (ev['BT_SPP_CONNECT_IND'], 0, 1, PEER)
+    for i in range(500):
+        data = 'line {}\n'.format(i).encode()
+        yield (ev['BT_SPP_RECV_DATA_IND'], 0, len(data), data)
+    yield (ev['BT_SPP_DISCONNECT_IND'], 0, 0, PEER)
+
+
+def record(path, session):
+    recorder = TraceRecorder(path, 128)
+    callback = recorder.wrap(lambda args: None)
+    for args in session():
+        callback(args)
+        recorder.flush(True)
+    recorder.close()
+    return recorder.records
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    realtime = '--realtime' in sys.argv
+    profile = args[0] if args else 'hfp'
+    if profile == 'hfp':
+        demo, session, dispatcher_init = bt_hfp_demo, hfp_session, bt_hfp_demo.hfp_dispatcher_init
+    else:
+        demo, session, dispatcher_init = bt_spp_demo, spp_session, bt_spp_demo.spp_dispatcher_init
+
+    if len(args) > 1:
+        path = args[1]
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'bt_{}.trace'.format(profile))
+        count = record(path, session)
+        print('recorded {} events to {} ({} bytes)'.format(count, path, os.path.getsize(path)))
+
+    # 设备缓存写到临时目录,不影响本机的 /usr
+    bt_spp_demo.dev_cache = DeviceCache(os.path.join(tempfile.gettempdir(), 'bt_devices.json'))
+    # 阻塞的 native 调用由执行器的工作线程完成,回放只统计事件处理函数本身的耗时
+    if profile == 'hfp':
+        bt_hfp_demo.hfp_executor.start()
+    else:
+        bt_spp_demo.spp_data_executor.start()
+    dispatcher = dispatcher_init()
+    with common.quiet():
+        result = replay(path, dispatcher.dispatch, realtime)
+    rows = []
+    for event_id in sorted(result):
+        count, total, peak = result[event_id]
+        rows.append((demo.BT_EVENT.name(event_id), count, '{:.1f}'.format(total / count), peak))
+    common.report('replay handler cost ({})'.format('realtime' if realtime else 'fast'), rows,
+                  ('event', 'count', 'avg us', 'max us'))
+
+
+if __name__ == '__main__':
+    main()
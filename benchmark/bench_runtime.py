@@ -0,0 +1,175 @@
+# 多 profile 运行时测试:对比三个单 profile 示例程序分别运行和 bt_multi_demo 在一个运行时中运行 HFP+SPP+A2DP/AVRCP,
+# 以及运行时的线程模式和协程模式(aio,CPython 上使用 asyncio)
+#
+#   资源占用    每种运行方式在子进程中启动到 RUNNING 状态,统计创建的线程数、事件队列数和 Python 堆占用(tracemalloc)
+#               三个示例程序不能同时调用 bt.init,表中"3 demos"一行为三者分别运行时的合计;线程栈不在统计范围内
+#   来电接听    运行时中 SPP 数据持续到达时,从 BT_HFP_RING_IND 上报到调用 bt.hfpAnswerCall 的时延
+# 运行方式(CPython): python benchmark/bench_runtime.py
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+import common
+
+import _thread
+import builtins
+
+import bt
+
+PEER = bytes([0x11, 0x22, 0x33, 0x44, 0x55, 0x66])
+SCENARIOS = ('hfp', 'spp', 'a2dp', 'runtime', 'runtime-aio')
+FLOODS = (0, 10, 30)
+TRIALS = 200
+
+
+def wait_for(cond, timeout=5):
+    deadline = time.time() + timeout
+    while not cond():
+        if time.time() > deadline:
+            raise RuntimeError('timeout')
+        time.sleep(0.001)
+
+
+def footprint(scenario):
+    # 在子进程中运行:统计从导入示例程序到进入 RUNNING 期间创建的线程和堆占用
+    threads = [0]
+    start_new_thread = _thread.start_new_thread
+
+    def counted(func, args, kwargs={}):
+        threads[0] += 1
+        return start_new_thread(func, args, kwargs)
+
+    _thread.start_new_thread = counted
+    menu = threading.Event()
+    release = threading.Event()
+
+    def console(prompt=''):
+        # A2DP 示例程序进入命令菜单即表示启动完成,统计后输入 6 退出
+        menu.set()
+        release.wait()
+        return '6'
+
+    builtins.input = console
+    if scenario == 'runtime-aio':
+        # CPython 的 asyncio 模块本身远大于 uasyncio,在开始统计前导入,不计入堆占用
+        import asyncio
+    tracemalloc.start()
+    with common.quiet():
+        if scenario == 'hfp':
+            import bt_hfp_demo as demo
+            main, running, queues = demo.main, demo.bt_lifecycle.is_running, 1
+        elif scenario == 'spp':
+            import bt_spp_demo as demo
+            main, running, queues = demo.main, demo.bt_lifecycle.is_running, 1
+        elif scenario == 'a2dp':
+            import bt_a2dp_avrcp_demo as demo
+            main, running, queues = demo.main, menu.is_set, 1
+        else:
+            import bt_multi_demo as demo
+            from bt_runtime import BtRuntime
+            # 示例程序默认只运行 HFP+SPP,这里另外创建包含三个 profile 的运行时,默认的运行时也计入堆占用
+            aio = scenario == 'runtime-aio'
+            rt = BtRuntime('BT', [demo.HfpProfile(), demo.SppProfile(), demo.A2dpProfile()], demo.bt_adapter, aio=aio)
+            main, running, queues = runner(rt), rt.lifecycle.is_running, 1
+        task = threading.Thread(target=main, daemon=True)
+        task.start()
+        wait_for(lambda: bt.calls.get('start'))
+        bt.inject((0, 0))
+        wait_for(running)
+        time.sleep(0.05)
+        heap = tracemalloc.get_traced_memory()[0]
+        release.set()
+        bt.inject((1, 0))
+        task.join(5)
+    print(json.dumps({'threads': threads[0], 'queues': queues, 'heap': heap}))
+
+
+def runner(rt):
+    # 返回在线程中运行运行时的函数,协程模式下该线程即为事件循环所在的主线程
+    if not rt.aio:
+        return rt.run
+    from bt_aio import asyncio
+    return lambda: asyncio.run(rt.run_async())
+
+
+def run_footprint():
+    results = {}
+    for scenario in SCENARIOS:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--footprint', scenario],
+                             capture_output=True, text=True, check=True).stdout
+        results[scenario] = json.loads(out.strip().splitlines()[-1])
+    demos = {}
+    for key in ('threads', 'queues', 'heap'):
+        demos[key] = sum(results[s][key] for s in ('hfp', 'spp', 'a2dp'))
+    rows = []
+    for name, r in (('hfp', results['hfp']), ('spp', results['spp']), ('a2dp', results['a2dp']),
+                    ('3 demos', demos), ('runtime', results['runtime']), ('runtime-aio', results['runtime-aio'])):
+        rows.append((name, r['threads'], r['queues'], '{:.1f}'.format(r['heap'] / 1024.0)))
+    common.report('footprint at RUNNING (threads exclude main)', rows, ('run as', 'threads', 'queues', 'heap KiB'))
+
+
+def ring_latency(aio):
+    import bt_multi_demo
+    from bt_runtime import BtRuntime
+    from bt_log import LOG_ERROR
+
+    bt.reset()
+    bt_multi_demo.bt_adapter.invalidate()
+    answered = []
+    bt.set_hook('hfpAnswerCall', lambda: answered.append(time.perf_counter()))
+    hfp = bt_multi_demo.HfpProfile()
+    spp = bt_multi_demo.SppProfile()
+    rt = BtRuntime('BT', [hfp, spp], bt_multi_demo.bt_adapter, log_level=LOG_ERROR, aio=aio)
+    mode = 'aio' if aio else 'thread'
+    with common.quiet():
+        task = threading.Thread(target=runner(rt), daemon=True)
+        task.start()
+        wait_for(lambda: bt.calls.get('start'))
+        bt.inject((0, 0))
+        wait_for(rt.lifecycle.is_running)
+        bt.inject((hfp.events['BT_HFP_CONNECT_IND'], 0, 2, PEER))
+        bt.inject((spp.events['BT_SPP_CONNECT_IND'], 0, 1, PEER))
+        wait_for(rt.queue.empty)
+
+        rows = []
+        ring = (hfp.events['BT_HFP_RING_IND'], 0, 0, PEER)
+        payload = b'x' * 64
+        for flood in FLOODS:
+            samples = []
+            for _ in range(TRIALS):
+                del answered[:]
+                for _ in range(flood):
+                    bt.spp_deliver(payload)
+                start = time.perf_counter()
+                bt.inject(ring)
+                wait_for(lambda: answered)
+                samples.append((answered[0] - start) * 1000000)
+                wait_for(lambda: rt.queue.empty() and spp.executor.pending() == 0)
+            rows.append((mode, flood, '{:.1f}'.format(common.percentile(samples, 50)),
+                         '{:.1f}'.format(common.percentile(samples, 99))))
+        bt.inject((1, 0))
+        task.join(5)
+    return rows
+
+
+def run_ring_latency():
+    rows = ring_latency(False) + ring_latency(True)
+    common.report('ring-to-answer under SPP data flood (us, includes handoff to the executor)', rows,
+                  ('mode', 'spp events', 'p50', 'p99'))
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--footprint':
+        footprint(sys.argv[2])
+        return
+    run_footprint()
+    run_ring_latency()
+
+
+if __name__ == '__main__':
+    main()
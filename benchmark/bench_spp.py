@@ -0,0 +1,157 @@
+# SPP 事件通路性能测试:在 CPython 上用 bt 替身模块运行 bt_spp_demo 的事件处理线程
+#
+# 对每种负载大小分别测量:
+#   吞吐量      对端按链路 MTU 持续发送数据,事件处理线程收到后回复,统计每秒处理的包数和字节数
+#   回显时延    从 BT_SPP_RECV_DATA_IND 上报到调用 bt.sppSend 回复的时间,统计 p50/p99
+#   内存分配    单个包经过事件通路时的内存分配量:MicroPython 上为 gc.mem_alloc() 的增量,
+#               CPython 上为 tracemalloc 统计的峰值增量
+# text 模式为示例程序默认的文本回复,framed 模式打开 SPP_FRAMED,收发 bt_spp_frame 格式的帧
+# 运行方式(CPython): python benchmark/bench_spp.py [链路MTU]
+
+import gc
+import sys
+import time
+import threading
+
+import common
+
+import bt
+import bt_spp_demo
+from bt_spp_stream import SppStream
+from bt_spp_frame import FrameWriter, FRAME_MAX_LEN
+
+BT_EVENT = bt_spp_demo.BT_EVENT
+PAYLOAD_SIZES = (16, 64, 256, 1000)
+QUEUE_HIGH = 25
+
+
+class EventPath(object):
+    def __init__(self):
+        # 统计对端收到的回复字节数:发送积压时多个回复会合并到一次 bt.sppSend 中
+        self.replies = 0
+        self.reply_event = threading.Event()
+        bt.reset()
+        bt.spp_peer = self._on_reply
+        bt.init(bt_spp_demo.bt_callback)
+        self._task = None
+
+    def _on_reply(self, data):
+        self.replies += len(data)
+        self.reply_event.set()
+
+    def start(self):
+        bt_spp_demo.spp_data_executor.start()
+        self._task = threading.Thread(target=bt_spp_demo.bt_event_proc_task, daemon=True)
+        self._task.start()
+
+    def stop(self):
+        bt.inject((BT_EVENT['BT_STOP_STATUS_IND'], 0))
+        self._task.join()
+
+    def wait_replies(self, count):
+        while self.replies < count:
+            if not self.reply_event.wait(5):
+                raise RuntimeError('reply timeout, event queue stats: {}'.format(bt_spp_demo.msg_queue.stats()))
+            self.reply_event.clear()
+
+
+def make_packet(size, framed):
+    payload = (b'0123456789abcdef' * (size // 16 + 1))[:size]
+    if not framed:
+        return payload
+    out = []
+    writer = FrameWriter(SppStream(send=lambda data: out.append(data) or 0, tx_size=FRAME_MAX_LEN))
+    writer.send(bt_spp_demo.SPP_FRAME_ECHO, payload)
+    return b''.join(out)
+
+
+def chunks_per_packet(packet):
+    return (len(packet) + bt.spp_mtu - 1) // bt.spp_mtu
+
+
+def reply_bytes_per_packet(packet, framed):
+    # text 模式每个上报的数据段回复一次,framed 模式每个完整的帧回复一个等长的帧
+    if framed:
+        return len(packet)
+    return chunks_per_packet(packet) * len(bt_spp_demo.SPP_REPLY)
+
+
+def throughput(path, packet, count, per_packet):
+    start = time.perf_counter()
+    # 模拟链路流控:事件队列和待发送的回复积压过多时对端暂停发送
+    high = QUEUE_HIGH - chunks_per_packet(packet)
+    for _ in range(count):
+        while bt_spp_demo.msg_queue.qsize() + bt_spp_demo.spp_data_executor.pending() >= high:
+            time.sleep(0)
+        bt.spp_deliver(packet)
+    path.wait_replies(count * per_packet)
+    cost = time.perf_counter() - start
+    return count / cost, count * len(packet) / cost / 1024
+
+
+def latency(path, packet, count, per_packet):
+    samples = []
+    for _ in range(count):
+        expect = path.replies + per_packet
+        start = time.perf_counter()
+        bt.spp_deliver(packet)
+        path.wait_replies(expect)
+        samples.append((time.perf_counter() - start) * 1000000)
+    return common.percentile(samples, 50), common.percentile(samples, 99)
+
+
+def allocation(packet, count):
+    # 不经过事件处理线程,直接在当前线程中处理,以便只统计事件通路本身的分配
+    dispatcher = bt_spp_demo.spp_dispatcher_init()
+    msg = (BT_EVENT['BT_SPP_RECV_DATA_IND'], 0, len(packet), packet)
+    dispatcher.dispatch(msg)
+    if hasattr(gc, 'mem_alloc'):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        for _ in range(count):
+            dispatcher.dispatch(msg)
+        used = gc.mem_alloc() - before
+        gc.enable()
+        return used / count
+    import tracemalloc
+    tracemalloc.start()
+    total = 0
+    for _ in range(count):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        dispatcher.dispatch(msg)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / count
+
+
+def run_mode(framed, rows):
+    bt_spp_demo.SPP_FRAMED = framed
+    for size in PAYLOAD_SIZES:
+        packet = make_packet(size, framed)
+        per_packet = reply_bytes_per_packet(packet, framed)
+        path = EventPath()
+        with common.quiet():
+            path.start()
+            pps, kbps = throughput(path, packet, 2000, per_packet)
+            p50, p99 = latency(path, packet, 300, per_packet)
+            path.stop()
+            alloc = allocation(packet, 200)
+        rows.append(('framed' if framed else 'text', size, int(pps), int(kbps),
+                     '{:.1f}'.format(p50), '{:.1f}'.format(p99), int(alloc)))
+
+
+def main():
+    if len(sys.argv) > 1:
+        bt.spp_mtu = int(sys.argv[1])
+    rows = []
+    run_mode(False, rows)
+    run_mode(True, rows)
+    common.report('SPP event path, link mtu {}'.format(bt.spp_mtu), rows,
+                  ('mode', 'payload', 'pkt/s', 'KiB/s', 'p50 us', 'p99 us', 'alloc B/pkt'))
+    print('event queue stats: {}'.format(bt_spp_demo.msg_queue.stats()))
+
+
+if __name__ == '__main__':
+    main()
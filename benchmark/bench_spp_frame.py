@@ -0,0 +1,65 @@
+# SPP 帧协议吞吐量测试:FrameWriter -> SppStream -> 回环传输 -> FrameParser
+#
+# 回环传输把每次 sppSend 的数据按链路 MTU 切分后再交给 FrameParser,
+# 模拟一帧数据分多次 BT_SPP_RECV_DATA_IND 上报的情况
+# 运行方式(CPython): python benchmark/bench_spp_frame.py
+
+import time
+
+import common
+
+from bt_spp_stream import SppStream
+from bt_spp_frame import FrameParser, FrameWriter, FRAME_HEAD_LEN, FRAME_CRC_LEN, FRAME_MAX_LEN
+
+
+class LoopbackTransport(object):
+    def __init__(self, parser, link_mtu):
+        self._parser = parser
+        self._mtu = link_mtu
+        self.sends = 0
+
+    def send(self, data):
+        self.sends += 1
+        mv = memoryview(data)
+        for offset in range(0, len(mv), self._mtu):
+            self._parser.feed(mv[offset:offset + self._mtu])
+        return 0
+
+
+def run(payload_size, link_mtu, frames):
+    parser = FrameParser()
+    received = [0]
+
+    def on_frame(frame_type, payload):
+        received[0] += len(payload)
+
+    parser.register(1, on_frame)
+    transport = LoopbackTransport(parser, link_mtu)
+    stream = SppStream(send=transport.send, tx_size=FRAME_MAX_LEN)
+    writer = FrameWriter(stream)
+    payload = bytes(range(256)) * (payload_size // 256 + 1)
+    payload = payload[:payload_size]
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        if writer.write(1, payload) != 0:
+            raise RuntimeError('frame rejected')
+    stream.flush()
+    cost = time.perf_counter() - start
+    assert parser.frames == frames and parser.crc_errors == 0
+    wire = frames * (payload_size + FRAME_HEAD_LEN + FRAME_CRC_LEN)
+    return frames / cost, wire / cost / 1024, transport.sends
+
+
+def main():
+    rows = []
+    for payload_size in (16, 128, 512, 1000):
+        for link_mtu in (127, 512):
+            frames = max(200, 400000 // payload_size)
+            fps, kbps, sends = run(payload_size, link_mtu, frames)
+            rows.append((payload_size, link_mtu, int(fps), int(kbps), sends))
+    common.report('framed SPP loopback throughput', rows, ('payload', 'link mtu', 'frames/s', 'KiB/s', 'sppSend'))
+
+
+if __name__ == '__main__':
+    main()
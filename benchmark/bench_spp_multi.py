@@ -0,0 +1,144 @@
+# SPP 多连接性能测试:在 CPython 上用 bt 替身模块模拟 N 个手机同时连接 bt_spp_demo(SPP_MULTI_PEER 模式)
+# 替身模块的 spp_deliver 在接收事件末尾附加对端地址,发送函数按地址统计,模拟的是带地址收发接口的固件;
+# 当前固件的接收事件不带地址、bt.sppSend 没有地址参数,多个连接时数据无法区分(见 bt_spp_session),
+# 下面的吞吐量、公平性和轮询发送结果不代表当前固件上的表现,断开后继续运行的检查不依赖地址
+#
+# 对每个连接数分别测量:
+#   吞吐量      各对端轮流发送数据,事件处理线程收到后回复到对应连接,统计总的包数和字节数
+#   公平性      各连接收到的回复数中最少与最多之比
+#   轮询发送    一个连接积压大量待发送数据时,其他连接的第一个回复最晚排在第几个发送的数据块
+#   断开        断开其中一个连接后BT是否继续运行(没有调用 bt.stop),其余连接是否还能收发
+# 运行方式(CPython): python benchmark/bench_spp_multi.py
+
+import time
+import threading
+
+import common
+
+import bt
+import bt_spp_demo
+from bt_spp_session import SppSessionManager
+
+BT_EVENT = bt_spp_demo.BT_EVENT
+PEER_COUNTS = (1, 2, 4, 8)
+PAYLOAD_SIZE = 256
+PACKETS = 4000
+QUEUE_HIGH = 25
+BACKLOG_SIZE = 16 * 1024
+
+
+def peer_addr(index):
+    return bytes([0x10, 0x20, 0x30, 0x40, 0x50, index])
+
+
+class MultiPeerPath(object):
+    def __init__(self, peers):
+        self.peers = [peer_addr(i) for i in range(peers)]
+        self.replies = {}
+        for addr in self.peers:
+            self.replies[addr] = 0
+        self.total = 0
+        self.reply_event = threading.Event()
+        bt.reset()
+        bt.init(bt_spp_demo.bt_callback)
+        bt_spp_demo.SPP_MULTI_PEER = True
+        bt_spp_demo.spp_sessions = SppSessionManager(peers, send=self._send)
+        self._task = None
+
+    def _send(self, addr, data):
+        retval = bt.sppSend(data)
+        if retval == 0:
+            self.replies[addr] += 1
+            self.total += 1
+            self.reply_event.set()
+        return retval
+
+    def start(self):
+        bt_spp_demo.spp_data_executor.start()
+        self._task = threading.Thread(target=bt_spp_demo.bt_event_proc_task, daemon=True)
+        self._task.start()
+        for addr in self.peers:
+            bt.inject((BT_EVENT['BT_SPP_CONNECT_IND'], 0, 1, addr))
+        self.wait_idle()
+
+    def stop(self):
+        bt.inject((BT_EVENT['BT_STOP_STATUS_IND'], 0))
+        self._task.join()
+
+    def wait_idle(self):
+        while not bt_spp_demo.msg_queue.empty():
+            time.sleep(0.001)
+
+    def wait_replies(self, count):
+        while self.total < count:
+            if not self.reply_event.wait(5):
+                raise RuntimeError('reply timeout, event queue stats: {}'.format(bt_spp_demo.msg_queue.stats()))
+            self.reply_event.clear()
+
+
+def throughput(path, packet, count):
+    peers = path.peers
+    start = time.perf_counter()
+    for i in range(count):
+        while bt_spp_demo.msg_queue.qsize() + bt_spp_demo.spp_data_executor.pending() >= QUEUE_HIGH:
+            time.sleep(0)
+        bt.spp_deliver(packet, peers[i % len(peers)])
+    path.wait_replies(count)
+    cost = time.perf_counter() - start
+    return count / cost, count * len(packet) / cost / 1024
+
+
+def fairness(path):
+    counts = list(path.replies.values())
+    return min(counts) / max(counts)
+
+
+def round_robin_delay(peers):
+    # 第一个连接积压 BACKLOG_SIZE 字节,其余连接各有一个回复,返回其余连接的回复最晚排在第几个发送
+    order = []
+    manager = SppSessionManager(peers, tx_size=BACKLOG_SIZE, send=lambda addr, data: order.append(addr) or 0)
+    addrs = [peer_addr(i) for i in range(peers)]
+    for addr in addrs:
+        manager.connect(addr)
+    manager.write(addrs[0], b'x' * BACKLOG_SIZE)
+    for addr in addrs[1:]:
+        manager.write(addr, bt_spp_demo.SPP_REPLY)
+    manager.pump()
+    last = 0
+    for addr in addrs[1:]:
+        last = max(last, order.index(addr) + 1)
+    return last, len(order)
+
+
+def survive_disconnect(path, packet):
+    if len(path.peers) < 2:
+        return '-'
+    gone = path.peers[0]
+    bt.inject((BT_EVENT['BT_SPP_DISCONNECT_IND'], 0, 0, gone))
+    path.wait_idle()
+    expect = path.total + 1
+    bt.spp_deliver(packet, path.peers[1])
+    path.wait_replies(expect)
+    alive = 'stop' not in bt.calls and len(bt_spp_demo.spp_sessions) == len(path.peers) - 1
+    return 'yes' if alive else 'no'
+
+
+def main():
+    rows = []
+    packet = (b'0123456789abcdef' * (PAYLOAD_SIZE // 16 + 1))[:PAYLOAD_SIZE]
+    for peers in PEER_COUNTS:
+        path = MultiPeerPath(peers)
+        with common.quiet():
+            path.start()
+            pps, kbps = throughput(path, packet, PACKETS)
+            fair = fairness(path)
+            alive = survive_disconnect(path, packet)
+            path.stop()
+        last, chunks = round_robin_delay(peers)
+        rows.append((peers, int(pps), int(kbps), '{:.2f}'.format(fair), '{}/{}'.format(last, chunks), alive))
+    common.report('SPP multi-peer, payload {} bytes, link mtu {}'.format(PAYLOAD_SIZE, bt.spp_mtu), rows,
+                  ('peers', 'pkt/s', 'KiB/s', 'fairness', 'rr last/chunks', 'survive disc'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# benchmark 公共部分:把桌面端替身模块和示例程序所在目录加入搜索路径,并提供计时工具
+
+import io
+import os
+import sys
+import time
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, 'stubs'))
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+
+@contextlib.contextmanager
+def quiet():
+    # 示例程序中的 print 会淹没测量结果,测量期间丢弃标准输出
+    saved = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        yield
+    finally:
+        sys.stdout = saved
+
+
+def rate(func, count, repeat=5):
+    # 取多次运行中最快的一次,返回每秒执行次数
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(count)
+        cost = time.perf_counter() - start
+        if best is None or cost < best:
+            best = cost
+    return count / best
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    index = int(round((len(ordered) - 1) * pct / 100.0))
+    return ordered[index]
+
+
+def report(title, rows, header):
+    print(title)
+    widths = [max(len(str(h)), 12) for h in header]
+    for row in rows:
+        for i, col in enumerate(row):
+            widths[i] = max(widths[i], len(str(col)))
+    line = '  '.join(str(h).rjust(w) for h, w in zip(header, widths))
+    print(line)
+    print('-' * len(line))
+    for row in rows:
+        print('  '.join(str(c).rjust(w) for c, w in zip(row, widths)))
+    print('')
@@ -0,0 +1,230 @@
+# bt 模块的桌面端替身,仅用于在 CPython 上运行 benchmark,不依赖真实的蓝牙协议栈
+
+_callback = None
+_retvals = {}
+_hooks = {}
+calls = {}
+
+local_name = 'QuecPython'
+visible_mode = 0
+
+# SPP 链路模拟:spp_mtu 为链路单次上报的最大字节数,spp_peer(data) 模拟对端收到 sppSend 发出的数据
+BT_SPP_RECV_DATA_IND = 14
+spp_mtu = 512
+spp_peer = None
+spp_tx_bytes = 0
+spp_rx_bytes = 0
+
+
+def _call(name, default=0):
+    calls[name] = calls.get(name, 0) + 1
+    hook = _hooks.get(name)
+    if hook is not None:
+        hook()
+    return _retvals.get(name, default)
+
+
+def set_retval(name, value):
+    # 修改指定接口的返回值,用于模拟失败分支
+    _retvals[name] = value
+
+
+def set_hook(name, hook):
+    # 指定接口被调用时执行 hook,用于测量事件到达某个接口调用的时延
+    _hooks[name] = hook
+
+
+def reset():
+    global _callback, spp_peer, spp_tx_bytes, spp_rx_bytes
+    _callback = None
+    _retvals.clear()
+    _hooks.clear()
+    calls.clear()
+    spp_peer = None
+    spp_tx_bytes = 0
+    spp_rx_bytes = 0
+
+
+def inject(args):
+    # 模拟协议栈在回调上下文中上报事件
+    _callback(args)
+
+
+def spp_deliver(data, addr=None):
+    # 模拟对端发来数据:按链路 MTU 切分,每一段上报一次 BT_SPP_RECV_DATA_IND
+    # 指定 addr 时模拟多连接,对端地址附加在事件末尾
+    global spp_rx_bytes
+    mv = memoryview(data)
+    for offset in range(0, len(mv), spp_mtu):
+        chunk = bytes(mv[offset:offset + spp_mtu])
+        spp_rx_bytes += len(chunk)
+        if addr is None:
+            _callback((BT_SPP_RECV_DATA_IND, 0, len(chunk), chunk))
+        else:
+            _callback((BT_SPP_RECV_DATA_IND, 0, len(chunk), chunk, addr))
+
+
+def init(callback):
+    global _callback
+    _callback = callback
+    return _call('init')
+
+
+def release():
+    return _call('release')
+
+
+def start():
+    return _call('start')
+
+
+def stop():
+    return _call('stop')
+
+
+def getStatus():
+    return _call('getStatus', 1)
+
+
+def getLocalName():
+    ret = _call('getLocalName', None)
+    if ret is not None:
+        return ret
+    return (0, local_name)
+
+
+def setLocalName(code, name):
+    global local_name
+    ret = _call('setLocalName')
+    if ret == 0:
+        local_name = name
+    return ret
+
+
+def getVisibleMode():
+    ret = _call('getVisibleMode', None)
+    if ret is not None:
+        return ret
+    return visible_mode
+
+
+def setVisibleMode(mode):
+    global visible_mode
+    ret = _call('setVisibleMode')
+    if ret == 0:
+        visible_mode = mode
+    return ret
+
+
+def setChannel(channel):
+    return _call('setChannel')
+
+
+def startInquiry(mode):
+    return _call('startInquiry')
+
+
+def cancelInquiry():
+    return _call('cancelInquiry')
+
+
+def reconnect_set(max_count, period):
+    return _call('reconnect_set')
+
+
+def reconnect():
+    return _call('reconnect')
+
+
+def hfpInit():
+    return _call('hfpInit')
+
+
+def hfpRelease():
+    return _call('hfpRelease')
+
+
+def hfpAnswerCall(addr):
+    return _call('hfpAnswerCall')
+
+
+def hfpConnect(addr):
+    return _call('hfpConnect')
+
+
+def hfpDisconnect(addr):
+    return _call('hfpDisconnect')
+
+
+def hfpSetVolume(addr, vol):
+    return _call('hfpSetVolume')
+
+
+def sppInit():
+    return _call('sppInit')
+
+
+def sppRelease():
+    return _call('sppRelease')
+
+
+def sppConnect(addr):
+    return _call('sppConnect')
+
+
+def sppDisconnect():
+    return _call('sppDisconnect')
+
+
+def sppSend(data):
+    global spp_tx_bytes
+    ret = _call('sppSend')
+    if ret == 0:
+        spp_tx_bytes += len(data)
+        if spp_peer is not None:
+            spp_peer(data)
+    return ret
+
+
+def a2dpavrcpInit():
+    return _call('a2dpavrcpInit')
+
+
+def a2dpavrcpRelease():
+    return _call('a2dpavrcpRelease')
+
+
+def a2dpGetConnStatus():
+    return _call('a2dpGetConnStatus', 2)
+
+
+def avrcpGetConnStatus():
+    return _call('avrcpGetConnStatus', 2)
+
+
+def a2dpGetAddr():
+    return _call('a2dpGetAddr', bytearray(b'\x01\x02\x03\x04\x05\x06'))
+
+
+def a2dpDisconnect(addr):
+    return _call('a2dpDisconnect')
+
+
+def avrcpStart():
+    return _call('avrcpStart')
+
+
+def avrcpPause():
+    return _call('avrcpPause')
+
+
+def avrcpPrev():
+    return _call('avrcpPrev')
+
+
+def avrcpNext():
+    return _call('avrcpNext')
+
+
+def avrcpSetVolume(vol):
+    return _call('avrcpSetVolume')
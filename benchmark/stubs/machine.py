@@ -0,0 +1,20 @@
+# machine 模块的桌面端替身,仅用于在 CPython 上运行 benchmark
+
+
+class Pin(object):
+    GPIO11 = 11
+    IN = 0
+    OUT = 1
+    PULL_DISABLE = 0
+    PULL_PU = 1
+    PULL_PD = 2
+
+    def __init__(self, pin, direction=IN, pull=PULL_DISABLE, level=0):
+        self._level = level
+
+    def write(self, level):
+        self._level = level
+        return 0
+
+    def read(self):
+        return self._level
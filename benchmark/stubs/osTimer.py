@@ -0,0 +1,40 @@
+# osTimer 模块的桌面端替身,仅用于在 CPython 上运行 benchmark
+# QuecPython 中 osTimer 本身即为定时器类型(timer = osTimer()),这里用 threading.Timer 模拟
+
+import sys
+import threading
+
+
+class osTimer(object):
+    def __init__(self):
+        self._timer = None
+
+    def start(self, period_ms, cyclic, callback):
+        self.stop()
+        self._period = period_ms
+        self._cyclic = cyclic
+        self._callback = callback
+        self._arm()
+        return 0
+
+    def _arm(self):
+        self._timer = threading.Timer(self._period / 1000, self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _fire(self):
+        if self._cyclic:
+            self._arm()
+        self._callback(None)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return 0
+
+    def delete_timer(self):
+        return self.stop()
+
+
+sys.modules[__name__] = osTimer
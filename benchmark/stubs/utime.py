@@ -0,0 +1,43 @@
+# utime 模块的桌面端替身,仅用于在 CPython 上运行 benchmark
+
+import time as _time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALF = _TICKS_PERIOD >> 1
+
+
+def ticks_ms():
+    return int(_time.monotonic() * 1000) & _TICKS_MAX
+
+
+def ticks_us():
+    return int(_time.monotonic() * 1000000) & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def sleep(seconds):
+    _time.sleep(seconds)
+
+
+def sleep_ms(ms):
+    _time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    _time.sleep(us / 1000000)
+
+
+def localtime(secs=None):
+    return _time.localtime(secs)[:8]
+
+
+def time():
+    return int(_time.time())
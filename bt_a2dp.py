@@ -0,0 +1,80 @@
+#BT A2DP/AVRCP 公共模块
+
+"""
+说明:A2DP/AVRCP 的连接状态表和连接状态跟踪,单 profile 示例程序(bt_a2dp_avrcp_demo)和多 profile 运行时(bt_multi_demo)共用
+A2DP/AVRCP 的连接、断开等事件没有单独处理,收到后调用 conn_event,重新查询 A2DP 和 AVRCP 的连接状态:
+两者都连接后 connected 置位,否则清除;AVRCP 连接状态变化时调用命令管道的 invalidate,重新连接后手机的播放状态和音量未知
+state 和 connected 只由事件处理线程写入(conn_event、refresh_ind);wait_connected 在主线程中只等待 connected,
+协议栈没有上报事件时每隔 poll_ms 通过 post 投递 event_id 事件,请求事件处理线程重新查询,间隔较长
+"""
+import bt
+import utime
+from bt_enum import BtEnum
+from bt_event import EVENT_CONTINUE
+from bt_sync import Signal
+
+A2DP_AVRCP_CONNECT_STATUS = BtEnum({
+    'DISCONNECTED': 0,
+    'CONNECTING': 1,
+    'CONNECTED': 2,
+    'DISCONNECTING': 3
+})
+
+A2DP_POLL_FALLBACK_MS = 5000
+A2DP_REFRESH_EVENT = 1003
+
+
+class A2dpLink(object):
+    def __init__(self, log, pipeline=None, post=None, event_id=A2DP_REFRESH_EVENT):
+        # pipeline 为 bt_avrcp.AvrcpPipeline,可以在创建后再设置
+        # post(msg) 向事件队列投递消息,在主线程中调用,需要支持多个生产者(如 EventRing.post);为 None 时 wait_connected 不定时查询
+        self.log = log
+        self.pipeline = pipeline
+        self._post = post
+        self._event_id = event_id
+        self.state = {
+            'a2dp': A2DP_AVRCP_CONNECT_STATUS.DISCONNECTED,
+            'avrcp': A2DP_AVRCP_CONNECT_STATUS.DISCONNECTED,
+        }
+        # A2DP 和 AVRCP 都连接后置位
+        self.connected = Signal()
+
+    def refresh(self):
+        # 只在事件处理线程中调用
+        a2dp_status = bt.a2dpGetConnStatus()
+        avrcp_status = bt.avrcpGetConnStatus()
+        self.state['a2dp'] = a2dp_status
+        self.state['avrcp'] = avrcp_status
+        if a2dp_status == A2DP_AVRCP_CONNECT_STATUS.CONNECTED and avrcp_status == A2DP_AVRCP_CONNECT_STATUS.CONNECTED:
+            self.connected.set()
+        else:
+            self.connected.clear()
+
+    def conn_event(self, msg):
+        self.log.event(msg[0], 'status: {}', msg[1])
+        avrcp_status = self.state['avrcp']
+        self.refresh()
+        if self.state['avrcp'] != avrcp_status and self.pipeline is not None:
+            self.pipeline.invalidate()
+        return EVENT_CONTINUE
+
+    def refresh_ind(self, msg):
+        # 事件处理线程中收到 event_id 事件时调用
+        self.refresh()
+        return EVENT_CONTINUE
+
+    def wait_connected(self, timeout_ms, poll_ms=A2DP_POLL_FALLBACK_MS):
+        # 主线程中调用:A2DP 和 AVRCP 都连接后立即返回 True,超时返回 False
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+        while not self.connected.is_set():
+            remain = utime.ticks_diff(deadline, utime.ticks_ms())
+            if remain <= 0:
+                return False
+            if self._post is not None:
+                self._post((self._event_id, 0))
+            self.connected.wait(min(remain, poll_ms))
+        return True
+
+    def describe(self):
+        return 'a2dp: {}, avrcp: {}'.format(
+            A2DP_AVRCP_CONNECT_STATUS.name(self.state['a2dp']), A2DP_AVRCP_CONNECT_STATUS.name(self.state['avrcp']))
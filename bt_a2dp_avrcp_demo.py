@@ -7,25 +7,77 @@
 下一首以及设置音量的功能
 """
 import bt
-import utime
 import _thread
-from queue import Queue
 from machine import Pin
+from bt_event import EventDispatcher, EVENT_CONTINUE
+from bt_addr import addr_to_mac
+from bt_enum import BtEnum
+from bt_trace import TraceRecorder
+from bt_queue import EventRing, DROP_OLDEST
+from bt_a2dp import A2dpLink, A2DP_POLL_FALLBACK_MS, A2DP_REFRESH_EVENT
+from bt_sync import Signal
+from bt_boot import BtReady, BootProfile
+from bt_adapter import AdapterConfig
+from bt_log import Logger, LOG_EVENT
+from bt_latency import LatencyMonitor
+from bt_executor import Executor, EXECUTOR_DONE_EVENT
+from bt_avrcp import AvrcpPipeline, AVRCP_CMD, AVRCP_TIMER_EVENT
+
+BT_EVENT = BtEnum({
+    'BT_START_STATUS_IND': 0,          # bt/ble start
+    'BT_STOP_STATUS_IND': 1,           # bt/ble stop
+})
 
 BT_STATUS_DICT = {
     'BT_NOT_RUNNING': 0,
     'BT_IS_RUNNING': 1
 }
 
-A2DP_AVRCP_CONNECT_STATUS = {
-    'DISCONNECTED': 0,
-    'CONNECTING': 1,
-    'CONNECTED': 2,
-    'DISCONNECTING': 3
-}
-
 host_addr = 0
-msg_queue = Queue(10)
+
+# 置为 True 时事件入队时记录时间戳,统计每种事件的排队耗时和处理耗时,退出时输出统计结果
+BT_LATENCY = False
+bt_latency = LatencyMonitor(BT_EVENT) if BT_LATENCY else None
+
+# 回调事件进入无锁环形队列,回调中不允许阻塞,队列满时覆盖最早的消息;
+# 控制台命令、执行器完成事件等来自其他线程,通过 msg_queue.post 加锁入队,满时不覆盖已有消息,而是返回 False
+msg_queue = EventRing(10, DROP_OLDEST, stamp=BT_LATENCY)
+
+# AVRCP 控制命令在工作线程中按输入顺序执行,执行期间事件处理线程仍可以处理连接状态事件;
+# 命令先经过 avrcp_pipeline:连续的音量设置只发送最后一次,不改变播放状态的播放/暂停不发送,切歌命令按手机能接受的间隔发送
+avrcp_executor = Executor(msg_queue.post, 1, 4)
+
+
+def avrcp_cmd_done(cmd, status, retval):
+    if status != 0 or retval != 0:
+        log.error('AVRCP command {} failed, {}', AVRCP_CMD.name(cmd), retval)
+
+avrcp_pipeline = AvrcpPipeline(avrcp_executor, msg_queue.post, avrcp_cmd_done)
+
+# 输入命令 6 时由事件处理线程取消待发送的命令并记录统计,完成后置位 avrcp_stopped,
+# 主线程最多等待 A2DP_EXIT_TIMEOUT_MS 再断开连接,不直接访问事件处理线程中的管道状态
+A2DP_EXIT_TIMEOUT_MS = 2000
+avrcp_stopped = Signal()
+
+# bt.start() 之后等待 BT_START_STATUS_IND 再设置名称和可见模式,不再固定等待 1.5 秒
+bt_ready = BtReady()
+
+# 名称、可见模式(3:可以被发现并且可以被连接)、音频输出通道,只设置与缓存值不同的项;
+# verify 置为 True 时设置后读回确认
+a2dp_adapter = AdapterConfig('QuecPython-a2dp', 3, 2, verify=False)
+
+# 事件处理线程中的日志只写入环形缓冲区,输入命令 7 时才格式化输出,避免打断控制台输入;
+# BT_LOG_LEVEL 设置为 LOG_INFO 时不再记录每个事件的日志
+BT_LOG_LEVEL = LOG_EVENT
+log = Logger(64, BT_LOG_LEVEL, BT_EVENT)
+
+# A2DP 和 AVRCP 的连接状态,只在事件处理线程中更新;每个回调事件都会触发一次连接状态检查,
+# 主线程等待连接时定时投递 A2DP_REFRESH_EVENT 作为兜底
+a2dp_link = A2dpLink(log, avrcp_pipeline, msg_queue.post)
+
+# 设置为文件路径(如 '/usr/bt_a2dp.trace')后,记录回调收到的所有事件,可以用 bt_trace.replay 离线回放
+BT_TRACE_FILE = None
+bt_trace = TraceRecorder(BT_TRACE_FILE) if BT_TRACE_FILE else None
 
 # 如果对应播放通道外置了PA,且需要引脚控制PA开启,则需要下面步骤
 # 具体使用哪个GPIO取决于实际使用的引脚
@@ -55,143 +107,158 @@ def cmd_proc(cmd):
         print('Command {} is not supported!'.format(cmd))
         return -1
 
-def avrcp_play(args):
-    return bt.avrcpStart()
+def bt_callback(args):
+    global msg_queue
+    if bt_trace is not None:
+        bt_trace.record(args)
+    msg_queue.put_nowait(args)
 
-def avrcp_pause(args):
-    return bt.avrcpPause()
+def bt_start_status_ind(msg):
+    log.event(msg[0], 'status: {}', msg[1])
+    bt_ready.resolve(msg[1])
+    return EVENT_CONTINUE
 
-def avrcp_prev(args):
-    return bt.avrcpPrev()
+def avrcp_cmd_handler(cmd):
+    def handler(msg):
+        log.event(msg[0], 'recv msg: {}', msg)
+        if not avrcp_pipeline.submit(cmd, msg[1]):
+            log.warn('AVRCP command {} dropped, too many pending skips.', AVRCP_CMD.name(cmd))
+        return EVENT_CONTINUE
+    return handler
 
-def avrcp_next(args):
-    return bt.avrcpNext()
+def avrcp_exit(msg):
+    log.event(msg[0], 'recv msg: {}', msg)
+    avrcp_pipeline.cancel()
+    log.info('avrcp stats: {}', avrcp_pipeline.stats())
+    if bt_latency is not None:
+        bt_latency.report(log.info)
+    avrcp_stopped.set()
+    return EVENT_CONTINUE
 
-def avrcp_set_volume(vol):
-    return bt.avrcpSetVolume(vol)
+def avrcp_executor_event(msg):
+    avrcp_executor.on_event(msg)
+    return EVENT_CONTINUE
 
-def bt_callback(args):
-    pass
+def avrcp_timer_event(msg):
+    avrcp_pipeline.on_event(msg)
+    return EVENT_CONTINUE
+
+def a2dp_dispatcher_init():
+    dispatcher = EventDispatcher(BT_EVENT)
+    # 控制台输入的命令以命令字符串作为消息ID,和回调事件在同一个表中分发
+    dispatcher.register('1', avrcp_cmd_handler(AVRCP_CMD.PLAY))
+    dispatcher.register('2', avrcp_cmd_handler(AVRCP_CMD.PAUSE))
+    dispatcher.register('3', avrcp_cmd_handler(AVRCP_CMD.PREV))
+    dispatcher.register('4', avrcp_cmd_handler(AVRCP_CMD.NEXT))
+    dispatcher.register('5', avrcp_cmd_handler(AVRCP_CMD.VOLUME))
+    dispatcher.register('6', avrcp_exit)
+    dispatcher.register(EXECUTOR_DONE_EVENT, avrcp_executor_event)
+    dispatcher.register(AVRCP_TIMER_EVENT, avrcp_timer_event)
+    dispatcher.register(A2DP_REFRESH_EVENT, a2dp_link.refresh_ind)
+    dispatcher.on('BT_START_STATUS_IND', bt_start_status_ind)
+    # A2DP/AVRCP 的连接、断开等事件都会触发一次连接状态检查
+    dispatcher.set_default(a2dp_link.conn_event)
+    return dispatcher
 
 def bt_a2dp_avrcp_proc_task():
     global msg_queue
 
-    cmd_handler = {
-        '1': avrcp_play,
-        '2': avrcp_pause,
-        '3': avrcp_prev,
-        '4': avrcp_next,
-        '5': avrcp_set_volume,
-    }
+    dispatcher = a2dp_dispatcher_init()
+    dispatcher.set_latency(bt_latency)
     while True:
         # print('wait msg...')
         msg = msg_queue.get()
-        print('recv msg: {}'.format(msg))
-        cmd_handler.get(msg[0])(msg[1])
+        dispatcher.dispatch(msg, msg_queue.last_stamp)
+        if bt_trace is not None:
+            bt_trace.flush(True)
 
 
 def main():
     global host_addr
     global msg_queue
 
+    avrcp_executor.start()
     _thread.start_new_thread(bt_a2dp_avrcp_proc_task, ())
+    boot = BootProfile('A2DP/AVRCP')
     bt.init(bt_callback)
-    bt.setChannel(2)
+    if a2dp_adapter.apply(('channel',)) != 0:
+        return -1
+    boot.mark('init')
     retval = bt.a2dpavrcpInit()
     if retval == 0:
         print('BT A2DP/AVRCP initialization succeeded.')
     else:
         print('BT A2DP/AVRCP initialization failed.')
         return -1
+    boot.mark('profile init')
 
     retval = bt.start()
     if retval != 0:
         print('BT start failed.')
         return -1
-
-    utime.sleep_ms(1500)
-
-    old_name = bt.getLocalName()
-    if old_name == -1:
-        print('Get BT name error.')
-        return -1
-    print('The current BT name is {}'.format(old_name[1]))
-    new_name = 'QuecPython-a2dp'
-    print('Set new BT name to {}'.format(new_name))
-    retval = bt.setLocalName(0, new_name)
-    if retval == -1:
-        print('Set BT name failed.')
+    status = bt_ready.wait()
+    if status is None:
+        print('BT start timeout.')
         return -1
-    cur_name = bt.getLocalName()
-    if cur_name == -1:
-        print('Get new BT name error.')
+    elif status != 0:
+        print('BT start failed, status: {}'.format(status))
         return -1
-    else:
-        if cur_name[1] == new_name:
-            print('BT name changed successfully.')
-        else:
-            print('BT name changed failed.')
+    boot.mark('start')
 
-    visible_mode = bt.getVisibleMode()
-    if visible_mode != -1:
-        print('The current BT visible mode is {}'.format(visible_mode))
-    else:
-        print('Get BT visible mode error.')
+    if a2dp_adapter.apply(('name',)) != 0:
         return -1
+    boot.mark('name')
 
-    print('Set BT visible mode to 3.')
-    retval = bt.setVisibleMode(3)
-    if retval == -1:
-        print('Set BT visible mode error.')
+    if a2dp_adapter.apply(('visible_mode',)) != 0:
         return -1
+    boot.mark('visibility')
+    boot.report()
 
     print('BT reconnect check start......')    
     bt.reconnect_set(25, 2)
     bt.reconnect()
 
-    count = 0
+    while not a2dp_link.wait_connected(A2DP_POLL_FALLBACK_MS):
+        print('waiting to be connected... {}'.format(a2dp_link.describe()))
+    print('========== BT connected! =========')
+    addr = bt.a2dpGetAddr()
+    if addr != -1:
+        mac = addr_to_mac(addr)
+        print('The BT address on the host side: {}'.format(mac))
+        host_addr = addr
+    else:
+        print('Get BT addr error.')
+        return -1
+    print('Please open the music player software on your phone first.')
+    print('Please enter the following options to select a function:')
+    print('========================================================')
+    print('1 : play')
+    print('2 : pause')
+    print('3 : prev')
+    print('4 : next')
+    print('5 : set volume')
+    print('6 : exit')
+    print('7 : show event log')
+    print('========================================================')
     while True:
-        count += 1
-        if count % 5 == 0:
-            print('waiting to be connected...')
-        if count >= 10000:
-            count = 0
-        a2dp_status = bt.a2dpGetConnStatus()
-        avrcp_status = bt.avrcpGetConnStatus()
-        if a2dp_status == A2DP_AVRCP_CONNECT_STATUS['CONNECTED'] and avrcp_status == A2DP_AVRCP_CONNECT_STATUS['CONNECTED']:
-            print('========== BT connected! =========')
-            addr = bt.a2dpGetAddr()
-            if addr != -1:
-                mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-                print('The BT address on the host side: {}'.format(mac))
-                host_addr = addr
-            else:
-                print('Get BT addr error.')
-                return -1
-            print('Please open the music player software on your phone first.')
-            print('Please enter the following options to select a function:')
-            print('========================================================')
-            print('1 : play')
-            print('2 : pause')
-            print('3 : prev')
-            print('4 : next')
-            print('5 : set volume')
-            print('6 : exit')
-            print('========================================================')
-            while True:
-                tmp = input('> ')
-                if len(tmp) != 1:
-                    cmd = tmp.split('> ')[1]
-                else:
-                    cmd = tmp
-                if cmd == '6':
-                    break
-                retval = cmd_proc(cmd)
-                if retval != -1:
-                    msg_queue.put(retval)
-            break
+        tmp = input('> ')
+        if len(tmp) != 1:
+            cmd = tmp.split('> ')[1]
         else:
-            utime.sleep_ms(1000)
+            cmd = tmp
+        if cmd == '6':
+            if not msg_queue.post((cmd, 0)):
+                print('Exit command dropped, too many pending commands.')
+            elif not avrcp_stopped.wait(A2DP_EXIT_TIMEOUT_MS):
+                print('Event thread did not stop the AVRCP pipeline in time.')
+            break
+        if cmd == '7':
+            log.drain()
+            continue
+        retval = cmd_proc(cmd)
+        if retval != -1 and not msg_queue.post(retval):
+            print('Command {} dropped, too many pending commands, try again later.'.format(cmd))
+    log.drain()
     print('Ready to disconnect a2dp.')
     retval = bt.a2dpDisconnect(host_addr)
     if retval == 0:
@@ -206,6 +273,8 @@ def main():
         print('BT stop error.')
     bt.a2dpavrcpRelease()
     bt.release()
+    if bt_trace is not None:
+        bt_trace.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,126 @@
+#BT 本机配置公共模块
+
+"""
+说明:保存本机期望的蓝牙配置(名称、可见模式、音频输出通道),并缓存最近一次确认过的值,
+apply 时只调用与缓存值不同的 set 接口,启动阶段不再每次都 get/set/get 一遍
+verify 为 True 时,set 之后再读回确认;默认不读回,set 接口返回成功即认为生效
+bt.stop()/bt.release() 之后协议栈可能恢复默认配置,需要调用 invalidate 清除缓存
+"""
+import bt
+from bt_log import PRINT_LOG
+
+ADAPTER_FIELDS = ('name', 'visible_mode', 'channel')
+ADAPTER_FIELD_DESC = {
+    'name': 'BT name',
+    'visible_mode': 'BT visible mode',
+    'channel': 'audio output channel',
+}
+
+
+def _set_name(value):
+    if bt.setLocalName(0, value) == -1:
+        return -1
+    return 0
+
+def _get_name():
+    retval = bt.getLocalName()
+    if retval == -1:
+        return None
+    return retval[1]
+
+def _set_visible_mode(value):
+    return bt.setVisibleMode(value)
+
+def _get_visible_mode():
+    retval = bt.getVisibleMode()
+    if retval == -1:
+        return None
+    return retval
+
+def _set_channel(value):
+    return bt.setChannel(value)
+
+
+_SETTERS = {
+    'name': _set_name,
+    'visible_mode': _set_visible_mode,
+    'channel': _set_channel,
+}
+
+# 输出通道没有查询接口,无法读回
+_GETTERS = {
+    'name': _get_name,
+    'visible_mode': _get_visible_mode,
+}
+
+
+class AdapterConfig(object):
+    def __init__(self, name=None, visible_mode=None, channel=None, verify=False, log=None):
+        # 值为 None 的配置项不做设置
+        # log 为 bt_log.Logger,在事件处理线程中 apply 时使用;为 None 时直接 print,只在主线程中设置时可以不传
+        self.log = log
+        self._want = {'name': name, 'visible_mode': visible_mode, 'channel': channel}
+        self._known = {}
+        self.verify = verify
+        self.calls = 0  # 调用 bt 接口的次数
+        self.skipped = 0  # 因为与缓存值相同而省去的 set 次数
+
+    def set(self, field, value):
+        self._want[field] = value
+
+    def get(self, field):
+        return self._want[field]
+
+    def known(self, field):
+        # 返回最近一次确认过的值,未知时返回 None
+        return self._known.get(field)
+
+    def invalidate(self, field=None):
+        if field is None:
+            self._known.clear()
+        elif field in self._known:
+            del self._known[field]
+
+    def refresh(self, fields=ADAPTER_FIELDS):
+        # 从协议栈读取当前值更新缓存
+        for field in fields:
+            getter = _GETTERS.get(field)
+            if getter is None:
+                continue
+            self.calls += 1
+            value = getter()
+            if value is None:
+                self.invalidate(field)
+            else:
+                self._known[field] = value
+
+    def apply(self, fields=ADAPTER_FIELDS):
+        # 成功返回 0,任意一项设置或读回确认失败返回 -1
+        log = PRINT_LOG if self.log is None else self.log
+        for field in fields:
+            value = self._want[field]
+            if value is None:
+                continue
+            if self._known.get(field) == value:
+                self.skipped += 1
+                continue
+            desc = ADAPTER_FIELD_DESC[field]
+            self.calls += 1
+            if _SETTERS[field](value) != 0:
+                log.error('{} set failed.', desc)
+                self.invalidate(field)
+                return -1
+            self._known[field] = value
+            getter = _GETTERS.get(field)
+            if self.verify and getter is not None:
+                self.calls += 1
+                current = getter()
+                if current != value:
+                    log.error('{} verify failed, expect {}, got {}.', desc, value, current)
+                    self.invalidate(field)
+                    return -1
+            log.info('{} set to {}.', desc, value)
+        return 0
+
+    def stats(self):
+        return {'calls': self.calls, 'skipped': self.skipped}
@@ -0,0 +1,91 @@
+#BT 地址公共模块
+
+"""
+说明:提供带缓存的 BT 地址格式化功能,供各示例程序共用
+回调上报的地址为 6 字节原始数据(低字节在前,设备上通常为 bytearray),查找时直接与缓存中的地址逐个比较
+(bytes 与 bytearray 可以直接比较,不产生新对象),同一个对端设备只在第一次出现时拷贝一次:
+  addr_key(addr)             返回缓存的整数形式地址,与 MAC 字符串一一对应,用于比较和作为字典键
+  addr_bytes(addr)           返回缓存中该地址的 bytes 对象,需要把地址传给 bt 接口(连接、重连)时保存,调用方不需要再 bytes(addr)
+  addr_to_mac(addr)          返回缓存的 MAC 字符串,第一次使用时生成
+  event_key(event_id, addr)  返回缓存的 (事件类型, 整数地址) 元组,可以直接作为状态类事件的合并键
+缓存容量固定,超出后淘汰最早加入的地址;每个地址的缓存项整体替换,回调和事件处理线程可以同时使用,不需要加锁
+"""
+
+ADDR_CACHE_SIZE = 8
+
+
+class AddrCache(object):
+    def __init__(self, size=ADDR_CACHE_SIZE):
+        self._size = size
+        self.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, addr):
+        entries = self._entries
+        i = 0
+        while i < self._size:
+            entry = entries[i]
+            if entry is not None and entry[0] == addr:
+                self.hits += 1
+                return entry
+            i += 1
+
+        self.misses += 1
+        cached = addr if isinstance(addr, bytes) else bytes(addr)
+        key = 0
+        for i in range(5, -1, -1):
+            key = (key << 8) | cached[i]
+        # 地址的 bytes 对象、MAC 字符串(第一次使用时生成)、事件类型 -> 合并键、整数地址
+        entry = [cached, None, {}, key]
+        i = self._next
+        self._next = (i + 1) % self._size
+        entries[i] = entry
+        return entry
+
+    def key(self, addr):
+        return self._entry(addr)[3]
+
+    def addr(self, addr):
+        return self._entry(addr)[0]
+
+    def mac(self, addr):
+        entry = self._entry(addr)
+        mac = entry[1]
+        if mac is None:
+            a = entry[0]
+            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(a[5], a[4], a[3], a[2], a[1], a[0])
+            entry[1] = mac
+        return mac
+
+    def event_key(self, event_id, addr):
+        entry = self._entry(addr)
+        keys = entry[2]
+        key = keys.get(event_id)
+        if key is None:
+            key = (event_id, entry[3])
+            keys[event_id] = key
+        return key
+
+    def clear(self):
+        self._entries = [None] * self._size
+        self._next = 0
+
+
+_addr_cache = AddrCache()
+
+
+def addr_key(addr):
+    return _addr_cache.key(addr)
+
+
+def addr_bytes(addr):
+    return _addr_cache.addr(addr)
+
+
+def addr_to_mac(addr):
+    return _addr_cache.mac(addr)
+
+
+def event_key(event_id, addr):
+    return _addr_cache.event_key(event_id, addr)
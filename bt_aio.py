@@ -0,0 +1,126 @@
+#BT 协程运行公共模块
+
+"""
+说明:提供 BtRuntime 协程模式(aio=True)使用的 uasyncio 相关部分,事件处理、日志输出和阻塞调用都作为协程运行在同一个线程中,
+不再为事件处理、日志、执行器各创建一个线程,节省线程栈占用的内存
+ThreadSafeFlag: bt_callback 运行在协议栈的回调上下文中,入队后调用 set 唤醒等待中的事件处理协程;
+                uasyncio 自带该类型,在 CPython 的 asyncio 上运行 benchmark 时使用这里基于 call_soon_threadsafe 的实现
+TaskExecutor: 与 bt_executor.Executor 接口相同,每个任务作为一个协程按提交顺序执行,
+              执行前先让出一次,当前事件处理完后才执行;native 调用本身仍会阻塞事件循环,
+              done 回调直接在事件循环中调用,不再经过事件队列
+"""
+import utime
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from bt_executor import EXECUTOR_CAPACITY
+
+try:
+    sleep_ms = asyncio.sleep_ms
+except AttributeError:
+    def sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+try:
+    ThreadSafeFlag = asyncio.ThreadSafeFlag
+except AttributeError:
+    class ThreadSafeFlag(object):
+        def __init__(self):
+            self._loop = None
+            self._event = None
+            self._flag = False
+
+        def set(self):
+            # 可以在任意线程中调用
+            self._flag = True
+            loop = self._loop
+            if loop is not None:
+                loop.call_soon_threadsafe(self._event.set)
+
+        async def wait(self):
+            if self._loop is None:
+                self._loop = asyncio.get_event_loop()
+                self._event = asyncio.Event()
+            while not self._flag:
+                await self._event.wait()
+                self._event.clear()
+            self._flag = False
+
+
+class TaskExecutor(object):
+    def __init__(self, capacity=EXECUTOR_CAPACITY, notify_ok=True, on_drain=None):
+        self._cap = capacity
+        self._notify_ok = notify_ok
+        self._on_drain = on_drain
+        self._blocked = False
+        self._pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.high_water = 0
+        self.run_us_max = 0
+        self.run_us_total = 0
+
+    def start(self):
+        pass
+
+    def submit(self, func, args=(), done=None):
+        # 在事件循环中调用,返回提交后待执行的任务数,已满时返回 -1
+        if self._pending >= self._cap:
+            self._blocked = True
+            self.rejected += 1
+            return -1
+        self._pending += 1
+        self.submitted += 1
+        if self._pending > self.high_water:
+            self.high_water = self._pending
+        asyncio.create_task(self._run(func, args, done))
+        return self._pending
+
+    async def _run(self, func, args, done):
+        await asyncio.sleep(0)
+        start = utime.ticks_us()
+        try:
+            retval = func(*args)
+            status = 0
+        except Exception as e:
+            retval = e
+            status = -1
+        cost = utime.ticks_diff(utime.ticks_us(), start)
+        self._pending -= 1
+        self.run_us_total += cost
+        if cost > self.run_us_max:
+            self.run_us_max = cost
+        ok = status == 0 and (retval == 0 or retval is None)
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        if done is not None and (ok is False or self._notify_ok):
+            done(status, retval)
+        if self._blocked and self._pending == 0:
+            self._blocked = False
+            if self._on_drain is not None:
+                self._on_drain(0, None)
+
+    def on_event(self, msg):
+        msg[2](msg[1], msg[3])
+
+    def pending(self):
+        return self._pending
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+            'pending': self._pending,
+            'high_water': self.high_water,
+            'run_us_max': self.run_us_max,
+            'run_us_avg': self.run_us_total // (self.completed + self.failed) if self.completed + self.failed else None,
+        }
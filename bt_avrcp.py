@@ -0,0 +1,238 @@
+#BT AVRCP 命令管道公共模块
+
+"""
+说明:播放控制命令逐条调用 bt.avrcpStart/avrcpPause/avrcpNext/avrcpSetVolume 时,连续调节音量会变成一串 AVRCP 调用,
+手机已经在播放时也会再发送一次播放命令
+AvrcpPipeline 在事件处理线程中接收命令,命令先进入待发送列表,同一时刻只有一条命令交给执行器,上一条完成后再发送下一条:
+  音量:待发送列表中已有音量命令时直接改为新值(位置不变)
+  播放/暂停:待发送列表中尚未发送的播放/暂停命令被新命令取代
+  发送前与缓存的播放状态和音量比较,不会改变状态的命令直接丢弃
+  上一首/下一首:两次发送至少间隔 skip_interval_ms(间隔太短时手机会忽略后面的命令),间隔不够时启动定时器,
+                 到期后向事件队列投递 event_id 事件,由事件处理线程调用 on_event 继续发送;
+                 待发送的切歌命令已有 skip_backlog 条时丢弃新命令
+缓存的播放状态和音量来自最近发出的命令,手机上也可以直接操作播放,因此缓存只在 state_ttl_ms 内有效;
+命令执行失败或者 AVRCP 重新连接时调用 invalidate 清除缓存
+stats 中 sent 为实际调用 native 接口的次数,suppressed 为合并或丢弃的命令数
+执行器的完成事件被事件队列丢弃时不会调用 done,超过 cmd_timeout_ms 仍未完成的命令视为已结束,管道不会一直停住
+"""
+import bt
+import utime
+import osTimer
+from bt_enum import BtEnum
+
+AVRCP_CMD = BtEnum({
+    'PLAY': 1,
+    'PAUSE': 2,
+    'PREV': 3,
+    'NEXT': 4,
+    'VOLUME': 5,
+})
+AVRCP_PLAY_STATE = BtEnum({
+    'UNKNOWN': 0,
+    'PLAYING': 1,
+    'PAUSED': 2,
+})
+
+AVRCP_TIMER_EVENT = 1002
+AVRCP_SKIP_INTERVAL_MS = 800
+AVRCP_SKIP_BACKLOG = 2
+AVRCP_STATE_TTL_MS = 5000
+AVRCP_CMD_TIMEOUT_MS = 3000
+
+
+class AvrcpPipeline(object):
+    def __init__(self, executor, post, done=None, skip_interval_ms=AVRCP_SKIP_INTERVAL_MS, skip_backlog=AVRCP_SKIP_BACKLOG,
+                 state_ttl_ms=AVRCP_STATE_TTL_MS, cmd_timeout_ms=AVRCP_CMD_TIMEOUT_MS, event_id=AVRCP_TIMER_EVENT):
+        # executor 为 bt_executor.Executor(或 TaskExecutor);post(msg) 向事件队列投递消息,
+        # 在定时器线程中调用,需要支持多个生产者(如 EventRing.post),不能使用回调专用的 put_nowait
+        # done(命令, 状态, 返回值) 在每条命令执行完成后在事件处理线程中调用
+        self._executor = executor
+        self._post = post
+        self._done_cb = done
+        self._skip_interval = skip_interval_ms
+        self._skip_backlog = skip_backlog
+        self._ttl = state_ttl_ms
+        self._cmd_timeout = cmd_timeout_ms
+        self._event_id = event_id
+        self._pending = []  # [命令, 参数]
+        self._inflight = None
+        self._inflight_at = 0
+        self._last_skip = None
+        self._timer = None
+        self.state = AVRCP_PLAY_STATE.UNKNOWN
+        self.volume = None
+        self._state_at = 0
+        self._volume_at = 0
+        self.sent = 0
+        self.suppressed = 0
+        self.merged = 0
+        self.superseded = 0
+        self.unchanged = 0
+        self.skip_dropped = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    def submit(self, cmd, arg=0):
+        # 在事件处理线程中调用;返回 False 表示命令被丢弃(待发送的切歌命令过多)
+        if cmd == AVRCP_CMD.VOLUME:
+            accepted = self._merge_volume(arg)
+        elif cmd == AVRCP_CMD.PLAY or cmd == AVRCP_CMD.PAUSE:
+            accepted = self._supersede(cmd)
+        else:
+            accepted = self._queue_skip(cmd)
+        self._pump()
+        return accepted
+
+    def _merge_volume(self, vol):
+        for entry in self._pending:
+            if entry[0] == AVRCP_CMD.VOLUME:
+                entry[1] = vol
+                self.merged += 1
+                self.suppressed += 1
+                return True
+        self._pending.append([AVRCP_CMD.VOLUME, vol])
+        return True
+
+    def _supersede(self, cmd):
+        i = 0
+        while i < len(self._pending):
+            if self._pending[i][0] == AVRCP_CMD.PLAY or self._pending[i][0] == AVRCP_CMD.PAUSE:
+                self._pending.pop(i)
+                self.superseded += 1
+                self.suppressed += 1
+            else:
+                i += 1
+        self._pending.append([cmd, 0])
+        return True
+
+    def _queue_skip(self, cmd):
+        skips = 0
+        for entry in self._pending:
+            if entry[0] == AVRCP_CMD.PREV or entry[0] == AVRCP_CMD.NEXT:
+                skips += 1
+        if skips >= self._skip_backlog:
+            self.skip_dropped += 1
+            self.suppressed += 1
+            return False
+        self._pending.append([cmd, 0])
+        return True
+
+    def _fresh(self, at):
+        return utime.ticks_diff(utime.ticks_ms(), at) < self._ttl
+
+    def _is_unchanged(self, cmd, arg):
+        if cmd == AVRCP_CMD.VOLUME:
+            return self.volume == arg and self._fresh(self._volume_at)
+        if cmd == AVRCP_CMD.PLAY:
+            return self.state == AVRCP_PLAY_STATE.PLAYING and self._fresh(self._state_at)
+        if cmd == AVRCP_CMD.PAUSE:
+            return self.state == AVRCP_PLAY_STATE.PAUSED and self._fresh(self._state_at)
+        return False
+
+    def _pump(self):
+        if self._inflight is not None:
+            remain = self._cmd_timeout - utime.ticks_diff(utime.ticks_ms(), self._inflight_at)
+            if remain > 0:
+                if self._pending:
+                    self._arm(remain)
+                return
+            # 完成事件丢失
+            self._inflight = None
+            self.timeouts += 1
+        while self._pending:
+            entry = self._pending[0]
+            if not self._is_unchanged(entry[0], entry[1]):
+                break
+            self._pending.pop(0)
+            self.unchanged += 1
+            self.suppressed += 1
+        else:
+            return
+        cmd, arg = entry
+        if cmd == AVRCP_CMD.PREV or cmd == AVRCP_CMD.NEXT:
+            if self._last_skip is not None:
+                wait = self._skip_interval - utime.ticks_diff(utime.ticks_ms(), self._last_skip)
+                if wait > 0:
+                    self._arm(wait)
+                    return
+        if cmd == AVRCP_CMD.VOLUME:
+            func, args = bt.avrcpSetVolume, (arg,)
+        elif cmd == AVRCP_CMD.PLAY:
+            func, args = bt.avrcpStart, ()
+        elif cmd == AVRCP_CMD.PAUSE:
+            func, args = bt.avrcpPause, ()
+        elif cmd == AVRCP_CMD.PREV:
+            func, args = bt.avrcpPrev, ()
+        else:
+            func, args = bt.avrcpNext, ()
+        if self._executor.submit(func, args, lambda status, retval: self._done(entry, status, retval)) < 0:
+            # 执行器被其他任务占满,稍后重试
+            self._arm(self._skip_interval)
+            return
+        self._pending.pop(0)
+        now = utime.ticks_ms()
+        self._inflight = entry
+        self._inflight_at = now
+        self.sent += 1
+        # 发出命令时即更新缓存,之后的命令与执行中的命令比较;执行失败时清除
+        if cmd == AVRCP_CMD.VOLUME:
+            self.volume = arg
+            self._volume_at = now
+        elif cmd == AVRCP_CMD.PLAY:
+            self.state = AVRCP_PLAY_STATE.PLAYING
+            self._state_at = now
+        elif cmd == AVRCP_CMD.PAUSE:
+            self.state = AVRCP_PLAY_STATE.PAUSED
+            self._state_at = now
+        else:
+            self._last_skip = now
+
+    def _done(self, entry, status, retval):
+        if entry is self._inflight:
+            self._inflight = None
+        if status != 0 or retval != 0:
+            self.failed += 1
+            self.invalidate()
+        if self._done_cb is not None:
+            self._done_cb(entry[0], status, retval)
+        self._pump()
+
+    def _arm(self, delay):
+        if self._timer is None:
+            self._timer = osTimer()
+        post = self._post
+        event_id = self._event_id
+        self._timer.stop()
+        self._timer.start(delay, 0, lambda args: post((event_id, 0)))
+
+    def on_event(self, msg):
+        # 事件处理线程中收到 event_id 事件时调用
+        self._pump()
+
+    def invalidate(self):
+        self.state = AVRCP_PLAY_STATE.UNKNOWN
+        self.volume = None
+
+    def pending(self):
+        return len(self._pending) + (0 if self._inflight is None else 1)
+
+    def cancel(self):
+        # 在事件处理线程中调用:丢弃待发送的命令,停止定时器
+        self._pending = []
+        if self._timer is not None:
+            self._timer.stop()
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'suppressed': self.suppressed,
+            'merged': self.merged,
+            'superseded': self.superseded,
+            'unchanged': self.unchanged,
+            'skip_dropped': self.skip_dropped,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'pending': self.pending(),
+            'state': AVRCP_PLAY_STATE.name(self.state),
+            'volume': self.volume,
+        }
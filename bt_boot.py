@@ -0,0 +1,65 @@
+#BT 启动流程公共模块
+
+"""
+说明:bt.start() 返回后协议栈还需要一段时间才能真正启动,启动完成时上报 BT_START_STATUS_IND
+BtReady: 在 BT_START_STATUS_IND 的处理函数中调用 resolve(status),主线程调用 wait 等待启动结果,
+         不再使用固定时长的 sleep,启动需要多久就等待多久,超时则认为启动失败
+BootProfile: 记录从 bt.init 到设备可以被发现的各个阶段(init、profile init、start、name、visibility)的耗时
+abort_start: 启动超时时在主线程中调用,停止 BT 后由事件处理线程在处理 BT_STOP_STATUS_IND 时释放资源,主线程不再释放,
+             避免两个线程重复释放;协议栈没有上报停止结果时投递一个停止事件
+"""
+import bt
+import utime
+from bt_sync import Future
+from bt_lifecycle import LIFECYCLE_STATE
+
+BT_START_TIMEOUT_MS = 5000
+BT_STOP_TIMEOUT_MS = 3000
+
+
+class BtReady(object):
+    def __init__(self):
+        self._future = Future()
+
+    def resolve(self, status):
+        # 在 BT_START_STATUS_IND 的处理函数中调用,status 为 0 表示启动成功
+        self._future.set_result(status)
+
+    def reset(self):
+        self._future.reset()
+
+    def wait(self, timeout_ms=BT_START_TIMEOUT_MS):
+        # 返回启动状态,超时返回 None
+        return self._future.result(timeout_ms)
+
+
+class BootProfile(object):
+    def __init__(self, name):
+        self._name = name
+        self._start = utime.ticks_ms()
+        self._last = self._start
+        self._phases = []
+
+    def mark(self, phase):
+        # 记录从上一次 mark(或创建)到现在的耗时,作为 phase 阶段的耗时
+        now = utime.ticks_ms()
+        self._phases.append((phase, utime.ticks_diff(now, self._last)))
+        self._last = now
+
+    def total(self):
+        return utime.ticks_diff(self._last, self._start)
+
+    def phases(self):
+        return self._phases
+
+    def report(self, out=print):
+        # 在事件处理线程中调用时 out 使用 log.info
+        items = ['{}: {} ms'.format(phase, ms) for phase, ms in self._phases]
+        out('{} boot time {} ms ({})'.format(self._name, self.total(), ', '.join(items)))
+
+
+def abort_start(lifecycle, post, stop_event, timeout_ms=BT_STOP_TIMEOUT_MS):
+    # post 为事件队列的 post,stop_event 为 BT_STOP_STATUS_IND 的事件ID;返回时资源已经释放
+    if bt.stop() != 0 or not lifecycle.wait(LIFECYCLE_STATE.RELEASED, timeout_ms):
+        post((stop_event, 0))
+        lifecycle.wait(LIFECYCLE_STATE.RELEASED)
@@ -0,0 +1,91 @@
+#BT 设备缓存公共模块
+
+"""
+说明:把搜索或连接过的设备信息(名称、地址、最近一次RSSI、最近一次发现时间)保存在 flash 文件中,
+下次启动时可以直接向缓存中的地址发起连接,连接失败再回退到搜索流程,省去每次十几秒的搜索时间
+缓存条目数量有上限,超出后淘汰最久未见的设备
+"""
+import utime
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+DEVICE_CACHE_FILE = '/usr/bt_devices.json'
+DEVICE_CACHE_SIZE = 8
+
+
+class DeviceCache(object):
+    def __init__(self, path=DEVICE_CACHE_FILE, size=DEVICE_CACHE_SIZE):
+        self._path = path
+        self._size = size
+        self._devices = {}  # 地址的十六进制字符串 -> 设备信息
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self._path, 'r') as f:
+                self._devices = json.load(f)
+        except (OSError, ValueError):
+            self._devices = {}
+        self._dirty = False
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            with open(self._path, 'w') as f:
+                json.dump(self._devices, f)
+            self._dirty = False
+        except OSError as e:
+            print('Save BT device cache failed: {}'.format(e))
+
+    def update(self, name, addr, rssi=None, connect_ms=None):
+        key = binascii.hexlify(bytes(addr)).decode()
+        entry = self._devices.get(key)
+        if entry is None:
+            if len(self._devices) >= self._size:
+                oldest = None
+                for k, v in self._devices.items():
+                    if oldest is None or v['seen'] < self._devices[oldest]['seen']:
+                        oldest = k
+                del self._devices[oldest]
+            entry = {'name': name, 'rssi': None, 'connect_ms': None}
+            self._devices[key] = entry
+        if name is not None:
+            entry['name'] = name
+        if rssi is not None:
+            entry['rssi'] = rssi
+        if connect_ms is not None:
+            entry['connect_ms'] = connect_ms
+        entry['seen'] = utime.time()
+        self._dirty = True
+
+    def remove(self, addr):
+        key = binascii.hexlify(bytes(addr)).decode()
+        if key in self._devices:
+            del self._devices[key]
+            self._dirty = True
+
+    def find(self, names):
+        # names 为一个设备名称或多个可接受的设备名称,有多个设备符合时返回最近一次见到的那个,
+        # 返回 (地址, 设备信息),没有则返回 None
+        if isinstance(names, str):
+            names = (names,)
+        best = None
+        for key, entry in self._devices.items():
+            if entry['name'] in names and (best is None or entry['seen'] > self._devices[best]['seen']):
+                best = key
+        if best is None:
+            return None
+        return binascii.unhexlify(best), self._devices[best]
+
+    def __len__(self):
+        return len(self._devices)
@@ -0,0 +1,41 @@
+#BT 枚举公共模块
+
+"""
+说明:提供名称和取值双向查找的枚举表,供各示例程序共用
+正向表(名称 -> 取值)和反向表(取值 -> 名称)在模块导入时构建一次,
+之后按取值查名称只需一次字典查找,不再逐项遍历字典
+同时保留 table['NAME'] 的用法,并且可以通过 table.NAME 直接取值
+"""
+
+
+class BtEnum(object):
+    def __init__(self, table):
+        self._values = table
+        self._names = {}
+        for name, value in table.items():
+            self._names[value] = name
+            setattr(self, name, value)
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, name, default=None):
+        return self._values.get(name, default)
+
+    def name(self, value, default=None):
+        return self._names.get(value, default)
+
+    def items(self):
+        return self._values.items()
+
+    def values(self):
+        return self._values.values()
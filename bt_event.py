@@ -0,0 +1,65 @@
+#BT 事件分发公共模块
+
+"""
+说明:提供查表式的事件分发器,供 HFP/SPP 等示例程序共用
+在启动阶段通过 register 把事件ID和处理函数注册到表中,运行时每个事件只需一次字典查找,
+不再逐个比较 if/elif 分支
+处理函数的参数为回调上报的原始消息 msg,返回 EVENT_EXIT 表示事件处理线程需要退出
+传入 BtEnum 形式的事件表后,可以直接按事件名注册,日志中也可以按事件ID取得事件名
+通过 set_latency 设置 bt_latency.LatencyMonitor 后,dispatch 同时统计每种事件的排队耗时和处理耗时
+"""
+import utime
+
+EVENT_CONTINUE = 0
+EVENT_EXIT = 1
+
+
+class EventDispatcher(object):
+    def __init__(self, events=None):
+        self._events = events
+        self._handlers = {}
+        self._default = None
+        self._latency = None
+
+    def register(self, event_id, handler):
+        self._handlers[event_id] = handler
+
+    def on(self, event_name, handler):
+        self._handlers[self._events[event_name]] = handler
+
+    def event_name(self, event_id):
+        if self._events is not None:
+            name = self._events.name(event_id)
+            if name is not None:
+                return name
+        return 'EVENT_{}'.format(event_id)
+
+    def unregister(self, event_id):
+        if event_id in self._handlers:
+            del self._handlers[event_id]
+
+    def set_default(self, handler):
+        # 未注册的事件交给默认处理函数,没有设置则直接忽略
+        self._default = handler
+
+    def set_latency(self, monitor):
+        # monitor 为 None 时关闭统计
+        self._latency = monitor
+
+    def handler(self, event_id):
+        return self._handlers.get(event_id, self._default)
+
+    def dispatch(self, msg, stamp=None):
+        # stamp 为事件入队时的 utime.ticks_us(),一般取自事件队列的 last_stamp
+        handler = self._handlers.get(msg[0], self._default)
+        if handler is None:
+            ret = EVENT_CONTINUE
+        elif self._latency is None:
+            ret = handler(msg)
+        else:
+            start = utime.ticks_us()
+            ret = handler(msg)
+            end = utime.ticks_us()
+            wait = None if stamp is None else utime.ticks_diff(start, stamp)
+            self._latency.record(msg[0], wait, utime.ticks_diff(end, start))
+        return ret
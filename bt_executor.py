@@ -0,0 +1,133 @@
+#BT 阻塞调用执行器公共模块
+
+"""
+说明:bt.sppSend、bt.hfpSetVolume 等 native 接口可能阻塞较长时间,在事件处理线程中直接调用时,
+后面的所有事件都要等它返回;Executor 用少量固定的工作线程执行这类调用,事件处理函数只负责提交
+submit 从不阻塞:待执行的任务数达到 capacity 时直接返回 -1,由调用方决定稍后重试或放弃
+任务执行完成后,通过 post 向事件队列投递 (event_id, 状态, done, 返回值, 执行耗时us),
+post 在工作线程中调用,需要支持多个线程同时投递(例如 bt_queue 各队列的 post,不能使用回调专用的 put_nowait),
+事件处理线程收到后调用 on_event,在事件处理线程中执行 submit 时指定的 done(状态, 返回值),
+状态为 0 表示正常返回,-1 表示抛出了异常(返回值为异常对象);没有指定 done 的任务不投递完成事件
+notify_ok 为 False 时只投递失败(抛出异常或返回值不为 0)的完成事件,避免大量数据发送的完成事件占满事件队列
+on_drain(状态, 返回值) 在有任务因为队列已满被拒绝、之后队列中的任务全部执行完时,同样通过完成事件在事件处理线程中调用,
+用于通知调用方重新提交之前被拒绝的数据
+只有一个工作线程时任务按提交顺序执行,适合需要保证顺序的数据发送
+完成事件被事件队列丢弃时不会调用 done,因此 done 中不要放必须执行的清理工作
+"""
+import utime
+import _thread
+from bt_sync import wake
+
+EXECUTOR_DONE_EVENT = 1001
+EXECUTOR_CAPACITY = 8
+
+
+class Executor(object):
+    def __init__(self, post, workers=1, capacity=EXECUTOR_CAPACITY, event_id=EXECUTOR_DONE_EVENT, notify_ok=True, on_drain=None):
+        self._post = post
+        self._notify_ok = notify_ok
+        self._on_drain = on_drain
+        self._blocked = False
+        self._workers = workers
+        self._cap = capacity
+        self._event_id = event_id
+        self._jobs = []
+        self._lock = _thread.allocate_lock()
+        # 没有任务时工作线程阻塞在该锁上;取走任务后如果还有剩余,再唤醒下一个工作线程
+        self._wake = _thread.allocate_lock()
+        self._wake.acquire()
+        self._started = False
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy = 0
+        self.high_water = 0
+        self.run_us_max = 0
+        self.run_us_total = 0
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        for _ in range(self._workers):
+            _thread.start_new_thread(self._worker, ())
+
+    def submit(self, func, args=(), done=None):
+        # 返回提交后待执行的任务数,队列已满时返回 -1
+        self._lock.acquire()
+        if len(self._jobs) >= self._cap:
+            self._blocked = True
+            self.rejected += 1
+            self._lock.release()
+            return -1
+        self._jobs.append((func, args, done))
+        depth = len(self._jobs)
+        self.submitted += 1
+        if depth > self.high_water:
+            self.high_water = depth
+        self._lock.release()
+        # 事件处理线程提交任务与工作线程唤醒下一个工作线程可能同时发生
+        wake(self._wake)
+        return depth
+
+    def _worker(self):
+        while True:
+            self._lock.acquire()
+            job = self._jobs.pop(0) if self._jobs else None
+            more = len(self._jobs) > 0
+            if job is not None:
+                self.busy += 1
+            self._lock.release()
+            if job is None:
+                self._wake.acquire()
+                continue
+            if more:
+                wake(self._wake)
+            func, args, done = job
+            start = utime.ticks_us()
+            try:
+                retval = func(*args)
+                status = 0
+            except Exception as e:
+                retval = e
+                status = -1
+            cost = utime.ticks_diff(utime.ticks_us(), start)
+            ok = status == 0 and (retval == 0 or retval is None)
+            # 统计和 _blocked 由多个工作线程修改,检查并清除 _blocked 需要在锁内完成,保证 on_drain 只投递一次
+            self._lock.acquire()
+            self.busy -= 1
+            self.run_us_total += cost
+            if cost > self.run_us_max:
+                self.run_us_max = cost
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            drained = self._blocked and not self._jobs and self.busy == 0
+            if drained:
+                self._blocked = False
+            self._lock.release()
+            if done is not None and (ok is False or self._notify_ok):
+                self._post((self._event_id, status, done, retval, cost))
+            if drained and self._on_drain is not None:
+                self._post((self._event_id, 0, self._on_drain, None, 0))
+
+    def on_event(self, msg):
+        # 在事件处理线程中执行任务的 done 回调
+        msg[2](msg[1], msg[3])
+
+    def pending(self):
+        return len(self._jobs)
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+            'pending': len(self._jobs),
+            'high_water': self.high_water,
+            'run_us_max': self.run_us_max,
+            'run_us_avg': self.run_us_total // (self.completed + self.failed) if self.completed + self.failed else None,
+        }
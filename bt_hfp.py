@@ -0,0 +1,211 @@
+#BT HFP 公共模块
+
+"""
+说明:HFP 的事件表、状态表和事件处理流程,单 profile 示例程序(bt_hfp_demo)和多 profile 运行时(bt_multi_demo)共用
+HfpController 保存连接状态、通话状态和各类状态指示的最新值(status),处理流程:
+  来电响铃时在执行器中调用 bt.hfpAnswerCall 自动接听,通话开始时设置通话音量;
+  通话结束后本机主动断开 HFP,本机主动断开不触发自动重连;
+  对端异常断开时交给 ReconnectScheduler 自动重连(auto_reconnect 为 True 时);
+  接听失败、各类指示事件上报失败时停止 BT
+stop_on_disconnect 为 True 时 HFP 断开后(不重连的情况)停止 BT,只运行 HFP 时使用;
+与其他 profile 共同运行时为 False,HFP 断开不影响其他 profile
+handlers() 返回 (事件名, 处理函数) 列表,由调用方注册到 EventDispatcher 或 BtRuntime;
+重连事件和执行器完成事件的事件ID由调用方分配,收到后分别调用 reconnect_ind 和执行器的 on_event
+"""
+import bt
+from bt_enum import BtEnum
+from bt_event import EVENT_CONTINUE
+from bt_addr import addr_to_mac
+
+HFP_EVENTS = {
+    'BT_HFP_CONNECT_IND': 40,           # bt hfp connected
+    'BT_HFP_DISCONNECT_IND': 41,        # bt hfp disconnected
+    'BT_HFP_CALL_IND': 42,              # bt hfp call state
+    'BT_HFP_CALL_SETUP_IND': 43,        # bt hfp call setup state
+    'BT_HFP_NETWORK_IND': 44,           # bt hfp network state
+    'BT_HFP_NETWORK_SIGNAL_IND': 45,    # bt hfp network signal
+    'BT_HFP_BATTERY_IND': 46,           # bt hfp battery level
+    'BT_HFP_CALLHELD_IND': 47,          # bt hfp callheld state
+    'BT_HFP_AUDIO_IND': 48,             # bt hfp audio state
+    'BT_HFP_VOLUME_IND': 49,            # bt hfp volume type
+    'BT_HFP_NETWORK_TYPE': 50,          # bt hfp network type
+    'BT_HFP_RING_IND': 51,              # bt hfp ring indication
+    'BT_HFP_CODEC_IND': 52,             # bt hfp codec type
+}
+
+HFP_CONN_STATUS_DICT = BtEnum({
+    'HFP_DISCONNECTED': 0,
+    'HFP_CONNECTING': 1,
+    'HFP_CONNECTED': 2,
+    'HFP_DISCONNECTING': 3,
+})
+HFP_CALL_STATUS_DICT = BtEnum({
+    'HFP_NO_CALL_IN_PROGRESS': 0,
+    'HFP_CALL_IN_PROGRESS': 1,
+})
+
+# 通话控制类事件,调度时优先处理
+HFP_CALL_EVENTS = (
+    HFP_EVENTS['BT_HFP_RING_IND'],
+    HFP_EVENTS['BT_HFP_CALL_IND'],
+    HFP_EVENTS['BT_HFP_CALL_SETUP_IND'],
+    HFP_EVENTS['BT_HFP_CALLHELD_IND'],
+    HFP_EVENTS['BT_HFP_AUDIO_IND'],
+)
+HFP_CONN_EVENTS = (
+    HFP_EVENTS['BT_HFP_CONNECT_IND'],
+    HFP_EVENTS['BT_HFP_DISCONNECT_IND'],
+)
+
+# 这些事件只上报状态快照,只需要处理最新的一次
+HFP_COALESCE_EVENTS = (
+    HFP_EVENTS['BT_HFP_NETWORK_IND'],
+    HFP_EVENTS['BT_HFP_NETWORK_SIGNAL_IND'],
+    HFP_EVENTS['BT_HFP_BATTERY_IND'],
+    HFP_EVENTS['BT_HFP_VOLUME_IND'],
+)
+
+# 各类状态指示事件:事件名、status 中的字段名、失败时的描述
+HFP_IND_TABLE = (
+    ('BT_HFP_CALL_SETUP_IND', 'call_setup', 'call setup'),
+    ('BT_HFP_CALLHELD_IND', 'callheld', 'callheld'),
+    ('BT_HFP_NETWORK_IND', 'network', 'network status'),
+    ('BT_HFP_NETWORK_SIGNAL_IND', 'signal', 'network signal'),
+    ('BT_HFP_BATTERY_IND', 'battery', 'battery level'),
+    ('BT_HFP_AUDIO_IND', 'audio', 'audio'),
+    ('BT_HFP_VOLUME_IND', 'volume_type', 'volume'),
+    ('BT_HFP_NETWORK_TYPE', 'service_type', 'network service type'),
+    ('BT_HFP_CODEC_IND', 'codec', 'codec'),
+)
+
+HFP_CALL_VOLUME = 7
+
+
+class HfpController(object):
+    def __init__(self, log, executor, reconnect, auto_reconnect=True, volume=HFP_CALL_VOLUME, adapter=None, stop_on_disconnect=True):
+        # executor 执行接听、设置音量等阻塞调用;reconnect 为 bt_reconnect.ReconnectScheduler
+        # adapter 不为 None 时,第一次通话开始时设置音频输出通道(之后与缓存值相同不再重复设置)
+        self.log = log
+        self.executor = executor
+        self.reconnect = reconnect
+        self.auto_reconnect = auto_reconnect
+        self.volume = volume
+        self.adapter = adapter
+        self.stop_on_disconnect = stop_on_disconnect
+        self.status = {
+            'conn': HFP_CONN_STATUS_DICT.HFP_DISCONNECTED,
+            'call': HFP_CALL_STATUS_DICT.HFP_NO_CALL_IN_PROGRESS,
+        }
+        for event_name, field, fail_desc in HFP_IND_TABLE:
+            self.status[field] = None
+
+    def handlers(self):
+        table = [
+            ('BT_HFP_CONNECT_IND', self.connect_ind),
+            ('BT_HFP_DISCONNECT_IND', self.disconnect_ind),
+            ('BT_HFP_CALL_IND', self.call_ind),
+            ('BT_HFP_RING_IND', self.ring_ind),
+        ]
+        for event_name, field, fail_desc in HFP_IND_TABLE:
+            table.append((event_name, self._ind_handler(field, fail_desc)))
+        return table
+
+    def connect_ind(self, msg):
+        status = msg[1]
+        addr = msg[3]  # BT 主机端mac地址
+        self.status['conn'] = msg[2]
+        self.log.event(msg[0], '{}, hfp_conn_status:{}, mac:{}', status, HFP_CONN_STATUS_DICT.name(msg[2]), addr_to_mac(msg[3]))
+        if status != 0:
+            self.log.error('BT HFP connect failed.')
+            if self.reconnect.pending(addr):
+                self.reconnect.on_failed(addr)
+            elif self.stop_on_disconnect:
+                bt.stop()
+        elif msg[2] == HFP_CONN_STATUS_DICT.HFP_CONNECTED:
+            self.reconnect.on_connected(addr)
+        return EVENT_CONTINUE
+
+    def disconnect_ind(self, msg):
+        # 通话结束后本机主动断开时,断开前的状态为 HFP_DISCONNECTING
+        local = self.status['conn'] == HFP_CONN_STATUS_DICT.HFP_DISCONNECTING
+        addr = msg[3]  # BT 主机端mac地址
+        self.status['conn'] = msg[2]
+        self.status['call'] = HFP_CALL_STATUS_DICT.HFP_NO_CALL_IN_PROGRESS
+        self.log.event(msg[0], '{}, hfp_conn_status:{}, mac:{}', msg[1], HFP_CONN_STATUS_DICT.name(msg[2]), addr_to_mac(msg[3]))
+        if msg[1] != 0:
+            self.log.error('BT HFP disconnect failed.')
+        if self.auto_reconnect and not local:
+            self.reconnect.on_disconnect(addr)
+        elif self.stop_on_disconnect:
+            bt.stop()
+        return EVENT_CONTINUE
+
+    def reconnect_ind(self, msg):
+        self.reconnect.on_event(msg)
+        return EVENT_CONTINUE
+
+    def call_ind(self, msg):
+        call_sta = msg[2]
+        addr = msg[3]  # BT 主机端mac地址
+        self.log.event(msg[0], '{}, hfp_call_status:{}, mac:{}', msg[1], HFP_CALL_STATUS_DICT.name(call_sta), addr_to_mac(msg[3]))
+        if msg[1] != 0:
+            self.log.error('BT HFP call failed.')
+            bt.stop()
+            return EVENT_CONTINUE
+
+        idle = self.status['call'] == HFP_CALL_STATUS_DICT.HFP_NO_CALL_IN_PROGRESS
+        self.status['call'] = call_sta
+        if call_sta == HFP_CALL_STATUS_DICT.HFP_NO_CALL_IN_PROGRESS:
+            if not idle and self.status['conn'] == HFP_CONN_STATUS_DICT.HFP_CONNECTED:
+                self.log.info('call ended, ready to disconnect hfp.')
+                if bt.hfpDisconnect(addr) == 0:
+                    self.status['conn'] = HFP_CONN_STATUS_DICT.HFP_DISCONNECTING
+                else:
+                    self.log.error('Failed to disconnect hfp connection.')
+                    bt.stop()
+        elif idle:
+            if self.adapter is not None:
+                self.adapter.apply(('channel',))
+            self.log.info('set volume to {}.', self.volume)
+            if self.executor.submit(bt.hfpSetVolume, (addr, self.volume), self._set_volume_done) < 0:
+                self.log.error('set volume failed, executor is busy.')
+        return EVENT_CONTINUE
+
+    def _set_volume_done(self, status, retval):
+        if status != 0 or retval != 0:
+            self.log.error('set volume failed, {}', retval)
+
+    def ring_ind(self, msg):
+        addr = msg[3]  # BT 主机端mac地址
+        self.log.event(msg[0], '{}, mac:{}', msg[1], addr_to_mac(msg[3]))
+        if msg[1] != 0:
+            self.log.error('BT HFP ring failed.')
+            bt.stop()
+            return EVENT_CONTINUE
+        if self.executor.submit(bt.hfpAnswerCall, (addr,), self._answer_call_done) < 0:
+            self.log.error('Failed to answer the call, executor is busy.')
+            bt.stop()
+        return EVENT_CONTINUE
+
+    def _answer_call_done(self, status, retval):
+        if status == 0 and retval == 0:
+            self.log.info('The call was answered successfully.')
+        else:
+            self.log.error('Failed to answer the call, {}', retval)
+            bt.stop()
+
+    def _ind_handler(self, field, fail_desc):
+        # 各类状态指示事件的处理流程相同:记录并打印状态值,失败时停止BT
+        # 状态指示事件最频繁,使用 event4 和缓存的 MAC 字符串,处理过程中不分配内存
+        status = self.status
+        log = self.log
+
+        def handler(msg):
+            log.event4(msg[0], '{}, {}:{}, mac:{}', msg[1], field, msg[2], addr_to_mac(msg[3]))
+            if msg[1] != 0:
+                log.error('BT HFP {} failed.', fail_desc)
+                bt.stop()
+            else:
+                status[field] = msg[2]
+            return EVENT_CONTINUE
+        return handler
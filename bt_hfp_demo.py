@@ -7,10 +7,21 @@
 当手机A开始响铃震动时,设备会自动接听电话
 """
 import bt
-import utime
 import _thread
-from queue import Queue
 from machine import Pin
+from bt_event import EventDispatcher, EVENT_CONTINUE, EVENT_EXIT
+from bt_enum import BtEnum
+from bt_trace import TraceRecorder
+from bt_reconnect import ReconnectScheduler, RECONNECT_EVENT
+from bt_boot import BtReady, BootProfile, abort_start
+from bt_adapter import AdapterConfig
+from bt_lifecycle import Lifecycle, LIFECYCLE_STATE
+from bt_log import Logger, LOG_EVENT
+from bt_latency import LatencyMonitor
+from bt_executor import Executor, EXECUTOR_DONE_EVENT
+from bt_queue import EventRing, CoalescingQueue, PriorityEventQueue, DROP_OLDEST, DROP_NEWEST
+from bt_addr import event_key
+from bt_hfp import HfpController, HFP_EVENTS, HFP_CALL_EVENTS, HFP_CONN_EVENTS, HFP_COALESCE_EVENTS
 
 # 如果对应播放通道外置了PA,且需要引脚控制PA开启,则需要下面步骤
 # 具体使用哪个GPIO取决于实际使用的引脚
@@ -19,328 +30,236 @@ gpio11.write(1)
 
 BT_NAME = 'QuecPython-hfp'
 
-BT_EVENT = {
-    'BT_START_STATUS_IND': 0,           # bt/ble start
-    'BT_STOP_STATUS_IND': 1,            # bt/ble stop
-    'BT_HFP_CONNECT_IND': 40,           # bt hfp connected
-    'BT_HFP_DISCONNECT_IND': 41,        # bt hfp disconnected
-    'BT_HFP_CALL_IND': 42,              # bt hfp call state
-    'BT_HFP_CALL_SETUP_IND': 43,        # bt hfp call setup state
-    'BT_HFP_NETWORK_IND': 44,           # bt hfp network state
-    'BT_HFP_NETWORK_SIGNAL_IND': 45,    # bt hfp network signal
-    'BT_HFP_BATTERY_IND': 46,           # bt hfp battery level
-    'BT_HFP_CALLHELD_IND': 47,          # bt hfp callheld state
-    'BT_HFP_AUDIO_IND': 48,             # bt hfp audio state
-    'BT_HFP_VOLUME_IND': 49,            # bt hfp volume type
-    'BT_HFP_NETWORK_TYPE': 50,          # bt hfp network type
-    'BT_HFP_RING_IND': 51,              # bt hfp ring indication
-    'BT_HFP_CODEC_IND': 52,             # bt hfp codec type
-}
+# HFP 的事件表和处理流程见 bt_hfp,与 bt_multi_demo 共用
+_events = dict(HFP_EVENTS)
+_events['BT_START_STATUS_IND'] = 0      # bt/ble start
+_events['BT_STOP_STATUS_IND'] = 1       # bt/ble stop
+BT_EVENT = BtEnum(_events)
 
-HFP_CONN_STATUS = 0
-HFP_CONN_STATUS_DICT = {
-    'HFP_DISCONNECTED': 0,
-    'HFP_CONNECTING': 1,
-    'HFP_CONNECTED': 2,
-    'HFP_DISCONNECTING': 3,
-}
-HFP_CALL_STATUS = 0
-HFP_CALL_STATUS_DICT = {
-    'HFP_NO_CALL_IN_PROGRESS': 0,
-    'HFP_CALL_IN_PROGRESS': 1,
+# 事件处理线程中的日志只写入环形缓冲区,由日志任务格式化后输出;
+# BT_LOG_LEVEL 设置为 LOG_INFO 时不再记录每个事件的日志,也可以调用 log.mute(事件ID) 屏蔽指定事件
+BT_LOG_LEVEL = LOG_EVENT
+log = Logger(64, BT_LOG_LEVEL, BT_EVENT)
+
+# 运行状态由事件处理线程切换,main 阻塞等待直到资源释放;
+# BT_HEARTBEAT_MS 不为 0 时,运行期间每隔该时间打印一次心跳日志
+BT_HEARTBEAT_MS = 0
+bt_lifecycle = Lifecycle('HFP', BT_HEARTBEAT_MS, log)
+
+
+def hfp_coalesce_key(msg):
+    # 状态类事件按(事件类型, 对端地址)合并,合并键由 bt_addr 缓存,同一对端的同类事件每次取得同一个元组
+    return event_key(msg[0], msg[3])
+
+
+# 事件优先级:通话控制 > 连接状态 > 状态上报
+HFP_PRIO_CALL = 0
+HFP_PRIO_CONN = 1
+HFP_PRIO_TELEMETRY = 2
+HFP_EVENT_PRIO = {
+    BT_EVENT['BT_START_STATUS_IND']: HFP_PRIO_CONN,
+    BT_EVENT['BT_STOP_STATUS_IND']: HFP_PRIO_CONN,
+    RECONNECT_EVENT: HFP_PRIO_CONN,
+    EXECUTOR_DONE_EVENT: HFP_PRIO_CALL,
 }
+for event_id in HFP_CALL_EVENTS:
+    HFP_EVENT_PRIO[event_id] = HFP_PRIO_CALL
+for event_id in HFP_CONN_EVENTS:
+    HFP_EVENT_PRIO[event_id] = HFP_PRIO_CONN
+
+
+def hfp_event_prio(msg):
+    return HFP_EVENT_PRIO.get(msg[0], HFP_PRIO_TELEMETRY)
+
+# 置为 True 时事件入队时记录时间戳,统计每种事件的排队耗时和处理耗时,退出时输出统计结果
+BT_LATENCY = False
+bt_latency = LatencyMonitor(BT_EVENT) if BT_LATENCY else None
 
-BT_IS_RUN = 0
+# 回调中不允许阻塞;通话控制和连接事件队列满时丢弃新事件,保证已入队的事件按顺序处理,
+# 状态上报队列满时覆盖最早的事件,
+# 并且状态类事件在合并槽位中只保留最新值
+def hfp_queue_init():
+    return PriorityEventQueue((
+        EventRing(10, DROP_NEWEST, stamp=BT_LATENCY),
+        EventRing(10, DROP_NEWEST, stamp=BT_LATENCY),
+        CoalescingQueue(10, DROP_OLDEST, HFP_COALESCE_EVENTS, hfp_coalesce_key, stamp=BT_LATENCY),
+    ), hfp_event_prio)
 
-msg_queue = Queue(30)
+msg_queue = hfp_queue_init()
 
 
-def get_key_by_value(val, d):
-    for key, value in d.items():
-        if val == value:
-            return key
-    return None
+def hfp_reconnect_give_up(addr):
+    bt.stop()
+
+# 对端异常断开(不是本机主动断开)时自动重连,多次重连失败后停止BT
+HFP_AUTO_RECONNECT = True
+hfp_reconnect = ReconnectScheduler(bt.hfpConnect, msg_queue.post, give_up=hfp_reconnect_give_up, log=log)
+
+# 接听电话、设置音量等可能阻塞的 native 调用在工作线程中按顺序执行,结果通过完成事件回到事件处理线程
+hfp_executor = Executor(msg_queue.post, 1, 4)
+
+# 设置为文件路径(如 '/usr/bt_hfp.trace')后,记录回调收到的所有事件,可以用 bt_trace.replay 离线回放
+BT_TRACE_FILE = None
+bt_trace = TraceRecorder(BT_TRACE_FILE) if BT_TRACE_FILE else None
+
+# bt.start() 之后等待 BT_START_STATUS_IND,并记录启动各阶段的耗时
+bt_ready = BtReady()
+bt_boot = None
+
+# 名称、可见模式(3:可以被发现并且可以被连接)、音频输出通道,只设置与缓存值不同的项;
+# verify 置为 True 时设置后读回确认,并检查 BT 状态
+hfp_adapter = AdapterConfig(BT_NAME, 3, 2, verify=False, log=log)
+
+# 来电自动接听、通话结束后断开、异常断开后重连等处理流程;第一次通话时设置音频输出通道
+hfp = HfpController(log, hfp_executor, hfp_reconnect, HFP_AUTO_RECONNECT, adapter=hfp_adapter)
+
 
 def bt_callback(args):
     global msg_queue
-    msg_queue.put(args)
+    if bt_trace is not None:
+        bt_trace.record(args)
+    msg_queue.put_nowait(args)
+
+def bt_start_status_ind(msg):
+    status = msg[1]
+    log.event(msg[0], 'status: {}', status)
+    bt_ready.resolve(status)
+    if bt_boot is not None:
+        bt_boot.mark('start')
+    if status != 0:
+        log.error('BT start failed.')
+        bt.stop()
+        return EVENT_EXIT
+
+    log.info('BT start successfully.')
+    bt_lifecycle.set_state(LIFECYCLE_STATE.RUNNING)
+    if hfp_adapter.verify:
+        bt_status = bt.getStatus()
+        if bt_status == 1:
+            log.info('BT status is 1, normal status.')
+        else:
+            log.error('BT status is {}, abnormal status.', bt_status)
+            bt.stop()
+            return EVENT_EXIT
+
+    if hfp_adapter.apply(('name',)) != 0:
+        bt.stop()
+        return EVENT_EXIT
+    if bt_boot is not None:
+        bt_boot.mark('name')
+
+    if hfp_adapter.apply(('visible_mode',)) != 0:
+        bt.stop()
+        return EVENT_EXIT
+    if bt_boot is not None:
+        bt_boot.mark('visibility')
+        bt_boot.report(log.info)
+    return EVENT_CONTINUE
+
+def bt_stop_status_ind(msg):
+    log.event(msg[0], 'status: {}', msg[1])
+    if msg[1] == 0:
+        bt_lifecycle.set_state(LIFECYCLE_STATE.STOPPING)
+        log.info('BT stop successfully.')
+    else:
+        log.error('BT stop failed.')
+    hfp_adapter.invalidate()
+    return EVENT_EXIT
+
+def hfp_executor_event(msg):
+    hfp_executor.on_event(msg)
+    return EVENT_CONTINUE
+
+def hfp_dispatcher_init():
+    dispatcher = EventDispatcher(BT_EVENT)
+    dispatcher.on('BT_START_STATUS_IND', bt_start_status_ind)
+    dispatcher.on('BT_STOP_STATUS_IND', bt_stop_status_ind)
+    for event_name, handler in hfp.handlers():
+        dispatcher.on(event_name, handler)
+    dispatcher.register(RECONNECT_EVENT, hfp.reconnect_ind)
+    dispatcher.register(EXECUTOR_DONE_EVENT, hfp_executor_event)
+    return dispatcher
 
 def bt_event_proc_task():
     global msg_queue
-    global BT_IS_RUN
-    global BT_EVENT
-    global HFP_CONN_STATUS
-    global HFP_CONN_STATUS_DICT
-    global HFP_CALL_STATUS
-    global HFP_CALL_STATUS_DICT
 
+    # 事件处理表在启动时构建一次,每个事件只需一次查表
+    dispatcher = hfp_dispatcher_init()
+    dispatcher.set_latency(bt_latency)
     while True:
-        print('wait msg...')
+        log.debug('wait msg...')
         msg = msg_queue.get()  # 没有消息时会阻塞在这
-        event_id = msg[0]
-        status = msg[1]
-
-        if event_id == BT_EVENT['BT_START_STATUS_IND']:
-            print('event: BT_START_STATUS_IND')
-            if status == 0:
-                print('BT start successfully.')
-                BT_IS_RUN = 1
-                bt_status = bt.getStatus()
-                if bt_status == 1:
-                    print('BT status is 1, normal status.')
-                else:
-                    print('BT status is {}, abnormal status.'.format(bt_status))
-                    bt.stop()
-                    break
-
-                retval = bt.getLocalName()
-                if retval != -1:
-                    print('The current BT name is : {}'.format(retval[1]))
-                else:
-                    print('Failed to get BT name.')
-                    bt.stop()
-                    break
-
-                print('Set BT name to {}'.format(BT_NAME))
-                retval = bt.setLocalName(0, BT_NAME)
-                if retval != -1:
-                    print('BT name set successfully.')
-                else:
-                    print('BT name set failed.')
-                    bt.stop()
-                    break
-
-                retval = bt.getLocalName()
-                if retval != -1:
-                    print('The new BT name is : {}'.format(retval[1]))
-                else:
-                    print('Failed to get new BT name.')
-                    bt.stop()
-                    break
-
-                # 设置蓝牙可见模式为:可以被发现并且可以被连接
-                retval = bt.setVisibleMode(3)
-                if retval == 0:
-                    mode = bt.getVisibleMode()
-                    if mode == 3:
-                        print('BT visible mode set successfully.')
-                    else:
-                        print('BT visible mode set failed.')
-                        bt.stop()
-                        break
-                else:
-                    print('BT visible mode set failed.')
-                    bt.stop()
-                    break
-            else:
-                print('BT start failed.')
-                bt.stop()
-                break
-        elif event_id == BT_EVENT['BT_STOP_STATUS_IND']:
-            print('event: BT_STOP_STATUS_IND')
-            if status == 0:
-                BT_IS_RUN = 0
-                print('BT stop successfully.')
-            else:
-                print('BT stop failed.')
+        if dispatcher.dispatch(msg, msg_queue.last_stamp) == EVENT_EXIT:
             break
-        elif event_id == BT_EVENT['BT_HFP_CONNECT_IND']:
-            HFP_CONN_STATUS = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_CONNECT_IND, {}, hfp_conn_status:{}, mac:{}'.format(status, get_key_by_value(msg[2], HFP_CONN_STATUS_DICT), mac))
-            if status != 0:
-                print('BT HFP connect failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_DISCONNECT_IND']:
-            HFP_CONN_STATUS = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_DISCONNECT_IND, {}, hfp_conn_status:{}, mac:{}'.format(status, get_key_by_value(msg[2], HFP_CONN_STATUS_DICT), mac))
-            if status != 0:
-                print('BT HFP disconnect failed.')
-            bt.stop()
-        elif event_id == BT_EVENT['BT_HFP_CALL_IND']:
-            call_sta = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_CALL_IND, {}, hfp_call_status:{}, mac:{}'.format(status, get_key_by_value(msg[2], HFP_CALL_STATUS_DICT), mac))
-            if status != 0:
-                print('BT HFP call failed.')
-                bt.stop()
-                continue
-
-            if call_sta == HFP_CALL_STATUS_DICT['HFP_NO_CALL_IN_PROGRESS']:
-                if HFP_CALL_STATUS == HFP_CALL_STATUS_DICT['HFP_CALL_IN_PROGRESS']:
-                    HFP_CALL_STATUS = call_sta
-                    if HFP_CONN_STATUS == HFP_CONN_STATUS_DICT['HFP_CONNECTED']:
-                        print('call ended, ready to disconnect hfp.')
-                        retval = bt.hfpDisconnect(addr)
-                        if retval == 0:
-                            HFP_CONN_STATUS = HFP_CONN_STATUS_DICT['HFP_DISCONNECTING']
-                        else:
-                            print('Failed to disconnect hfp connection.')
-                            bt.stop()
-                            continue
-            else:
-                if HFP_CALL_STATUS == HFP_CALL_STATUS_DICT['HFP_NO_CALL_IN_PROGRESS']:
-                    HFP_CALL_STATUS = call_sta
-                    print('set audio output channel to 2.')
-                    bt.setChannel(2)
-                    print('set volume to 7.')
-                    retval = bt.hfpSetVolume(addr, 7)
-                    if retval != 0:
-                        print('set volume failed.')
-        elif event_id == BT_EVENT['BT_HFP_CALL_SETUP_IND']:
-            call_setup_status = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_CALL_SETUP_IND, {}, hfp_call_setup_status:{}, mac:{}'.format(status, call_setup_status, mac))
-            if status != 0:
-                print('BT HFP call setup failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_CALLHELD_IND']:
-            callheld_status = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_CALLHELD_IND, {}, callheld_status:{}, mac:{}'.format(status, callheld_status, mac))
-            if status != 0:
-                print('BT HFP callheld failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_NETWORK_IND']:
-            network_status = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_NETWORK_IND, {}, network_status:{}, mac:{}'.format(status, network_status, mac))
-            if status != 0:
-                print('BT HFP network status failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_NETWORK_SIGNAL_IND']:
-            network_signal = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_NETWORK_SIGNAL_IND, {}, signal:{}, mac:{}'.format(status, network_signal, mac))
-            if status != 0:
-                print('BT HFP network signal failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_BATTERY_IND']:
-            battery_level = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_BATTERY_IND, {}, battery_level:{}, mac:{}'.format(status, battery_level, mac))
-            if status != 0:
-                print('BT HFP battery level failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_AUDIO_IND']:
-            audio_status = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_AUDIO_IND, {}, audio_status:{}, mac:{}'.format(status, audio_status, mac))
-            if status != 0:
-                print('BT HFP audio failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_VOLUME_IND']:
-            volume_type = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_VOLUME_IND, {}, volume_type:{}, mac:{}'.format(status, volume_type, mac))
-            if status != 0:
-                print('BT HFP volume failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_NETWORK_TYPE']:
-            service_type = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_NETWORK_TYPE, {}, service_type:{}, mac:{}'.format(status, service_type, mac))
-            if status != 0:
-                print('BT HFP network service type failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_RING_IND']:
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_RING_IND, {}, mac:{}'.format(status, mac))
-            if status != 0:
-                print('BT HFP ring failed.')
-                bt.stop()
-                continue
-            retval = bt.hfpAnswerCall(addr)
-            if retval == 0:
-                print('The call was answered successfully.')
-            else:
-                print('Failed to answer the call.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_HFP_CODEC_IND']:
-            codec_type = msg[2]
-            addr = msg[3]  # BT 主机端mac地址
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('BT_HFP_CODEC_IND, {}, codec_type:{}, mac:{}'.format(status, codec_type, mac))
-            if status != 0:
-                print('BT HFP codec failed.')
-                bt.stop()
-                continue
-    print('Ready to release hfp.')
+        if bt_trace is not None:
+            bt_trace.flush(True)
+    log.info('event queue stats: {}', msg_queue.stats())
+    hfp_reconnect.cancel()
+    log.info('reconnect stats: {}', hfp_reconnect.stats())
+    log.info('executor stats: {}', hfp_executor.stats())
+    if bt_latency is not None:
+        bt_latency.report(log.info)
+    if bt_trace is not None:
+        bt_trace.close()
+    log.info('Ready to release hfp.')
     bt.hfpRelease()
     bt.release()
+    log.drain()
+    bt_lifecycle.set_state(LIFECYCLE_STATE.RELEASED)
+
+
+def hfp_release():
+    retval = bt.hfpRelease()
+    if retval == 0:
+        print('HFP release successful.')
+    else:
+        print('HFP release failed.')
+    retval = bt.release()
+    if retval == 0:
+        print('BT release successful.')
+    else:
+        print('BT release failed.')
 
 
 def main():
-    global BT_IS_RUN
+    global bt_boot
 
+    log.start()
+    hfp_executor.start()
     _thread.start_new_thread(bt_event_proc_task, ())
 
+    bt_boot = BootProfile('HFP')
     retval = bt.init(bt_callback)
     if retval == 0:
         print('BT init successful.')
     else:
         print('BT init failed.')
         return -1
+    bt_boot.mark('init')
     retval = bt.hfpInit()
     if retval == 0:
         print('HFP init successful.')
     else:
         print('HFP init failed.')
         return -1
+    bt_boot.mark('profile init')
     retval = bt.start()
     if retval == 0:
         print('BT start successful.')
     else:
         print('BT start failed.')
-        retval = bt.hfpRelease()
-        if retval == 0:
-            print('HFP release successful.')
-        else:
-            print('HFP release failed.')
-        retval = bt.release()
-        if retval == 0:
-            print('BT release successful.')
-        else:
-            print('BT release failed.')
+        hfp_release()
+        return -1
+    # 名称和可见模式在 BT_START_STATUS_IND 的处理函数中设置,这里只处理协议栈没有上报启动结果的情况
+    if bt_ready.wait() is None:
+        print('BT start timeout.')
+        abort_start(bt_lifecycle, msg_queue.post, BT_EVENT['BT_STOP_STATUS_IND'])
+        log.drain()
         return -1
 
-    count = 0
-    while True:
-        utime.sleep(1)
-        count += 1
-        cur_time = utime.localtime()
-        timestamp = "{:02d}:{:02d}:{:02d}".format(cur_time[3], cur_time[4], cur_time[5])
-
-        if count % 5 == 0:
-            if BT_IS_RUN == 1:
-                print('[{}] BT HFP is running, count = {}......'.format(timestamp, count))
-                print('')
-            else:
-                print('BT HFP has stopped running, ready to exit.')
-                break
+    bt_lifecycle.run()
+    log.drain()
+    print('BT HFP has stopped running, ready to exit.')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,76 @@
+#BT 搜索结果公共模块
+
+"""
+说明:记录 BT_SPP_INQUIRY_IND 上报的搜索结果,按设备地址去重,并从多个可接受的目标设备中选出信号最好的一个
+同一设备重复上报时只更新记录(O(1) 字典操作),RSSI 做指数平滑(新值权重1/4),避免单次波动影响选择
+最佳候选设备在之后的 settle_reports 次上报中没有变化,或者保持了 settle_ms 毫秒,即认为已稳定,
+此时可以提前调用 bt.cancelInquiry() 结束搜索,不必等待整个搜索窗口
+"""
+import utime
+from bt_addr import addr_key, addr_bytes
+
+INQUIRY_TABLE_SIZE = 32
+
+
+class InquiryTable(object):
+    def __init__(self, targets, settle_reports=2, settle_ms=1000, size=INQUIRY_TABLE_SIZE):
+        self._targets = {}
+        for name in targets:
+            self._targets[name] = True
+        self._settle_reports = settle_reports
+        self._settle_ms = settle_ms
+        self._size = size
+        self.reset()
+
+    def reset(self):
+        self._devices = {}  # 整数地址 -> [名称, 平滑后的RSSI, 上报次数, 地址]
+        self._best = None
+        self._best_since = 0
+        self._best_reports = 0
+        self.reports = 0
+
+    def is_target(self, name):
+        return name in self._targets
+
+    def update(self, name, addr, rssi):
+        # 返回 True 表示该设备第一次出现
+        self.reports += 1
+        key = addr_key(addr)
+        entry = self._devices.get(key)
+        new = entry is None
+        if new:
+            if len(self._devices) >= self._size and name not in self._targets:
+                return False
+            entry = [name, rssi, 1, addr_bytes(addr)]
+            self._devices[key] = entry
+        else:
+            entry[1] = (entry[1] * 3 + rssi) // 4
+            entry[2] += 1
+
+        best = self._best
+        if name in self._targets and key != best:
+            if best is None or entry[1] > self._devices[best][1]:
+                self._best = key
+                self._best_since = utime.ticks_ms()
+                self._best_reports = 0
+                return new
+        if best is not None:
+            self._best_reports += 1
+        return new
+
+    def best(self):
+        # 返回 (名称, 地址, 平滑后的RSSI),还没有找到目标设备时返回 None
+        if self._best is None:
+            return None
+        entry = self._devices[self._best]
+        return entry[0], entry[3], entry[1]
+
+    def stable(self):
+        if self._best is None:
+            return False
+        if self._best_reports >= self._settle_reports:
+            return True
+        return utime.ticks_diff(utime.ticks_ms(), self._best_since) >= self._settle_ms
+
+    def __len__(self):
+        return len(self._devices)
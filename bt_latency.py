@@ -0,0 +1,87 @@
+#BT 事件耗时统计公共模块
+
+"""
+说明:按事件ID分别统计排队耗时(入队到开始处理)和处理耗时(处理函数执行时间),用于区分慢在队列还是慢在处理函数
+每种事件、每类耗时使用一个固定分桶的直方图,记录时只做一次桶查找和计数,不保存原始样本,内存占用固定
+snapshot 返回各事件的次数,以及两类耗时的 p50/p95/max(p50/p95 为所在桶的上限,不超过 max)
+排队耗时需要事件队列在创建时打开 stamp,并把队列的 last_stamp 传给 EventDispatcher.dispatch
+"""
+
+# 桶的上限(微秒),最后一个桶收集所有更大的值
+LATENCY_BUCKETS_US = (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000)
+
+
+class _Histogram(object):
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.max = 0
+
+    def add(self, value):
+        bounds = self._bounds
+        i = 0
+        n = len(bounds)
+        while i < n and value > bounds[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, ratio):
+        if self.count == 0:
+            return None
+        target = self.count * ratio
+        total = 0
+        for i in range(len(self.buckets)):
+            total += self.buckets[i]
+            if total >= target:
+                if i < len(self._bounds):
+                    return min(self._bounds[i], self.max)
+                return self.max
+        return self.max
+
+    def summary(self):
+        return {'count': self.count, 'p50_us': self.percentile(0.5), 'p95_us': self.percentile(0.95), 'max_us': self.max}
+
+
+class LatencyMonitor(object):
+    def __init__(self, events=None, bounds=LATENCY_BUCKETS_US):
+        # events 为事件ID到名称的 BtEnum,snapshot 中用事件名作为 key
+        self._events = events
+        self._bounds = bounds
+        self._stats = {}  # 事件ID -> [排队耗时直方图, 处理耗时直方图]
+
+    def record(self, event_id, wait_us, run_us):
+        entry = self._stats.get(event_id)
+        if entry is None:
+            entry = [_Histogram(self._bounds), _Histogram(self._bounds)]
+            self._stats[event_id] = entry
+        if wait_us is not None:
+            entry[0].add(wait_us)
+        entry[1].add(run_us)
+
+    def reset(self):
+        self._stats = {}
+
+    def snapshot(self):
+        result = {}
+        for event_id, entry in self._stats.items():
+            name = event_id if self._events is None else self._events.name(event_id, event_id)
+            result[name] = {
+                'count': entry[1].count,
+                'wait': entry[0].summary(),
+                'run': entry[1].summary(),
+            }
+        return result
+
+    def report(self, out=print):
+        out('{:>28} {:>6} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+            'event', 'count', 'wait p50', 'wait p95', 'wait max', 'run p50', 'run p95', 'run max'))
+        for name, item in self.snapshot().items():
+            wait = item['wait']
+            run = item['run']
+            out('{:>28} {:>6} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+                name, item['count'], str(wait['p50_us']), str(wait['p95_us']), wait['max_us'],
+                str(run['p50_us']), str(run['p95_us']), run['max_us']))
@@ -0,0 +1,71 @@
+#BT 运行状态公共模块
+
+"""
+说明:记录示例程序的运行状态 START -> RUNNING -> STOPPING -> RELEASED,状态只能向后切换
+事件处理线程在收到启动、停止事件以及释放资源后调用 set_state,主线程调用 run 阻塞等待直到 RELEASED,
+等待期间不需要周期性醒来检查全局变量
+heartbeat_ms 不为 0 时,RUNNING 期间最多每隔 heartbeat_ms 打印一次心跳日志
+状态切换通常发生在事件处理线程中,通过 log(bt_log.Logger)记录,不同步 print
+"""
+import utime
+from bt_enum import BtEnum
+from bt_sync import Signal
+from bt_log import PRINT_LOG
+
+LIFECYCLE_STATE = BtEnum({
+    'START': 0,
+    'RUNNING': 1,
+    'STOPPING': 2,
+    'RELEASED': 3,
+})
+
+
+class Lifecycle(object):
+    def __init__(self, name, heartbeat_ms=0, log=None):
+        # log 为 bt_log.Logger,为 None 时直接 print
+        self._name = name
+        self._log = PRINT_LOG if log is None else log
+        self._heartbeat_ms = heartbeat_ms
+        self._changed = Signal()
+        self._since = utime.ticks_ms()
+        self.state = LIFECYCLE_STATE.START
+
+    def set_state(self, state):
+        # 可以在任意线程中调用;回退到之前的状态会被忽略
+        if state <= self.state:
+            return
+        self.state = state
+        self._since = utime.ticks_ms()
+        self._log.info('{} state: {}', self._name, LIFECYCLE_STATE.name(state))
+        self._changed.set()
+
+    def is_running(self):
+        return self.state == LIFECYCLE_STATE.RUNNING
+
+    def wait(self, state, timeout_ms=-1):
+        # 等待进入 state 或之后的状态,超时返回 False;同一时刻只支持一个线程等待
+        if timeout_ms >= 0:
+            deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+        while True:
+            self._changed.clear()
+            if self.state >= state:
+                return True
+            if timeout_ms < 0:
+                self._changed.wait()
+                continue
+            remain = utime.ticks_diff(deadline, utime.ticks_ms())
+            if remain <= 0:
+                return False
+            self._changed.wait(remain)
+
+    def run(self):
+        # 主线程调用,阻塞到 RELEASED
+        if self._heartbeat_ms <= 0:
+            self.wait(LIFECYCLE_STATE.RELEASED)
+            return
+        while not self.wait(LIFECYCLE_STATE.RELEASED, self._heartbeat_ms):
+            if self.is_running():
+                cur_time = utime.localtime()
+                print('[{:02d}:{:02d}:{:02d}] BT {} is running for {} s......'.format(
+                    cur_time[3], cur_time[4], cur_time[5], self._name,
+                    utime.ticks_diff(utime.ticks_ms(), self._since) // 1000))
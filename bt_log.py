@@ -0,0 +1,195 @@
+#BT 日志公共模块
+
+"""
+说明:事件处理线程中每次 print 都要格式化字符串并同步写串口,会占用大部分事件处理时间
+Logger 只把(时间戳, 级别, 事件ID, 格式字符串, 参数)写入预先分配的环形缓冲区,不做格式化,
+由 drain 任务(或 dump 命令)读出时才格式化并输出;缓冲区满时覆盖最早的记录
+过滤:低于 level 的记录直接丢弃;每个事件的日志使用 event 接口(级别 LOG_EVENT),可以按事件ID屏蔽,
+level 设置为 LOG_INFO 及以上时所有事件日志都不再记录
+event4 与 event 相同,但最多 4 个参数,参数直接写入预先分配的槽位,不创建参数元组,用于需要避免内存分配的事件处理路径
+公共模块(重连、BT 参数设置、运行状态)接受一个 Logger,没有传入时使用 PRINT_LOG:接口相同,直接 print,
+只适合在主线程中使用
+"""
+import utime
+import _thread
+from bt_enum import BtEnum
+from bt_sync import Signal
+
+LOG_LEVEL = BtEnum({
+    'DEBUG': 0,
+    'EVENT': 1,
+    'INFO': 2,
+    'WARN': 3,
+    'ERROR': 4,
+})
+LOG_DEBUG = LOG_LEVEL.DEBUG
+LOG_EVENT = LOG_LEVEL.EVENT
+LOG_INFO = LOG_LEVEL.INFO
+LOG_WARN = LOG_LEVEL.WARN
+LOG_ERROR = LOG_LEVEL.ERROR
+
+LOG_CAPACITY = 64
+LOG_DRAIN_MS = 500
+LOG_EVENT_ARGS = 4
+
+
+class Logger(object):
+    def __init__(self, capacity=LOG_CAPACITY, level=LOG_INFO, events=None, out=None):
+        # events 为事件ID到名称的 BtEnum,输出事件日志时显示事件名称;out 默认为 print
+        self.level = level
+        self._events = events
+        self._out = print if out is None else out
+        self._cap = capacity
+        self._ticks = [0] * capacity
+        self._level = [0] * capacity
+        self._event = [None] * capacity
+        self._fmt = [None] * capacity
+        self._args = [None] * capacity
+        # event4 的参数,每条记录 LOG_EVENT_ARGS 个槽位,该记录的 _args 为 None
+        self._argv = [None] * (capacity * LOG_EVENT_ARGS)
+        self._head = 0  # 下一条记录写入的位置
+        self._count = 0
+        self._lock = _thread.allocate_lock()
+        self._muted = {}
+        self._signal = Signal()
+        self.dropped = 0
+
+    def mute(self, event_id):
+        self._muted[event_id] = True
+
+    def unmute(self, event_id=None):
+        # event_id 为 None 时取消所有屏蔽
+        if event_id is None:
+            self._muted.clear()
+        elif event_id in self._muted:
+            del self._muted[event_id]
+
+    def enabled(self, level, event_id=None):
+        return level >= self.level and (event_id is None or event_id not in self._muted)
+
+    def _put(self, level, event_id, fmt, args, a=None, b=None, c=None, d=None):
+        self._lock.acquire()
+        pos = self._head
+        self._ticks[pos] = utime.ticks_ms()
+        self._level[pos] = level
+        self._event[pos] = event_id
+        self._fmt[pos] = fmt
+        self._args[pos] = args
+        if args is None:
+            base = pos * LOG_EVENT_ARGS
+            argv = self._argv
+            argv[base] = a
+            argv[base + 1] = b
+            argv[base + 2] = c
+            argv[base + 3] = d
+        self._head = (pos + 1) % self._cap
+        if self._count == self._cap:
+            self.dropped += 1
+        else:
+            self._count += 1
+        count = self._count
+        self._lock.release()
+        if level >= LOG_ERROR or count >= self._cap // 2:
+            self._signal.set()
+
+    def debug(self, fmt, *args):
+        if LOG_DEBUG >= self.level:
+            self._put(LOG_DEBUG, None, fmt, args)
+
+    def info(self, fmt, *args):
+        if LOG_INFO >= self.level:
+            self._put(LOG_INFO, None, fmt, args)
+
+    def warn(self, fmt, *args):
+        if LOG_WARN >= self.level:
+            self._put(LOG_WARN, None, fmt, args)
+
+    def error(self, fmt, *args):
+        if LOG_ERROR >= self.level:
+            self._put(LOG_ERROR, None, fmt, args)
+
+    def event(self, event_id, fmt, *args):
+        if LOG_EVENT >= self.level and event_id not in self._muted:
+            self._put(LOG_EVENT, event_id, fmt, args)
+
+    def event4(self, event_id, fmt, a=None, b=None, c=None, d=None):
+        # 多余的 None 参数在格式化时被忽略
+        if LOG_EVENT >= self.level and event_id not in self._muted:
+            self._put(LOG_EVENT, event_id, fmt, None, a, b, c, d)
+
+    def _take(self, consume):
+        # 按时间顺序取出缓冲区中的记录,只在锁内复制引用,格式化在锁外进行
+        self._lock.acquire()
+        count = self._count
+        start = (self._head - count) % self._cap
+        entries = []
+        for i in range(count):
+            pos = (start + i) % self._cap
+            args = self._args[pos]
+            if args is None:
+                base = pos * LOG_EVENT_ARGS
+                args = tuple(self._argv[base:base + LOG_EVENT_ARGS])
+                if consume:
+                    for j in range(base, base + LOG_EVENT_ARGS):
+                        self._argv[j] = None
+            entries.append((self._ticks[pos], self._level[pos], self._event[pos], self._fmt[pos], args))
+            if consume:
+                self._fmt[pos] = None
+                self._args[pos] = None
+        if consume:
+            self._count = 0
+        self._lock.release()
+        return entries
+
+    def _format(self, entry):
+        ticks, level, event_id, fmt, args = entry
+        try:
+            text = fmt.format(*args)
+        except Exception:
+            text = '{} {}'.format(fmt, args)
+        if event_id is not None:
+            name = event_id if self._events is None else self._events.name(event_id, event_id)
+            text = '{}: {}'.format(name, text) if text else str(name)
+        return '[{}] {} {}'.format(ticks, LOG_LEVEL.name(level), text)
+
+    def drain(self):
+        # 输出并清空缓冲区中的记录,返回输出的条数
+        entries = self._take(True)
+        for entry in entries:
+            self._out(self._format(entry))
+        return len(entries)
+
+    def dump(self):
+        # 输出缓冲区中的记录但不清空,用于现场查看最近的日志
+        entries = self._take(False)
+        for entry in entries:
+            self._out(self._format(entry))
+        return len(entries)
+
+    def drain_task(self, period_ms=LOG_DRAIN_MS):
+        # 每隔 period_ms 输出一次;出现错误日志或缓冲区积压过半时立即输出
+        while True:
+            self._signal.wait(period_ms)
+            self._signal.clear()
+            self.drain()
+
+    def start(self, period_ms=LOG_DRAIN_MS):
+        _thread.start_new_thread(self.drain_task, (period_ms,))
+
+    def stats(self):
+        return {'pending': self._count, 'dropped': self.dropped}
+
+
+class PrintLog(object):
+    # 与 Logger 的 info/warn/error 参数相同,立即格式化并 print
+    def info(self, fmt, *args):
+        print(fmt.format(*args))
+
+    def warn(self, fmt, *args):
+        print(fmt.format(*args))
+
+    def error(self, fmt, *args):
+        print(fmt.format(*args))
+
+
+PRINT_LOG = PrintLog()
@@ -0,0 +1,299 @@
+#多 profile 示例程序
+
+"""
+示例说明:本例程在一个事件处理线程中同时运行 HFP 自动接听和 SPP 数据通道,可选同时运行 A2DP/AVRCP 音乐控制
+运行平台:EC600UCN_LB 铀开发板
+（1）运行本例程后,通过手机搜索到设备名并点击连接,HFP 连接后手机来电时设备会自动接听;
+（2）手机端蓝牙串口APP(如BlueSPP)连接设备后发送数据,设备会回复"I have received the data you sent.",
+     最多同时接受 4 个 SPP 连接;SPP_TELEMETRY_MS 不为 0 时,设备定时向所有 SPP 连接发送 HFP 上报的信号强度、电量和通话状态;
+（3）BT_A2DP 置为 True 时同时加入 A2DP/AVRCP,调用 a2dp_profile.command(AVRCP_CMD.PLAY) 等发送播放控制命令;
+（4）bt.init/bt.start/bt.release 只执行一次,所有 profile 共用一个事件处理线程、一个事件队列和一个控制面工作线程,
+     某个 profile 的连接断开不会停止 BT,调用 bt.stop() 结束例程;
+（5）BT_ASYNC 置为 True 时使用 uasyncio 协程模式,事件处理、日志输出和阻塞调用都在主线程的事件循环中执行,不再创建线程
+"""
+import bt
+import osTimer
+from machine import Pin
+from bt_event import EVENT_CONTINUE
+from bt_addr import addr_to_mac
+from bt_adapter import AdapterConfig
+from bt_reconnect import ReconnectScheduler
+from bt_spp_session import SppSessionManager
+from bt_hfp import HfpController, HFP_EVENTS, HFP_CALL_EVENTS, HFP_CONN_EVENTS, HFP_COALESCE_EVENTS, HFP_CALL_VOLUME
+from bt_a2dp import A2dpLink
+from bt_avrcp import AvrcpPipeline, AVRCP_CMD
+from bt_log import LOG_EVENT
+from bt_runtime import BtRuntime, BtProfile, RUNTIME_PRIO_CALL, RUNTIME_PRIO_CONN, RUNTIME_PRIO_DATA
+
+BT_NAME = 'QuecPython-BT'
+
+# 参与运行的 profile
+BT_HFP = True
+BT_SPP = True
+BT_A2DP = False
+
+# 如果对应播放通道外置了PA,且需要引脚控制PA开启,则需要下面步骤
+# 具体使用哪个GPIO取决于实际使用的引脚
+if BT_HFP or BT_A2DP:
+    gpio11 = Pin(Pin.GPIO11, Pin.OUT, Pin.PULL_DISABLE, 0)
+    gpio11.write(1)
+
+# HFP 的事件表和处理流程见 bt_hfp,与 bt_hfp_demo 共用
+HFP_PRIO = {}
+for event_id in HFP_CALL_EVENTS:
+    HFP_PRIO[event_id] = RUNTIME_PRIO_CALL
+for event_id in HFP_CONN_EVENTS:
+    HFP_PRIO[event_id] = RUNTIME_PRIO_CONN
+
+
+class HfpProfile(BtProfile):
+    name = 'HFP'
+    events = HFP_EVENTS
+    prio = HFP_PRIO
+    coalesce = HFP_COALESCE_EVENTS
+
+    def __init__(self, auto_reconnect=True, volume=HFP_CALL_VOLUME):
+        self.auto_reconnect = auto_reconnect
+        self.volume = volume
+
+    def attach(self, rt):
+        BtProfile.attach(self, rt)
+        # 对端异常断开时自动重连;多次失败后放弃,不影响其他 profile
+        self.reconnect_event = rt.alloc_event()
+        self.reconnect = ReconnectScheduler(bt.hfpConnect, rt.post, event_id=self.reconnect_event, log=self.log)
+        # 其他 profile 仍在运行,HFP 断开后不停止 BT;接听等阻塞调用在控制面工作线程中执行
+        self.hfp = HfpController(self.log, rt.control, self.reconnect, self.auto_reconnect, self.volume,
+                                 stop_on_disconnect=False)
+        self.status = self.hfp.status
+
+    def init(self):
+        return bt.hfpInit()
+
+    def release(self):
+        return bt.hfpRelease()
+
+    def register(self, rt):
+        for event_name, handler in self.hfp.handlers():
+            rt.on(event_name, handler)
+        rt.register(self.reconnect_event, self.hfp.reconnect_ind)
+
+    def on_stop(self):
+        self.reconnect.cancel()
+        self.log.info('hfp reconnect stats: {}', self.reconnect.stats())
+
+
+SPP_EVENTS = {
+    'BT_SPP_RECV_DATA_IND': 14,        # bt spp recv data ind
+    'BT_SPP_CONNECT_IND': 61,          # bt spp connect ind
+    'BT_SPP_DISCONNECT_IND': 62,       # bt spp disconnect ind
+}
+
+SPP_REPLY = 'I have received the data you sent.'
+
+
+class SppProfile(BtProfile):
+    # 作为服务端接受多个 SPP 连接,不搜索也不主动连接;每个连接有独立的收发缓冲区,回复按连接轮询发送
+    # 当前固件的接收事件不带对端地址、bt.sppSend 没有地址参数,只有一个连接时才能收发数据(见 bt_spp_session)
+    name = 'SPP'
+    events = SPP_EVENTS
+    prio = {
+        SPP_EVENTS['BT_SPP_CONNECT_IND']: RUNTIME_PRIO_CONN,
+        SPP_EVENTS['BT_SPP_DISCONNECT_IND']: RUNTIME_PRIO_CONN,
+    }
+
+    def __init__(self, reply=SPP_REPLY, max_peers=4, telemetry=None, telemetry_ms=0):
+        # telemetry() 返回定时发送给所有连接的数据,telemetry_ms 为 0 时不发送
+        self.reply = reply
+        self.sessions = SppSessionManager(max_peers, send=self._send)
+        self._telemetry = telemetry
+        self._telemetry_ms = telemetry_ms
+        self._timer = None
+
+    def attach(self, rt):
+        BtProfile.attach(self, rt)
+        # 数据面:bt.sppSend 在专用的工作线程中按顺序执行,只有发送失败时才投递完成事件,
+        # 待发送的任务已满时数据留在发送缓冲区中,积压的任务执行完后再发送
+        self.executor = rt.executor(1, 32, notify_ok=False, on_drain=self._send_drained)
+        self.telemetry_event = rt.alloc_event(RUNTIME_PRIO_DATA)
+
+    def init(self):
+        return bt.sppInit()
+
+    def release(self):
+        return bt.sppRelease()
+
+    def register(self, rt):
+        rt.on('BT_SPP_RECV_DATA_IND', self.recv_data_ind)
+        rt.on('BT_SPP_CONNECT_IND', self.connect_ind)
+        rt.on('BT_SPP_DISCONNECT_IND', self.disconnect_ind)
+        rt.register(self.telemetry_event, self.telemetry_ind)
+
+    def on_start(self):
+        self.log.info('Waiting for SPP peers to connect.')
+        if self._telemetry is not None and self._telemetry_ms > 0:
+            self._timer = osTimer()
+            post = self.rt.post
+            event_id = self.telemetry_event
+            self._timer.start(self._telemetry_ms, 1, lambda args: post((event_id, 0)))
+        return 0
+
+    def on_stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+        self.log.info('spp session stats: {}', self.sessions.stats())
+
+    def _send(self, addr, data):
+        if self.executor.submit(bt.sppSend, (data,), self._send_done) < 0:
+            return -1
+        return 0
+
+    def _send_done(self, status, retval):
+        if status != 0 or retval != 0:
+            self.log.error('send data faied, {}', retval)
+
+    def _send_drained(self, status, retval):
+        self.sessions.pump()
+
+    def send(self, data):
+        # 在事件处理线程中调用,写入所有连接的发送缓冲区后轮询发送
+        for session in self.sessions.sessions():
+            session.write(data)
+        self.sessions.pump()
+
+    def recv_data_ind(self, msg):
+        if msg[1] != 0:
+            self.log.error('Recv data failed.')
+            return EVENT_CONTINUE
+        # 事件中带有对端地址(msg[4])时按地址区分连接;当前固件不带地址,只有一个连接时归属于该连接
+        session = self.sessions.feed(msg[3], msg[4] if len(msg) > 4 else None)
+        if session is None:
+            self.log.warn('Recv {} bytes data, cannot tell which of {} peers sent it.', msg[2], len(self.sessions))
+            return EVENT_CONTINUE
+        data = session.rx.read()
+        self.log.event(msg[0], 'recv {} bytes data from {}: {}', msg[2], session.mac, data)
+        session.write(self.reply)
+        self.sessions.pump()
+        return EVENT_CONTINUE
+
+    def connect_ind(self, msg):
+        self.log.event(msg[0], 'status: {}', msg[1])
+        if msg[1] != 0:
+            self.log.error('SPP connect failed.')
+            return EVENT_CONTINUE
+        mac = addr_to_mac(msg[3])
+        if self.sessions.connect(msg[3]) is None:
+            self.log.warn('Too many SPP peers, ignore {}.', mac)
+        else:
+            self.log.info('SPP connect successful, addr {}, peers: {}', mac, len(self.sessions))
+        return EVENT_CONTINUE
+
+    def disconnect_ind(self, msg):
+        mac = addr_to_mac(msg[3])
+        self.log.event(msg[0], 'SPP disconnect, addr {}, peers: {}', mac, self.sessions.disconnect(msg[3]))
+        return EVENT_CONTINUE
+
+    def telemetry_ind(self, msg):
+        if len(self.sessions):
+            self.send(self._telemetry())
+        return EVENT_CONTINUE
+
+
+class A2dpProfile(BtProfile):
+    # A2DP/AVRCP 的事件没有单独处理,其他 profile 没有注册的事件都会触发一次连接状态检查(bt_a2dp.A2dpLink)
+    name = 'A2DP/AVRCP'
+
+    def attach(self, rt):
+        BtProfile.attach(self, rt)
+        self.cmd_event = rt.alloc_event(RUNTIME_PRIO_CALL)
+        # 命令合并、去重和切歌限速见 bt_avrcp,命令在控制面工作线程中执行
+        self.timer_event = rt.alloc_event(RUNTIME_PRIO_CALL)
+        self.pipeline = AvrcpPipeline(rt.control, rt.post, self._cmd_done, event_id=self.timer_event)
+        self.link = A2dpLink(self.log, self.pipeline)
+        # A2DP 和 AVRCP 都连接后置位
+        self.connected = self.link.connected
+
+    def init(self):
+        return bt.a2dpavrcpInit()
+
+    def release(self):
+        return bt.a2dpavrcpRelease()
+
+    def register(self, rt):
+        rt.register(self.cmd_event, self.cmd_ind)
+        rt.register(self.timer_event, self.timer_ind)
+        rt.set_default(self.link.conn_event)
+
+    def on_start(self):
+        bt.reconnect_set(25, 2)
+        bt.reconnect()
+        self.link.refresh()
+        return 0
+
+    def on_stop(self):
+        self.pipeline.cancel()
+        self.log.info('avrcp stats: {}', self.pipeline.stats())
+
+    def command(self, cmd, arg=0):
+        # 可以在任意线程中调用,例如 command(AVRCP_CMD.PLAY)、command(AVRCP_CMD.VOLUME, 8);
+        # 命令经事件队列交给事件处理线程,再经过命令管道提交到控制面工作线程执行
+        return self.rt.post((self.cmd_event, 0, cmd, arg))
+
+    def cmd_ind(self, msg):
+        self.log.event(msg[0], 'avrcp command: {} {}', AVRCP_CMD.name(msg[2]), msg[3])
+        if not self.pipeline.submit(msg[2], msg[3]):
+            self.log.warn('AVRCP command {} dropped, too many pending skips.', AVRCP_CMD.name(msg[2]))
+        return EVENT_CONTINUE
+
+    def timer_ind(self, msg):
+        self.pipeline.on_event(msg)
+        return EVENT_CONTINUE
+
+    def _cmd_done(self, cmd, status, retval):
+        if status != 0 or retval != 0:
+            self.log.error('AVRCP command {} failed, {}', AVRCP_CMD.name(cmd), retval)
+
+
+# 对端异常断开时 HFP 自动重连
+HFP_AUTO_RECONNECT = True
+hfp_profile = HfpProfile(HFP_AUTO_RECONNECT) if BT_HFP else None
+
+
+def hfp_telemetry():
+    status = hfp_profile.status
+    return 'signal: {}, battery: {}, call: {}\r\n'.format(status['signal'], status['battery'], status['call'])
+
+# 不为 0 时每隔该时间向所有 SPP 连接发送一次 HFP 状态
+SPP_TELEMETRY_MS = 0
+spp_profile = SppProfile(SPP_REPLY, 4, hfp_telemetry if BT_HFP else None, SPP_TELEMETRY_MS) if BT_SPP else None
+a2dp_profile = A2dpProfile() if BT_A2DP else None
+
+# 运行状态由事件处理线程切换,main 阻塞等待直到资源释放;
+# BT_HEARTBEAT_MS 不为 0 时,运行期间每隔该时间打印一次心跳日志
+BT_HEARTBEAT_MS = 0
+# 置为 True 时统计每种事件的排队耗时和处理耗时,退出时输出统计结果
+BT_LATENCY = False
+# 设置为文件路径(如 '/usr/bt_multi.trace')后,记录回调收到的所有事件,可以用 bt_trace.replay 离线回放
+BT_TRACE_FILE = None
+# BT_LOG_LEVEL 设置为 LOG_INFO 时不再记录每个事件的日志
+BT_LOG_LEVEL = LOG_EVENT
+# 置为 True 时使用 uasyncio 协程模式(需要固件支持 uasyncio),默认每个任务一个线程
+BT_ASYNC = False
+
+# 名称、可见模式(3:可以被发现并且可以被连接)、音频输出通道(只有 HFP 或 A2DP 时设置)
+bt_adapter = AdapterConfig(BT_NAME, 3, 2 if BT_HFP or BT_A2DP else None)
+bt_runtime = BtRuntime(
+    'BT',
+    [profile for profile in (hfp_profile, spp_profile, a2dp_profile) if profile is not None],
+    bt_adapter, BT_HEARTBEAT_MS, BT_LOG_LEVEL, BT_LATENCY, BT_TRACE_FILE, aio=BT_ASYNC,
+)
+
+
+def main():
+    if BT_ASYNC:
+        from bt_aio import asyncio
+        return asyncio.run(bt_runtime.run_async())
+    return bt_runtime.run()
+
+
+if __name__ == '__main__':
+    main()
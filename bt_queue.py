@@ -0,0 +1,397 @@
+#BT 事件队列公共模块
+
+"""
+说明:提供回调入口使用的定长环形事件队列,供各示例程序共用
+bt_callback 运行在协议栈的回调上下文中,不能因为事件处理线程处理不过来而被阻塞,
+因此入队操作 put_nowait 永不阻塞,队列满时按照创建时指定的溢出策略处理:
+  DROP_OLDEST: 覆盖最早的事件
+  DROP_NEWEST: 丢弃新事件
+  COALESCE:    如果最新的一条事件与新事件的 key 相同,则用新事件原地替换,否则覆盖最早的事件;
+               key 由创建时的 coalesce_key(msg) 计算,没有指定时为事件类型 msg[0]
+队列只允许一个生产者(回调)和一个消费者(事件处理线程):写序号只由生产者修改,读序号只由消费者修改,
+每个槽位另外记录写入时的序号,消费者读取后校验序号,从而在不加锁的情况下发现被覆盖的槽位
+执行器工作线程、定时器、控制台等其他线程投递的内部事件不能写入无锁环形队列,使用 post:
+内部事件加锁写入单独的列表(容量 post_capacity,满时丢弃新事件并返回 False),消费者优先取出,
+回调的 put_nowait 不受影响,仍然不加锁;PriorityEventQueue.post 按 classify 投递到对应子队列
+CoalescingQueue 在环形队列前增加合并层:信号强度、电量等状态类事件只关心最新值,
+同一(事件类型, 对端设备)只保留一个待处理槽位,新值直接覆盖旧值;
+其余事件(来电、通话状态等)仍按到达顺序进入环形队列,并且先于状态类事件被取出;
+回调入队时消费者正在取合并槽位,状态类事件带上入队序号直接进入环形队列;
+消费者按 key 记录最后交付的序号,无论从环形队列还是合并槽位取出,序号更早的值都直接丢弃,保证最后处理的总是最新值
+PriorityEventQueue 按优先级把事件分到多个子队列,优先取高优先级子队列中的事件;
+低优先级子队列连续被跳过 starve_limit 次后,下一次优先取出该子队列的事件,避免被饿死
+创建队列时 stamp 为 True,则入队时用 utime.ticks_us() 记录每个事件的入队时刻,
+get/get_nowait 取出事件后 last_stamp 为该事件的入队时刻,用于统计排队耗时;默认不记录
+"""
+import utime
+import _thread
+from bt_sync import wake
+
+DROP_OLDEST = 0
+DROP_NEWEST = 1
+COALESCE = 2
+
+_WRITING = -1
+_SEQ_SPAN = 0x40000000
+POST_CAPACITY = 8
+
+
+def _event_key(msg):
+    return msg[0]
+
+
+def _newer(seq, than):
+    # 序号在 [0, _SEQ_SPAN) 内循环,seq 比 than 晚写入时返回 True
+    return 0 < (seq - than) % _SEQ_SPAN < _SEQ_SPAN // 2
+
+
+class _Sequenced(object):
+    # 不经过合并槽位、直接进入环形队列的状态类事件,记录 key 和入队序号
+    __slots__ = ('key', 'seq', 'msg')
+
+    def __init__(self, key, seq, msg):
+        self.key = key
+        self.seq = seq
+        self.msg = msg
+
+
+class EventRing(object):
+    def __init__(self, capacity, policy=DROP_OLDEST, coalesce_key=None, stamp=False, post_capacity=POST_CAPACITY):
+        self._cap = capacity
+        # 序号在 [0, span) 内循环,span 为容量的整数倍,保证序号对容量取余即为槽位下标
+        self._span = capacity * (0x3fffffff // capacity)
+        self._buf = [None] * capacity
+        self._seqs = [_WRITING] * capacity
+        self._policy = policy
+        self._key = _event_key if coalesce_key is None else coalesce_key
+        self._stamps = [0] * capacity if stamp else None
+        self.last_stamp = None
+        self._wr = 0
+        self._rd = 0
+        # 队列为空时消费者阻塞在该锁上,生产者入队后释放
+        self._wake = _thread.allocate_lock()
+        self._wake.acquire()
+        # 其他线程投递的内部事件,_post_lock 只保护几次列表操作
+        self._post_cap = post_capacity
+        self._posted = []
+        self._post_stamps = [] if stamp else None
+        self._post_lock = _thread.allocate_lock()
+
+        self.put_count = 0
+        self.drop_newest = 0
+        self.drop_oldest = 0
+        self.coalesced = 0
+        self.high_water = 0
+        self.post_count = 0
+        self.post_dropped = 0
+
+    def _write(self, index, seq, item, stamp=True):
+        # 原地合并时 stamp 为 False,保留第一次入队的时刻,排队耗时从该槽位开始等待时算起
+        self._seqs[index] = _WRITING
+        self._buf[index] = item
+        if stamp and self._stamps is not None:
+            self._stamps[index] = utime.ticks_us()
+        self._seqs[index] = seq
+
+    def put_nowait(self, item):
+        cap = self._cap
+        wr = self._wr
+        depth = (wr - self._rd) % self._span
+        self.put_count += 1
+        if depth >= cap:
+            if self._policy == DROP_NEWEST:
+                self.drop_newest += 1
+                return False
+            if self._policy == COALESCE:
+                last = (wr - 1) % self._span
+                index = last % cap
+                if self._seqs[index] == last and self._key(self._buf[index]) == self._key(item):
+                    self._write(index, last, item, False)
+                    self.coalesced += 1
+                    return True
+            # 最早的事件由消费者在读取时跳过并计数
+            depth = cap
+        else:
+            depth += 1
+        self._write(wr % cap, wr, item)
+        self._wr = (wr + 1) % self._span
+        if depth > self.high_water:
+            self.high_water = depth
+        self.notify()
+        return True
+
+    def share_wake(self, wake):
+        # 多个队列共用同一个唤醒锁,消费者只需要等待一处
+        self._wake = wake
+
+    def notify(self):
+        # 回调和 post 的调用方可能同时唤醒消费者
+        wake(self._wake)
+
+    def wait(self):
+        self._wake.acquire()
+
+    def post(self, item):
+        # 可以在任意线程中调用,短暂持有锁,不会等待消费者
+        self._post_lock.acquire()
+        if len(self._posted) >= self._post_cap:
+            self.post_dropped += 1
+            self._post_lock.release()
+            return False
+        self._posted.append(item)
+        if self._post_stamps is not None:
+            self._post_stamps.append(utime.ticks_us())
+        self.post_count += 1
+        self._post_lock.release()
+        self.notify()
+        return True
+
+    def _get_posted(self):
+        self._post_lock.acquire()
+        item = self._posted.pop(0)
+        if self._post_stamps is not None:
+            self.last_stamp = self._post_stamps.pop(0)
+        self._post_lock.release()
+        return item
+
+    def get_nowait(self):
+        if self._posted:
+            return self._get_posted()
+        cap = self._cap
+        span = self._span
+        while True:
+            wr = self._wr
+            rd = self._rd
+            depth = (wr - rd) % span
+            if depth == 0:
+                return None
+            if depth > cap:
+                self.drop_oldest += depth - cap
+                rd = (wr - cap) % span
+                self._rd = rd
+            index = rd % cap
+            seq = self._seqs[index]
+            item = self._buf[index]
+            if self._stamps is not None:
+                stamp = self._stamps[index]
+            if seq == rd and self._seqs[index] == rd:
+                self._rd = (rd + 1) % span
+                if self._stamps is not None:
+                    self.last_stamp = stamp
+                return item
+            # 读取期间该槽位被生产者覆盖,重新定位到最早的有效事件
+
+    def get(self):
+        while True:
+            item = self.get_nowait()
+            if item is not None:
+                return item
+            self.wait()
+
+    def qsize(self):
+        return min((self._wr - self._rd) % self._span, self._cap) + len(self._posted)
+
+    def empty(self):
+        return self._wr == self._rd and not self._posted
+
+    def dropped(self):
+        return self.drop_newest + self.drop_oldest + self.post_dropped
+
+    def stats(self):
+        return {
+            'put': self.put_count,
+            'drop_newest': self.drop_newest,
+            'drop_oldest': self.drop_oldest,
+            'coalesced': self.coalesced,
+            'high_water': self.high_water,
+            'depth': self.qsize(),
+            'posted': self.post_count,
+            'post_dropped': self.post_dropped,
+        }
+
+
+class CoalescingQueue(object):
+    def __init__(self, capacity, policy=DROP_OLDEST, coalesce_ids=(), key=None, stamp=False):
+        self._ordered = EventRing(capacity, policy, stamp=stamp)
+        self._ids = {}
+        for event_id in coalesce_ids:
+            self._ids[event_id] = True
+        self._key = key
+        self._pending = {}
+        self._order = []
+        # 状态类事件的入队序号:_seqs 为合并槽位的序号,由生产者写入;_delivered 为每个 key 最后交付的序号,只由消费者读写
+        self._seq = 0
+        self._seqs = {}
+        self._delivered = {}
+        # 合并槽位记录第一次入队的时刻,即该槽位实际等待的时间
+        self._pending_stamps = {} if stamp else None
+        self.last_stamp = None
+        # 只保护 _pending/_order 的几次字典和列表操作,不会在持有期间执行事件处理
+        self._lock = _thread.allocate_lock()
+        self.coalesced = 0
+        self.stale = 0
+
+    def put_nowait(self, msg):
+        if msg[0] not in self._ids:
+            return self._ordered.put_nowait(msg)
+        key = msg[0] if self._key is None else self._key(msg)
+        seq = (self._seq + 1) % _SEQ_SPAN
+        self._seq = seq
+        if self._lock.acquire(0):
+            if key in self._pending:
+                self.coalesced += 1
+            else:
+                self._order.append(key)
+                if self._pending_stamps is not None:
+                    self._pending_stamps[key] = utime.ticks_us()
+            self._pending[key] = msg
+            self._seqs[key] = seq
+            self._lock.release()
+            self._ordered.notify()
+            return True
+        # 消费者正在取合并槽位,带上序号直接按顺序入队,回调不会等待;被丢弃时合并槽位中的旧值仍然有效
+        return self._ordered.put_nowait(_Sequenced(key, seq, msg))
+
+    def post(self, msg):
+        # 内部事件不参与合并
+        return self._ordered.post(msg)
+
+    def _deliver(self, key, seq, msg):
+        # 已经交付过同一 key 更新的值时丢弃并返回 False
+        last = self._delivered.get(key)
+        if last is not None and not _newer(seq, last):
+            self.stale += 1
+            return False
+        self._delivered[key] = seq
+        return True
+
+    def _get_ordered(self):
+        while True:
+            msg = self._ordered.get_nowait()
+            if not isinstance(msg, _Sequenced):
+                return msg
+            if self._deliver(msg.key, msg.seq, msg.msg):
+                return msg.msg
+
+    def _pop_pending(self):
+        while self._order:
+            self._lock.acquire()
+            key = self._order.pop(0)
+            msg = self._pending.pop(key)
+            seq = self._seqs.pop(key)
+            if self._pending_stamps is not None:
+                stamp = self._pending_stamps.pop(key)
+            self._lock.release()
+            if not self._deliver(key, seq, msg):
+                continue
+            if self._pending_stamps is not None:
+                self.last_stamp = stamp
+            return msg
+        return None
+
+    def share_wake(self, wake):
+        self._ordered.share_wake(wake)
+
+    def get_nowait(self):
+        msg = self._get_ordered()
+        if msg is None:
+            msg = self._pop_pending()
+        elif self._pending_stamps is not None:
+            self.last_stamp = self._ordered.last_stamp
+        return msg
+
+    def get(self):
+        while True:
+            msg = self.get_nowait()
+            if msg is not None:
+                return msg
+            self._ordered.wait()
+
+    def qsize(self):
+        return self._ordered.qsize() + len(self._order)
+
+    def empty(self):
+        return self._ordered.empty() and not self._order
+
+    def stats(self):
+        stats = self._ordered.stats()
+        stats['coalesced'] += self.coalesced
+        stats['pending'] = len(self._order)
+        stats['stale'] = self.stale
+        return stats
+
+
+class PriorityEventQueue(object):
+    def __init__(self, queues, classify, starve_limit=8):
+        # queues 按优先级从高到低排列,classify(msg) 返回事件所属子队列的下标
+        self._queues = queues
+        self._classify = classify
+        self._limit = starve_limit
+        self._skips = [0] * len(queues)
+        self._wake = _thread.allocate_lock()
+        self._wake.acquire()
+        for queue in queues:
+            queue.share_wake(self._wake)
+        self.last_stamp = None
+        self.promoted = 0
+
+    def put_nowait(self, msg):
+        return self._queues[self._classify(msg)].put_nowait(msg)
+
+    def post(self, msg):
+        return self._queues[self._classify(msg)].post(msg)
+
+    def get_nowait(self):
+        queues = self._queues
+        skips = self._skips
+        chosen = -1
+        for i in range(len(queues)):
+            if queues[i].empty():
+                skips[i] = 0
+            elif chosen < 0:
+                chosen = i
+            else:
+                skips[i] += 1
+                if skips[i] > self._limit:
+                    chosen = i
+                    self.promoted += 1
+                    break
+        if chosen < 0:
+            return None
+        skips[chosen] = 0
+        msg = queues[chosen].get_nowait()
+        if msg is None:
+            # 选中的子队列中只剩已过期的合并值,继续按优先级取其他子队列,还有事件时不能进入等待
+            for i in range(len(queues)):
+                if i != chosen:
+                    msg = queues[i].get_nowait()
+                    if msg is not None:
+                        chosen = i
+                        break
+        self.last_stamp = queues[chosen].last_stamp
+        return msg
+
+    def get(self):
+        while True:
+            msg = self.get_nowait()
+            if msg is not None:
+                return msg
+            self._wake.acquire()
+
+    def qsize(self):
+        size = 0
+        for queue in self._queues:
+            size += queue.qsize()
+        return size
+
+    def empty(self):
+        for queue in self._queues:
+            if not queue.empty():
+                return False
+        return True
+
+    def stats(self):
+        stats = {'promoted': self.promoted}
+        for i in range(len(self._queues)):
+            stats[i] = self._queues[i].stats()
+        return stats
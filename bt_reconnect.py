@@ -0,0 +1,162 @@
+#BT 自动重连公共模块
+
+"""
+说明:收到断开事件后按退避策略自动重连对端设备,并统计断开到重新连接成功的时间分布
+重连间隔:第一次快速重试(first_ms),之后从 base_ms 开始按 2 的指数增长,不超过 cap_ms,
+每次的间隔都加入随机抖动(一半固定,一半随机),避免多台设备同时重连;
+上一次重连需要多次尝试才成功的设备,跳过快速重试,直接从 base_ms 开始
+定时器到期时不在定时器回调中直接连接,而是通过 post 向事件队列投递 RECONNECT_EVENT(或创建时指定的 event_id),
+由事件处理线程调用 on_event 发起连接,连接结果再通过 on_connected/on_failed 告知调度器
+post 在定时器线程中调用,需要支持多个线程投递(例如 bt_queue 各队列的 post,不能使用回调专用的 put_nowait)
+重连过程的日志在事件处理线程中产生,通过 log(bt_log.Logger)写入日志缓冲区,不同步 print
+"""
+import utime
+import osTimer
+from bt_addr import addr_to_mac, addr_key, addr_bytes
+from bt_log import PRINT_LOG
+
+try:
+    import urandom as random
+except ImportError:
+    import random
+
+RECONNECT_EVENT = 1000
+RECONNECT_HISTORY = 32
+QUICK_ATTEMPTS = 2
+
+
+class _Peer(object):
+    def __init__(self, addr):
+        self.addr = addr
+        self.attempt = 0
+        self.lost_at = None  # 断开时刻,None 表示当前没有在重连
+        self.timer = None
+        self.quick = True
+        self.last_ms = None
+
+
+class ReconnectScheduler(object):
+    def __init__(self, connect, post, first_ms=300, base_ms=1000, cap_ms=30000, max_attempts=10, give_up=None, event_id=RECONNECT_EVENT, log=None):
+        # connect(addr) 发起连接,返回 0 表示请求已发出;post(msg) 向事件队列投递消息
+        # give_up(addr) 在超过 max_attempts 次(0 表示不限)仍未成功时调用
+        # 多个调度器共用一个事件队列时(例如同一个手机的 HFP 和 SPP 重连),需要指定不同的 event_id
+        # log 为 bt_log.Logger,为 None 时直接 print
+        self._connect = connect
+        self._post = post
+        self._event_id = event_id
+        self._first = first_ms
+        self._base = base_ms
+        self._cap = cap_ms
+        self._max = max_attempts
+        self._give_up = give_up
+        self._log = PRINT_LOG if log is None else log
+        self._peers = {}
+        self._history = [0] * RECONNECT_HISTORY
+        self._history_len = 0
+        self._history_pos = 0
+        self.reconnects = 0
+        self.attempts = 0
+        self.gave_up = 0
+
+    def _peer(self, addr, create=False):
+        key = addr_key(addr)
+        peer = self._peers.get(key)
+        if peer is None and create:
+            peer = _Peer(addr_bytes(addr))
+            self._peers[key] = peer
+        return peer
+
+    def pending(self, addr):
+        peer = self._peer(addr)
+        return peer is not None and peer.lost_at is not None
+
+    def on_disconnect(self, addr):
+        peer = self._peer(addr, True)
+        if peer.lost_at is None:
+            peer.lost_at = utime.ticks_ms()
+            peer.attempt = 0
+        self._schedule(peer)
+
+    def on_connected(self, addr):
+        peer = self._peer(addr)
+        if peer is None or peer.lost_at is None:
+            return
+        elapsed = utime.ticks_diff(utime.ticks_ms(), peer.lost_at)
+        self._history[self._history_pos] = elapsed
+        self._history_pos = (self._history_pos + 1) % RECONNECT_HISTORY
+        self._history_len = min(self._history_len + 1, RECONNECT_HISTORY)
+        peer.quick = peer.attempt <= QUICK_ATTEMPTS
+        peer.last_ms = elapsed
+        peer.lost_at = None
+        self._stop_timer(peer)
+        self.reconnects += 1
+        self._log.info('Reconnected to {} after {} attempts, {} ms.', addr_to_mac(peer.addr), peer.attempt, elapsed)
+
+    def on_failed(self, addr):
+        peer = self._peer(addr)
+        if peer is not None and peer.lost_at is not None:
+            self._schedule(peer)
+
+    def on_event(self, msg):
+        # 事件处理线程中收到 RECONNECT_EVENT 时调用
+        peer = self._peer(msg[2])
+        if peer is None or peer.lost_at is None:
+            return
+        peer.attempt += 1
+        self.attempts += 1
+        self._log.info('Reconnect to {}, attempt {}.', addr_to_mac(peer.addr), peer.attempt)
+        if self._connect(peer.addr) != 0:
+            self._schedule(peer)
+
+    def cancel(self, addr=None):
+        peers = self._peers.values() if addr is None else (self._peer(addr),)
+        for peer in peers:
+            if peer is not None:
+                peer.lost_at = None
+                self._stop_timer(peer)
+
+    def _delay(self, peer):
+        if peer.attempt == 0 and peer.quick:
+            delay = self._first
+        else:
+            delay = min(self._cap, self._base << min(max(peer.attempt - 1, 0), 16))
+        half = delay // 2
+        return half + random.randint(0, half)
+
+    def _schedule(self, peer):
+        if self._max and peer.attempt >= self._max:
+            self._log.warn('Give up reconnecting to {} after {} attempts.', addr_to_mac(peer.addr), peer.attempt)
+            peer.lost_at = None
+            peer.quick = False
+            self.gave_up += 1
+            if self._give_up is not None:
+                self._give_up(peer.addr)
+            return
+        if peer.timer is None:
+            peer.timer = osTimer()
+        delay = self._delay(peer)
+        addr = peer.addr
+        post = self._post
+        event_id = self._event_id
+        peer.timer.stop()
+        peer.timer.start(delay, 0, lambda args: post((event_id, 0, addr)))
+
+    def _stop_timer(self, peer):
+        if peer.timer is not None:
+            peer.timer.stop()
+
+    def stats(self):
+        samples = sorted(self._history[:self._history_len])
+        count = len(samples)
+        stats = {
+            'reconnects': self.reconnects,
+            'attempts': self.attempts,
+            'gave_up': self.gave_up,
+            'p50_ms': samples[count // 2] if count else None,
+            'p90_ms': samples[(count * 9) // 10] if count else None,
+            'max_ms': samples[-1] if count else None,
+            'peers': {},
+        }
+        for peer in self._peers.values():
+            stats['peers'][addr_to_mac(peer.addr)] = {'quick': peer.quick, 'last_ms': peer.last_ms}
+        return stats
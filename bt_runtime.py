@@ -0,0 +1,445 @@
+#BT 多 profile 运行时公共模块
+
+"""
+说明:在同一个事件处理线程、同一个事件队列上同时运行 SPP、HFP、A2DP/AVRCP 等多个 profile
+单 profile 的示例程序各自创建线程和队列,各自执行 bt.init/bt.start/bt.release;
+BtRuntime 把这部分合并为一次,各 profile 以插件(BtProfile 的子类)的方式加入,只负责自己的初始化、释放和事件处理:
+  init()        bt.init 之后、bt.start 之前调用,执行 bt.sppInit 等接口,返回 0 表示成功
+  register(rt)  调用 rt.on/rt.register 注册事件处理函数
+  on_start()    BT 启动成功并设置好名称和可见模式后调用,返回非 0 时停止 BT
+  on_stop()     事件处理线程退出前调用,用于取消定时器、输出统计
+  release()     bt.release 之前调用,执行 bt.sppRelease 等接口
+BT_START_STATUS_IND/BT_STOP_STATUS_IND 由运行时处理;同一事件ID可以注册多个处理函数,按注册顺序依次调用
+事件队列分为通话控制、连接状态、数据和状态上报三级,profile 通过 prio 声明自己事件的优先级,
+通过 coalesce 声明只需要处理最新值的状态类事件
+阻塞的 native 调用提交到各 profile 共用的控制面执行器 rt.control,或者 rt.executor 创建的专用执行器,
+所有执行器的完成事件都是 EXECUTOR_DONE_EVENT;定时器等投递的内部事件通过 alloc_event 分配互不冲突的事件ID
+rt.post(msg) 可以在任意线程中调用(执行器工作线程、osTimer、主线程),经事件队列的加锁路径入队;
+只有协议栈回调 rt.callback 使用无锁的 put_nowait
+aio 为 True 时使用协程模式:主线程调用 asyncio.run(rt.run_async()),事件处理、日志输出和执行器都是同一线程中的协程,
+回调入队后通过 ThreadSafeFlag 唤醒事件处理协程;处理函数可以是 async 函数,事件处理协程等待它执行完再取下一个事件;
+osTimer 定时器(重连等)仍然只向事件队列投递事件
+"""
+import bt
+import _thread
+from bt_enum import BtEnum
+from bt_addr import event_key
+from bt_event import EventDispatcher, EVENT_CONTINUE, EVENT_EXIT
+from bt_queue import EventRing, CoalescingQueue, PriorityEventQueue, DROP_NEWEST
+from bt_executor import Executor, EXECUTOR_DONE_EVENT, EXECUTOR_CAPACITY
+from bt_boot import BtReady, BootProfile, abort_start, BT_START_TIMEOUT_MS, BT_STOP_TIMEOUT_MS
+from bt_lifecycle import Lifecycle, LIFECYCLE_STATE
+from bt_log import Logger, LOG_EVENT
+from bt_latency import LatencyMonitor
+from bt_trace import TraceRecorder
+
+RUNTIME_PRIO_CALL = 0
+RUNTIME_PRIO_CONN = 1
+RUNTIME_PRIO_DATA = 2
+
+# 各级子队列的容量,依次为通话控制、连接状态、数据和状态上报
+RUNTIME_QUEUE_SIZE = (10, 10, 30)
+
+# 协程模式下日志输出的周期
+RUNTIME_LOG_DRAIN_MS = 500
+
+# alloc_event 分配的事件ID从这里开始,避开协议栈事件和 RECONNECT_EVENT/EXECUTOR_DONE_EVENT
+RUNTIME_EVENT_BASE = 1100
+
+RUNTIME_EVENTS = {
+    'BT_START_STATUS_IND': 0,          # bt/ble start
+    'BT_STOP_STATUS_IND': 1,           # bt/ble stop
+}
+
+
+_aio = None
+
+
+def _load_aio():
+    # 只有协程模式才导入 bt_aio(uasyncio),线程模式下不占用它的内存
+    global _aio
+    if _aio is None:
+        import bt_aio
+        _aio = bt_aio
+    return _aio
+
+
+def _coalesce_key(msg):
+    # 状态类事件按(事件类型, 对端地址)合并
+    if len(msg) < 4:
+        return msg[0]
+    return event_key(msg[0], msg[3])
+
+
+def _chain(handlers):
+    def handler(msg):
+        ret = EVENT_CONTINUE
+        for h in handlers:
+            if h(msg) == EVENT_EXIT:
+                ret = EVENT_EXIT
+        return ret
+    return handler
+
+
+class BtProfile(object):
+    # events 为 事件名 -> 事件ID;prio 为 事件ID -> 优先级,未列出的事件为 RUNTIME_PRIO_DATA
+    name = 'BT'
+    events = {}
+    prio = {}
+    coalesce = ()
+
+    def attach(self, rt):
+        # 加入运行时时调用,子类在这里创建需要向事件队列投递消息的对象(执行器、重连调度器等)
+        self.rt = rt
+        self.log = rt.log
+
+    def init(self):
+        return 0
+
+    def register(self, rt):
+        pass
+
+    def on_start(self):
+        return 0
+
+    def on_stop(self):
+        pass
+
+    def release(self):
+        return 0
+
+
+class BtRuntime(object):
+    def __init__(self, name, profiles, adapter, heartbeat_ms=0, log_level=LOG_EVENT, latency=False, trace_file=None,
+                 queue_size=RUNTIME_QUEUE_SIZE, control_capacity=4, aio=False):
+        self.name = name
+        self.aio = aio
+        self._aio = _load_aio() if aio else None
+        self.profiles = profiles
+        self.adapter = adapter
+        table = dict(RUNTIME_EVENTS)
+        self._prio = {
+            RUNTIME_EVENTS['BT_START_STATUS_IND']: RUNTIME_PRIO_CONN,
+            RUNTIME_EVENTS['BT_STOP_STATUS_IND']: RUNTIME_PRIO_CONN,
+            EXECUTOR_DONE_EVENT: RUNTIME_PRIO_CALL,
+        }
+        coalesce = []
+        for profile in profiles:
+            table.update(profile.events)
+            self._prio.update(profile.prio)
+            coalesce.extend(profile.coalesce)
+        self.events = BtEnum(table)
+        self.log = Logger(64, log_level, self.events)
+        # 名称和可见模式在事件处理线程中设置,设置结果写入运行时的日志
+        if adapter.log is None:
+            adapter.log = self.log
+        self.latency = LatencyMonitor(self.events) if latency else None
+        # 通话控制和连接事件队列满时丢弃新事件,保证已入队的事件按顺序处理;
+        # 数据按顺序进入第三级队列,状态类事件在合并槽位中只保留最新值
+        self.queue = PriorityEventQueue((
+            EventRing(queue_size[0], DROP_NEWEST, stamp=latency),
+            EventRing(queue_size[1], DROP_NEWEST, stamp=latency),
+            CoalescingQueue(queue_size[2], DROP_NEWEST, coalesce, _coalesce_key, stamp=latency),
+        ), self._classify)
+        if aio:
+            self._flag = self._aio.ThreadSafeFlag()
+            self.post = self._post_wake
+        else:
+            self._flag = None
+            self.post = self.queue.post
+        self._started = None
+        self.trace = TraceRecorder(trace_file) if trace_file else None
+        self.lifecycle = Lifecycle(name, heartbeat_ms, self.log)
+        self.ready = BtReady()
+        self.boot = None
+        self._handlers = {}
+        self._next_event = RUNTIME_EVENT_BASE
+        self._executors = []
+        self.control = self.executor(1, control_capacity)
+        for profile in profiles:
+            profile.attach(self)
+
+    def _classify(self, msg):
+        return self._prio.get(msg[0], RUNTIME_PRIO_DATA)
+
+    def _post_wake(self, msg):
+        ret = self.queue.post(msg)
+        self._flag.set()
+        return ret
+
+    def callback(self, args):
+        # 传给 bt.init 的回调,运行在协议栈的回调上下文中,只入队;回调是无锁环形队列唯一的生产者
+        if self.trace is not None:
+            self.trace.record(args)
+        self.queue.put_nowait(args)
+        if self._flag is not None:
+            self._flag.set()
+
+    def register(self, event_id, handler):
+        handlers = self._handlers.get(event_id)
+        if handlers is None:
+            self._handlers[event_id] = [handler]
+        else:
+            handlers.append(handler)
+
+    def on(self, event_name, handler):
+        self.register(self.events[event_name], handler)
+
+    def set_default(self, handler):
+        # 没有任何 profile 注册的事件交给默认处理函数,多个 profile 都设置时依次调用
+        self.register(None, handler)
+
+    def alloc_event(self, prio=RUNTIME_PRIO_CONN):
+        event_id = self._next_event
+        self._next_event += 1
+        self._prio[event_id] = prio
+        return event_id
+
+    def executor(self, workers=1, capacity=EXECUTOR_CAPACITY, notify_ok=True, on_drain=None):
+        # 创建的执行器在 run 中随事件处理线程一起启动,退出时输出统计;协程模式下 workers 不使用
+        if self.aio:
+            executor = self._aio.TaskExecutor(capacity, notify_ok, on_drain)
+        else:
+            executor = Executor(self.post, workers, capacity, notify_ok=notify_ok, on_drain=on_drain)
+        self._executors.append(executor)
+        return executor
+
+    def start_executors(self):
+        for executor in self._executors:
+            executor.start()
+
+    def _start_status_ind(self, msg):
+        status = msg[1]
+        self.log.event(msg[0], 'status: {}', status)
+        self.ready.resolve(status)
+        if self._started is not None:
+            self._started.set()
+        if self.boot is not None:
+            self.boot.mark('start')
+        if status != 0:
+            self.log.error('BT start failed.')
+            bt.stop()
+            return EVENT_EXIT
+
+        self.log.info('BT start successfully.')
+        self.lifecycle.set_state(LIFECYCLE_STATE.RUNNING)
+        if self.adapter.apply(('name',)) != 0:
+            bt.stop()
+            return EVENT_EXIT
+        if self.boot is not None:
+            self.boot.mark('name')
+
+        if self.adapter.apply(('visible_mode',)) != 0:
+            bt.stop()
+            return EVENT_EXIT
+        if self.boot is not None:
+            self.boot.mark('visibility')
+            self.boot.report(self.log.info)
+
+        for profile in self.profiles:
+            if profile.on_start() != 0:
+                self.log.error('{} start failed.', profile.name)
+                bt.stop()
+                return EVENT_EXIT
+        return EVENT_CONTINUE
+
+    def _stop_status_ind(self, msg):
+        self.log.event(msg[0], 'status: {}', msg[1])
+        if msg[1] == 0:
+            self.lifecycle.set_state(LIFECYCLE_STATE.STOPPING)
+            self.log.info('BT stop successfully.')
+        else:
+            self.log.error('BT stop failed.')
+        self.adapter.invalidate()
+        return EVENT_EXIT
+
+    def _executor_event(self, msg):
+        # 所有执行器的完成事件格式相同,任意一个执行器的 on_event 都可以处理
+        self.control.on_event(msg)
+        return EVENT_CONTINUE
+
+    def dispatcher_init(self):
+        # 事件处理表在启动时构建一次,每个事件只需一次查表
+        dispatcher = EventDispatcher(self.events)
+        dispatcher.on('BT_START_STATUS_IND', self._start_status_ind)
+        dispatcher.on('BT_STOP_STATUS_IND', self._stop_status_ind)
+        dispatcher.register(EXECUTOR_DONE_EVENT, self._executor_event)
+        self._handlers = {}
+        for profile in self.profiles:
+            profile.register(self)
+        for event_id, handlers in self._handlers.items():
+            handler = handlers[0] if len(handlers) == 1 else _chain(handlers)
+            if event_id is None:
+                dispatcher.set_default(handler)
+            else:
+                dispatcher.register(event_id, handler)
+        dispatcher.set_latency(self.latency)
+        return dispatcher
+
+    def event_proc_task(self):
+        dispatcher = self.dispatcher_init()
+        queue = self.queue
+        log = self.log
+        while True:
+            log.debug('wait msg...')
+            msg = queue.get()  # 没有消息时会阻塞在这
+            if dispatcher.dispatch(msg, queue.last_stamp) == EVENT_EXIT:
+                break
+            if self.trace is not None:
+                self.trace.flush(True)
+        self._shutdown()
+
+    async def event_task(self):
+        # 协程模式下的事件处理;每处理完一个事件让出一次,执行器中的任务不会被连续到达的事件饿死
+        asyncio = self._aio.asyncio
+        dispatcher = self.dispatcher_init()
+        queue = self.queue
+        flag = self._flag
+        while True:
+            msg = queue.get_nowait()
+            if msg is None:
+                await flag.wait()
+                continue
+            ret = dispatcher.dispatch(msg, queue.last_stamp)
+            if ret is not None and not isinstance(ret, int):
+                ret = await ret
+            if ret == EVENT_EXIT:
+                break
+            if self.trace is not None:
+                self.trace.flush(True)
+            await asyncio.sleep(0)
+        self._shutdown()
+
+    def _shutdown(self):
+        log = self.log
+        queue = self.queue
+        log.info('event queue stats: {}', queue.stats())
+        for profile in self.profiles:
+            profile.on_stop()
+        for executor in self._executors:
+            log.info('executor stats: {}', executor.stats())
+        if self.latency is not None:
+            self.latency.report(log.info)
+        if self.trace is not None:
+            self.trace.close()
+        self.release()
+        log.drain()
+        self.lifecycle.set_state(LIFECYCLE_STATE.RELEASED)
+
+    def release(self, profiles=None):
+        # 按加入顺序的逆序释放各 profile,最后释放 BT
+        if profiles is None:
+            profiles = self.profiles
+        for i in range(len(profiles) - 1, -1, -1):
+            if profiles[i].release() == 0:
+                print('{} release successful.'.format(profiles[i].name))
+            else:
+                print('{} release failed.'.format(profiles[i].name))
+        if bt.release() == 0:
+            print('BT release successful.')
+        else:
+            print('BT release failed.')
+
+    def run(self):
+        # 主线程调用:bt.init、各 profile 初始化、bt.start 只执行一次,然后阻塞到资源释放;启动失败返回 -1
+        self.log.start()
+        self.start_executors()
+        _thread.start_new_thread(self.event_proc_task, ())
+
+        self.boot = BootProfile(self.name)
+        if bt.init(self.callback) != 0:
+            print('BT init failed.')
+            return -1
+        print('BT init successful.')
+        # 音频输出通道在 profile 初始化之前设置一次,之后与缓存值相同不再重复设置
+        if self.adapter.get('channel') is not None and self.adapter.apply(('channel',)) != 0:
+            self.log.drain()
+            bt.release()
+            return -1
+        self.boot.mark('init')
+
+        for i in range(len(self.profiles)):
+            profile = self.profiles[i]
+            if profile.init() != 0:
+                print('{} init failed.'.format(profile.name))
+                self.release(self.profiles[:i])
+                return -1
+            print('{} init successful.'.format(profile.name))
+        self.boot.mark('profile init')
+
+        if bt.start() != 0:
+            print('BT start failed.')
+            self.release()
+            return -1
+        print('BT start successful.')
+        # 名称和可见模式在 BT_START_STATUS_IND 的处理函数中设置,这里只处理协议栈没有上报启动结果的情况
+        if self.ready.wait() is None:
+            print('BT start timeout.')
+            abort_start(self.lifecycle, self.post, RUNTIME_EVENTS['BT_STOP_STATUS_IND'])
+            self.log.drain()
+            return -1
+
+        self.lifecycle.run()
+        self.log.drain()
+        print('BT {} has stopped running, ready to exit.'.format(self.name))
+        return 0
+
+    async def _log_task(self):
+        while True:
+            await self._aio.sleep_ms(RUNTIME_LOG_DRAIN_MS)
+            self.log.drain()
+
+    async def run_async(self):
+        # 协程模式下由 asyncio.run 调用,启动流程与 run 相同,不创建线程;启动失败返回 -1
+        asyncio = self._aio.asyncio
+        self._started = asyncio.Event()
+        log_task = asyncio.create_task(self._log_task())
+        task = asyncio.create_task(self.event_task())
+
+        self.boot = BootProfile(self.name)
+        if bt.init(self.callback) != 0:
+            print('BT init failed.')
+            return -1
+        print('BT init successful.')
+        if self.adapter.get('channel') is not None and self.adapter.apply(('channel',)) != 0:
+            self.log.drain()
+            bt.release()
+            return -1
+        self.boot.mark('init')
+
+        for i in range(len(self.profiles)):
+            profile = self.profiles[i]
+            if profile.init() != 0:
+                print('{} init failed.'.format(profile.name))
+                self.release(self.profiles[:i])
+                return -1
+            print('{} init successful.'.format(profile.name))
+        self.boot.mark('profile init')
+
+        if bt.start() != 0:
+            print('BT start failed.')
+            self.release()
+            return -1
+        print('BT start successful.')
+        try:
+            await asyncio.wait_for(self._started.wait(), BT_START_TIMEOUT_MS / 1000)
+        except asyncio.TimeoutError:
+            print('BT start timeout.')
+            # 与 abort_start 相同,由事件处理任务释放资源;事件循环中不能阻塞等待
+            if bt.stop() == 0:
+                waited = 0
+                while self.lifecycle.state < LIFECYCLE_STATE.RELEASED and waited < BT_STOP_TIMEOUT_MS:
+                    await self._aio.sleep_ms(RUNTIME_LOG_DRAIN_MS)
+                    waited += RUNTIME_LOG_DRAIN_MS
+            if self.lifecycle.state < LIFECYCLE_STATE.RELEASED:
+                self.post((RUNTIME_EVENTS['BT_STOP_STATUS_IND'], 0))
+            await task
+            log_task.cancel()
+            self.log.drain()
+            return -1
+
+        await task
+        log_task.cancel()
+        self.log.drain()
+        print('BT {} has stopped running, ready to exit.'.format(self.name))
+        return 0
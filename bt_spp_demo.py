@@ -12,12 +12,28 @@
 import bt
 import utime
 import _thread
-from queue import Queue
+from bt_event import EventDispatcher, EVENT_CONTINUE, EVENT_EXIT
+from bt_addr import addr_to_mac
+from bt_enum import BtEnum
+from bt_trace import TraceRecorder
+from bt_queue import EventRing, DROP_NEWEST
+from bt_spp_stream import SppStream
+from bt_spp_frame import FrameParser, FrameWriter, FRAME_MAX_LEN
+from bt_spp_session import SppSessionManager
+from bt_executor import Executor, EXECUTOR_DONE_EVENT
+from bt_devcache import DeviceCache
+from bt_inquiry import InquiryTable
+from bt_reconnect import ReconnectScheduler, RECONNECT_EVENT
+from bt_boot import BtReady, BootProfile, abort_start
+from bt_adapter import AdapterConfig
+from bt_lifecycle import Lifecycle, LIFECYCLE_STATE
+from bt_log import Logger, LOG_EVENT
+from bt_latency import LatencyMonitor
 
 
 BT_NAME = 'QuecPython-SPP'
 
-BT_EVENT = {
+BT_EVENT = BtEnum({
     'BT_START_STATUS_IND': 0,          # bt/ble start
     'BT_STOP_STATUS_IND': 1,           # bt/ble stop
     'BT_SPP_INQUIRY_IND': 6,           # bt spp inquiry ind
@@ -25,183 +41,418 @@ BT_EVENT = {
     'BT_SPP_RECV_DATA_IND': 14,        # bt spp recv data ind
     'BT_SPP_CONNECT_IND': 61,          # bt spp connect ind
     'BT_SPP_DISCONNECT_IND': 62,       # bt spp disconnect ind
-}
+})
+
+# 可接受的目标设备的蓝牙名称,搜索到多个时连接信号最好的一个
+DST_DEVICE_NAMES = (
+    'HUAWEI Mate40 Pro',
+)
 
 DST_DEVICE_INFO = {
-    'dev_name':'HUAWEI Mate40 Pro',# 要连接设备的蓝牙名称
+    'dev_name': DST_DEVICE_NAMES[0],  # 实际连接的设备的蓝牙名称
     'bt_addr': None
 }
 
-BT_IS_RUN = 0
-msg_queue = Queue(30)
+# 搜索结果按地址去重;最佳目标设备在之后 2 次上报中没有变化,或者保持 1 秒以上,就提前结束搜索
+inquiry_table = InquiryTable(DST_DEVICE_NAMES, 2, 1000)
+
+# 连接过的设备保存在缓存文件中,下次启动时先直接连接缓存中的地址,失败后再搜索
+dev_cache = DeviceCache()
+SPP_CONNECT_INFO = {
+    'mode': 'cold',  # cold:搜索后连接 warm:直接连接缓存中的地址
+    'start': 0,
+}
+
+# 事件处理线程中的日志只写入环形缓冲区,由日志任务格式化后输出;
+# BT_LOG_LEVEL 设置为 LOG_INFO 时不再记录每个事件的日志,也可以调用 log.mute(事件ID) 屏蔽指定事件
+BT_LOG_LEVEL = LOG_EVENT
+log = Logger(64, BT_LOG_LEVEL, BT_EVENT)
+
+# 运行状态由事件处理线程切换,main 阻塞等待直到资源释放;
+# BT_HEARTBEAT_MS 不为 0 时,运行期间每隔该时间打印一次心跳日志
+BT_HEARTBEAT_MS = 0
+bt_lifecycle = Lifecycle('SPP', BT_HEARTBEAT_MS, log)
+
+# 置为 True 时事件入队时记录时间戳,统计每种事件的排队耗时和处理耗时,退出时输出统计结果
+BT_LATENCY = False
+bt_latency = LatencyMonitor(BT_EVENT) if BT_LATENCY else None
+
+# 回调中不允许阻塞,队列满时丢弃新事件,保证已收到的数据按顺序处理
+msg_queue = EventRing(30, DROP_NEWEST, stamp=BT_LATENCY)
+
+# 数据面:bt.sppSend 在单独的一个工作线程中按提交顺序执行,事件处理线程只负责提交,不会被发送阻塞;
+# 只有发送失败时才投递完成事件;待发送的任务已满时返回失败,数据留在发送缓冲区中,
+# 等工作线程把积压的任务执行完后,在 spp_send_drained 中再发送
+
+
+def spp_send_drained(status, retval):
+    spp_stream.flush()
+    spp_sessions.pump()
+
+spp_data_executor = Executor(msg_queue.post, 1, 32, notify_ok=False, on_drain=spp_send_drained)
+
+
+def spp_send_done(status, retval):
+    if status != 0 or retval != 0:
+        log.error('send data faied, {}', retval)
+
+def spp_async_send(data):
+    if spp_data_executor.submit(bt.sppSend, (data,), spp_send_done) < 0:
+        return -1
+    return 0
+
+
+# 发送缓冲区能放下一个最大帧,帧格式下回复帧整帧写入,不会只发出半帧
+spp_stream = SppStream(send=spp_async_send, tx_size=FRAME_MAX_LEN)
+
+# 置为 True 时收发的数据按 bt_spp_frame 中定义的帧格式处理,手机端需要使用相同的帧格式
+SPP_FRAMED = False
+SPP_FRAME_ECHO = 0x01
+SPP_FRAME_RESP_FLAG = 0x80
+spp_frame_parser = FrameParser()
+spp_frame_writer = FrameWriter(spp_stream)
+
+# 置为 True 时作为服务端接受多个手机的 SPP 连接:启动后不搜索也不主动连接,某个手机断开后BT继续运行;此模式下不使用帧格式
+# 当前固件的接收事件不带对端地址、bt.sppSend 没有地址参数,只有一个手机连接时才能收发数据,
+# 同时连接多个手机时收到的数据无法确定来源,记录警告后丢弃(见 bt_spp_session)
+SPP_MULTI_PEER = False
+SPP_REPLY = 'I have received the data you sent.'
+spp_sessions = SppSessionManager(4, send=lambda addr, data: spp_async_send(data))
+
+
+def spp_reconnect_give_up(addr):
+    bt.stop()
+
+# 置为 True 时连接断开后自动重连,不再停止BT;默认关闭,手机端APP中点击断开连接即可结束例程
+SPP_AUTO_RECONNECT = False
+spp_reconnect = ReconnectScheduler(bt.sppConnect, msg_queue.post, give_up=spp_reconnect_give_up, log=log)
+
+# 设置为文件路径(如 '/usr/bt_spp.trace')后,记录回调收到的所有事件,可以用 bt_trace.replay 离线回放
+BT_TRACE_FILE = None
+bt_trace = TraceRecorder(BT_TRACE_FILE) if BT_TRACE_FILE else None
+
+# bt.start() 之后等待 BT_START_STATUS_IND,并记录启动各阶段的耗时
+bt_ready = BtReady()
+bt_boot = None
+
+# 名称和可见模式(3:可以被发现并且可以被连接),只设置与缓存值不同的项,verify 置为 True 时设置后读回确认
+spp_adapter = AdapterConfig(BT_NAME, 3, verify=False, log=log)
 
 
 def bt_callback(args):
     global msg_queue
-    msg_queue.put(args)
+    if bt_trace is not None:
+        bt_trace.record(args)
+    msg_queue.put_nowait(args)
+
 
+def bt_start_status_ind(msg):
+    log.event(msg[0], 'status: {}', msg[1])
+    bt_ready.resolve(msg[1])
+    if bt_boot is not None:
+        bt_boot.mark('start')
+    if msg[1] != 0:
+        log.error('BT start failed.')
+        bt.stop()
+        return EVENT_CONTINUE
+
+    log.info('BT start successfully.')
+    bt_lifecycle.set_state(LIFECYCLE_STATE.RUNNING)
+
+    if spp_adapter.apply(('name',)) != 0:
+        bt.stop()
+        return EVENT_CONTINUE
+    if bt_boot is not None:
+        bt_boot.mark('name')
+
+    if spp_adapter.apply(('visible_mode',)) != 0:
+        bt.stop()
+        return EVENT_CONTINUE
+    if bt_boot is not None:
+        bt_boot.mark('visibility')
+        bt_boot.report(log.info)
+
+    if SPP_MULTI_PEER:
+        log.info('Waiting for SPP peers to connect.')
+        return EVENT_CONTINUE
+
+    SPP_CONNECT_INFO['start'] = utime.ticks_ms()
+    if spp_connect_cached():
+        return EVENT_CONTINUE
+
+    retval = bt.startInquiry(15)
+    if retval != 0:
+        log.error('Inquiry error.')
+        bt.stop()
+    return EVENT_CONTINUE
+
+def spp_connect_cached():
+    cached = dev_cache.find(DST_DEVICE_NAMES)
+    if cached is None:
+        return False
+    addr = cached[0]
+    DST_DEVICE_INFO['dev_name'] = cached[1]['name']
+    log.info('Try to connect to the cached device {}, addr {}, last rssi {}', DST_DEVICE_INFO['dev_name'], addr_to_mac(addr), cached[1]['rssi'])
+    SPP_CONNECT_INFO['mode'] = 'warm'
+    DST_DEVICE_INFO['bt_addr'] = addr
+    retval = bt.sppConnect(addr)
+    if retval != 0:
+        log.warn('Failed to connect to the cached device, start inquiry.')
+        SPP_CONNECT_INFO['mode'] = 'cold'
+        DST_DEVICE_INFO['bt_addr'] = None
+        return False
+    return True
+
+def bt_stop_status_ind(msg):
+    log.event(msg[0], 'status: {}', msg[1])
+    if msg[1] == 0:
+        bt_lifecycle.set_state(LIFECYCLE_STATE.STOPPING)
+        log.info('BT stop successfully.')
+    else:
+        log.error('BT stop failed.')
+    spp_adapter.invalidate()
+
+    retval = bt.sppRelease()
+    if retval == 0:
+        log.info('SPP release successfully.')
+    else:
+        log.error('SPP release failed.')
+    retval = bt.release()
+    if retval == 0:
+        log.info('BT release successfully.')
+    else:
+        log.error('BT release failed.')
+    return EVENT_EXIT
+
+def bt_spp_inquiry_ind(msg):
+    if msg[1] != 0:
+        log.error('BT inquiry failed.')
+        bt.stop()
+        return EVENT_CONTINUE
+
+    rssi = msg[2]
+    name = msg[4]
+    addr = msg[5]
+    if inquiry_table.update(name, addr, rssi):
+        # 同一设备重复上报时不再打印
+        log.event(msg[0], 'name: {}, addr: {}, rssi: {}', name, addr_to_mac(addr), rssi)
+
+    if DST_DEVICE_INFO['bt_addr'] is None and inquiry_table.stable():
+        spp_select_target()
+        retval = bt.cancelInquiry()
+        if retval != 0:
+            log.error('cancel inquiry failed.')
+    return EVENT_CONTINUE
+
+def spp_select_target():
+    name, addr, rssi = inquiry_table.best()
+    log.info('The target device is found, device name {}, rssi {}', name, rssi)
+    DST_DEVICE_INFO['dev_name'] = name
+    DST_DEVICE_INFO['bt_addr'] = addr
+    dev_cache.update(name, addr, rssi)
+
+def bt_spp_inquiry_end_ind(msg):
+    log.event(msg[0], 'status: {}', msg[1])
+    if msg[1] != 0:
+        log.error('Inquiry end failed.')
+        bt.stop()
+        return EVENT_CONTINUE
+
+    log.info('BT inquiry has ended.')
+    inquiry_sta = msg[2]
+    if inquiry_sta == 0:
+        if DST_DEVICE_INFO['bt_addr'] is None and inquiry_table.best() is not None:
+            # 搜索窗口结束时最佳候选还没有稳定,直接使用当前最好的目标设备
+            spp_select_target()
+        if DST_DEVICE_INFO['bt_addr'] is not None:
+            log.info('Ready to connect to the target device : {}', DST_DEVICE_INFO['dev_name'])
+            retval = bt.sppConnect(DST_DEVICE_INFO['bt_addr'])
+            if retval != 0:
+                log.error('SPP connect failed.')
+                bt.stop()
+        else:
+            log.info('Not found device {}, continue to inquiry.', DST_DEVICE_NAMES)
+            inquiry_table.reset()
+            bt.cancelInquiry()
+            bt.startInquiry(15)
+    return EVENT_CONTINUE
+
+def bt_spp_recv_data_ind(msg):
+    if msg[1] != 0:
+        log.error('Recv data failed.')
+        bt.stop()
+        return EVENT_CONTINUE
+
+    datalen = msg[2]
+    if SPP_MULTI_PEER:
+        return spp_session_recv(msg)
+
+    if SPP_FRAMED:
+        # 收到的数据可能只是一帧的一部分,完整的帧由 spp_frame_parser 分发给对应的处理函数
+        spp_frame_parser.feed(msg[3])
+        retval = spp_stream.flush()
+        if retval != 0:
+            log.error('send data faied.')
+        return EVENT_CONTINUE
+
+    spp_stream.feed(msg[3])
+    data = spp_stream.read()
+    log.event(msg[0], 'recv {} bytes data: {}', datalen, data)
+    log.debug('send data: {}', SPP_REPLY)
+    # 回复先写入发送缓冲区,攒满 MTU 或 flush 时才调用 bt.sppSend
+    spp_stream.write(SPP_REPLY)
+    retval = spp_stream.flush()
+    if retval != 0:
+        log.error('send data faied.')
+    return EVENT_CONTINUE
+
+def spp_session_recv(msg):
+    # 事件中带有对端地址(msg[4])时按地址区分连接;当前固件不带地址,只有一个连接时归属于该连接
+    session = spp_sessions.feed(msg[3], msg[4] if len(msg) > 4 else None)
+    if session is None:
+        log.warn('Recv {} bytes data, cannot tell which of {} peers sent it.', msg[2], len(spp_sessions))
+        return EVENT_CONTINUE
+    data = session.rx.read()
+    log.event(msg[0], 'recv {} bytes data from {}: {}', msg[2], session.mac, data)
+    session.write(SPP_REPLY)
+    spp_sessions.pump()
+    return EVENT_CONTINUE
+
+def bt_spp_connect_ind(msg):
+    log.event(msg[0], 'status: {}', msg[1])
+    if msg[1] != 0 and SPP_MULTI_PEER:
+        log.error('Connect failed.')
+        return EVENT_CONTINUE
+    if msg[1] != 0:
+        if DST_DEVICE_INFO['bt_addr'] is not None and spp_reconnect.pending(DST_DEVICE_INFO['bt_addr']):
+            log.error('Reconnect failed.')
+            spp_reconnect.on_failed(DST_DEVICE_INFO['bt_addr'])
+            return EVENT_CONTINUE
+        if SPP_CONNECT_INFO['mode'] == 'warm':
+            # 缓存中的设备可能不在附近,从缓存中删除后回退到搜索流程,搜索到后连接成功时会重新加入缓存
+            log.warn('Connect to the cached device failed, start inquiry.')
+            dev_cache.remove(DST_DEVICE_INFO['bt_addr'])
+            dev_cache.save()
+            SPP_CONNECT_INFO['mode'] = 'cold'
+            DST_DEVICE_INFO['bt_addr'] = None
+            if bt.startInquiry(15) == 0:
+                return EVENT_CONTINUE
+            log.error('Inquiry error.')
+        log.error('Connect failed.')
+        bt.stop()
+        return EVENT_CONTINUE
+
+    conn_sta = msg[2]
+    addr = msg[3]
+    mac = addr_to_mac(addr)
+    log.info('SPP connect successful, conn_sta = {}, addr {}', conn_sta, mac)
+    if SPP_MULTI_PEER:
+        if spp_sessions.connect(addr) is None:
+            log.warn('Too many SPP peers, ignore {}.', mac)
+        else:
+            log.info('SPP peers: {}', len(spp_sessions))
+        return EVENT_CONTINUE
+    if spp_reconnect.pending(addr):
+        spp_reconnect.on_connected(addr)
+        return EVENT_CONTINUE
+    connect_ms = utime.ticks_diff(utime.ticks_ms(), SPP_CONNECT_INFO['start'])
+    log.info('SPP {} connect takes {} ms.', SPP_CONNECT_INFO['mode'], connect_ms)
+    dev_cache.update(DST_DEVICE_INFO['dev_name'], addr, connect_ms=connect_ms)
+    dev_cache.save()
+    return EVENT_CONTINUE
+
+def bt_spp_disconnect_ind(msg):
+    conn_sta = msg[2]
+    addr = msg[3]
+    mac = addr_to_mac(addr)
+    log.event(msg[0], 'SPP disconnect successful, conn_sta = {}, addr {}', conn_sta, mac)
+    if SPP_MULTI_PEER:
+        log.info('SPP peers: {}', spp_sessions.disconnect(addr))
+        return EVENT_CONTINUE
+    if SPP_AUTO_RECONNECT:
+        spp_reconnect.on_disconnect(addr)
+        return EVENT_CONTINUE
+    bt.stop()
+    return EVENT_CONTINUE
+
+def spp_reconnect_event(msg):
+    spp_reconnect.on_event(msg)
+    return EVENT_CONTINUE
+
+def spp_executor_event(msg):
+    spp_data_executor.on_event(msg)
+    return EVENT_CONTINUE
+
+def spp_echo_frame(frame_type, payload):
+    log.debug('recv frame, type: {}, {} bytes', frame_type, len(payload))
+    # 回复帧只写入发送缓冲区,本次接收事件处理完后统一发送
+    retval = spp_frame_writer.write(frame_type | SPP_FRAME_RESP_FLAG, payload)
+    if retval != 0:
+        log.warn('reply frame dropped, type: {}, {} bytes, error: {}', frame_type, len(payload), retval)
+
+def spp_dispatcher_init():
+    dispatcher = EventDispatcher(BT_EVENT)
+    dispatcher.on('BT_START_STATUS_IND', bt_start_status_ind)
+    dispatcher.on('BT_STOP_STATUS_IND', bt_stop_status_ind)
+    dispatcher.on('BT_SPP_INQUIRY_IND', bt_spp_inquiry_ind)
+    dispatcher.on('BT_SPP_INQUIRY_END_IND', bt_spp_inquiry_end_ind)
+    dispatcher.on('BT_SPP_RECV_DATA_IND', bt_spp_recv_data_ind)
+    dispatcher.on('BT_SPP_CONNECT_IND', bt_spp_connect_ind)
+    dispatcher.on('BT_SPP_DISCONNECT_IND', bt_spp_disconnect_ind)
+    dispatcher.register(RECONNECT_EVENT, spp_reconnect_event)
+    dispatcher.register(EXECUTOR_DONE_EVENT, spp_executor_event)
+    spp_frame_parser.register(SPP_FRAME_ECHO, spp_echo_frame)
+    return dispatcher
 
 def bt_event_proc_task():
     global msg_queue
-    global BT_IS_RUN
-    global DST_DEVICE_INFO
 
+    # 事件处理表在启动时构建一次,每个事件只需一次查表
+    dispatcher = spp_dispatcher_init()
+    dispatcher.set_latency(bt_latency)
     while True:
-        print('wait msg...')
+        log.debug('wait msg...')
         msg = msg_queue.get()  # 没有消息时会阻塞在这
-        event_id = msg[0]
-        status = msg[1]
-
-        if event_id == BT_EVENT['BT_START_STATUS_IND']:
-            print('event: BT_START_STATUS_IND')
-            if status == 0:
-                print('BT start successfully.')
-                BT_IS_RUN = 1
-
-                print('Set BT name to {}'.format(BT_NAME))
-                retval = bt.setLocalName(0, BT_NAME)
-                if retval != -1:
-                    print('BT name set successfully.')
-                else:
-                    print('BT name set failed.')
-                    bt.stop()
-                    continue
-
-                retval = bt.setVisibleMode(3)
-                if retval == 0:
-                    mode = bt.getVisibleMode()
-                    if mode == 3:
-                        print('BT visible mode set successfully.')
-                    else:
-                        print('BT visible mode set failed.')
-                        bt.stop()
-                        continue
-                else:
-                    print('BT visible mode set failed.')
-                    bt.stop()
-                    continue
-
-                retval = bt.startInquiry(15)
-                if retval != 0:
-                    print('Inquiry error.')
-                    bt.stop()
-                    continue
-            else:
-                print('BT start failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_STOP_STATUS_IND']:
-            print('event: BT_STOP_STATUS_IND')
-            if status == 0:
-                BT_IS_RUN = 0
-                print('BT stop successfully.')
-            else:
-                print('BT stop failed.')
-
-            retval = bt.sppRelease()
-            if retval == 0:
-                print('SPP release successfully.')
-            else:
-                print('SPP release failed.')
-            retval = bt.release()
-            if retval == 0:
-                print('BT release successfully.')
-            else:
-                print('BT release failed.')
+        if dispatcher.dispatch(msg, msg_queue.last_stamp) == EVENT_EXIT:
             break
-        elif event_id == BT_EVENT['BT_SPP_INQUIRY_IND']:
-            print('event: BT_SPP_INQUIRY_IND')
-            if status == 0:
-                rssi = msg[2]
-                name = msg[4]
-                addr = msg[5]
-                mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-                print('name: {}, addr: {}, rssi: {}'.format(name, mac, rssi))
-
-                if name == DST_DEVICE_INFO['dev_name']:
-                    print('The target device is found, device name {}'.format(name))
-                    DST_DEVICE_INFO['bt_addr'] = addr
-                    retval = bt.cancelInquiry()
-                    if retval != 0:
-                        print('cancel inquiry failed.')
-                        continue
-            else:
-                print('BT inquiry failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_SPP_INQUIRY_END_IND']:
-            print('event: BT_SPP_INQUIRY_END_IND')
-            if status == 0:
-                print('BT inquiry has ended.')
-                inquiry_sta = msg[2]
-                if inquiry_sta == 0:
-                    if DST_DEVICE_INFO['bt_addr'] is not None:
-                        print('Ready to connect to the target device : {}'.format(DST_DEVICE_INFO['dev_name']))
-                        retval = bt.sppConnect(DST_DEVICE_INFO['bt_addr'])
-                        if retval != 0:
-                            print('SPP connect failed.')
-                            bt.stop()
-                            continue
-                    else:
-                        print('Not found device [{}], continue to inquiry.'.format(DST_DEVICE_INFO['dev_name']))
-                        bt.cancelInquiry()
-                        bt.startInquiry(15)
-            else:
-                print('Inquiry end failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_SPP_RECV_DATA_IND']:
-            print('event: BT_SPP_RECV_DATA_IND')
-            if status == 0:
-                datalen = msg[2]
-                data = msg[3]
-                print('recv {} bytes data: {}'.format(datalen, data))
-                send_data = 'I have received the data you sent.'
-                print('send data: {}'.format(send_data))
-                retval = bt.sppSend(send_data)
-                if retval != 0:
-                    print('send data faied.')
-            else:
-                print('Recv data failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_SPP_CONNECT_IND']:
-            print('event: BT_SPP_CONNECT_IND')
-            if status == 0:
-                conn_sta = msg[2]
-                addr = msg[3]
-                mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-                print('SPP connect successful, conn_sta = {}, addr {}'.format(conn_sta, mac))
-            else:
-                print('Connect failed.')
-                bt.stop()
-                continue
-        elif event_id == BT_EVENT['BT_SPP_DISCONNECT_IND']:
-            print('event: BT_SPP_DISCONNECT_IND')
-            conn_sta = msg[2]
-            addr = msg[3]
-            mac = '{:02x}:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(addr[5], addr[4], addr[3], addr[2], addr[1], addr[0])
-            print('SPP disconnect successful, conn_sta = {}, addr {}'.format(conn_sta, mac))
-            bt.stop()
-            continue
+        if bt_trace is not None:
+            bt_trace.flush(True)
+    log.info('event queue stats: {}', msg_queue.stats())
+    if bt_trace is not None:
+        bt_trace.close()
+    log.info('spp stream stats: {}', spp_stream.stats())
+    log.info('spp send executor stats: {}', spp_data_executor.stats())
+    if SPP_MULTI_PEER:
+        log.info('spp session stats: {}', spp_sessions.stats())
+    spp_reconnect.cancel()
+    log.info('reconnect stats: {}', spp_reconnect.stats())
+    if bt_latency is not None:
+        bt_latency.report(log.info)
+    log.drain()
+    bt_lifecycle.set_state(LIFECYCLE_STATE.RELEASED)
 
 
 def main():
-    global BT_IS_RUN
+    global bt_boot
 
+    log.start()
+    spp_data_executor.start()
     _thread.start_new_thread(bt_event_proc_task, ())
+    bt_boot = BootProfile('SPP')
     retval = bt.init(bt_callback)
     if retval == 0:
         print('BT init successful.')
     else:
         print('BT init failed.')
         return -1
+    bt_boot.mark('init')
     retval = bt.sppInit()
     if retval == 0:
         print('SPP init successful.')
     else:
         print('SPP init failed.')
         return -1
+    bt_boot.mark('profile init')
     retval = bt.start()
     if retval == 0:
         print('BT start successful.')
@@ -213,21 +464,16 @@ def main():
         else:
             print('SPP release failed.')
         return -1
+    # 名称和可见模式在 BT_START_STATUS_IND 的处理函数中设置,这里只处理协议栈没有上报启动结果的情况
+    if bt_ready.wait() is None:
+        print('BT start timeout.')
+        abort_start(bt_lifecycle, msg_queue.post, BT_EVENT['BT_STOP_STATUS_IND'])
+        log.drain()
+        return -1
 
-    count = 0
-    while True:
-        utime.sleep(1)
-        count += 1
-        cur_time = utime.localtime()
-        timestamp = "{:02d}:{:02d}:{:02d}".format(cur_time[3], cur_time[4], cur_time[5])
-
-        if count % 5 == 0:
-            if BT_IS_RUN == 1:
-                print('[{}] BT SPP is running, count = {}......'.format(timestamp, count))
-                print('')
-            else:
-                print('BT SPP has stopped running, ready to exit.')
-                break
+    bt_lifecycle.run()
+    log.drain()
+    print('BT SPP has stopped running, ready to exit.')
 
 
 if __name__ == '__main__':
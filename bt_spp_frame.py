@@ -0,0 +1,171 @@
+#BT SPP 帧协议公共模块
+
+"""
+说明:在 SPP 数据流上提供带长度、类型和 CRC 校验的帧协议
+帧格式: SOF(1字节,0xA5) + 长度(2字节,大端,仅负载长度) + 类型(1字节) + 负载 + CRC16(2字节,大端)
+CRC16 采用 CCITT-FALSE(初值0xFFFF,多项式0x1021),校验范围为长度、类型和负载
+FrameParser 在预先分配的接收缓冲区中原地解析,负载以 memoryview 切片的形式交给处理函数,不做拷贝,
+因此处理函数返回后该切片即失效,需要保留的数据请自行拷贝;
+一帧数据分多次 BT_SPP_RECV_DATA_IND 上报时,未收完的部分留在缓冲区中等待后续数据
+FrameWriter 把帧写入 SppStream,由 SppStream 按 MTU 合并发送;每一帧要么整帧写入发送缓冲区,要么不写入并返回错误,
+发送缓冲区中不会出现半帧数据。帧长超过一个 MTU 时,SppStream 的 tx_size 需要不小于 FRAME_MAX_LEN
+"""
+
+FRAME_SOF = 0xA5
+FRAME_HEAD_LEN = 4
+FRAME_CRC_LEN = 2
+FRAME_MAX_PAYLOAD = 1024
+FRAME_MAX_LEN = FRAME_HEAD_LEN + FRAME_MAX_PAYLOAD + FRAME_CRC_LEN
+
+# FrameWriter.write 的错误码,发送失败时返回发送函数的返回值
+FRAME_ERR_TOO_LONG = -2
+
+
+def _crc16_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xffff
+            else:
+                crc = (crc << 1) & 0xffff
+        table.append(crc)
+    return table
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16(data, crc=0xffff):
+    table = _CRC16_TABLE
+    for b in data:
+        crc = ((crc << 8) & 0xffff) ^ table[(crc >> 8) ^ b]
+    return crc
+
+
+class FrameParser(object):
+    def __init__(self, max_payload=FRAME_MAX_PAYLOAD):
+        self._max = max_payload
+        self._buf = bytearray(FRAME_HEAD_LEN + max_payload + FRAME_CRC_LEN)
+        self._mv = memoryview(self._buf)
+        self._len = 0
+        self._handlers = {}
+        self._default = None
+
+        self.frames = 0
+        self.crc_errors = 0
+        self.dropped_bytes = 0
+
+    def register(self, frame_type, handler):
+        # handler(frame_type, payload),payload 为 memoryview,只在处理函数内有效
+        self._handlers[frame_type] = handler
+
+    def set_default(self, handler):
+        self._default = handler
+
+    def feed(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        src = memoryview(data)
+        total = len(src)
+        size = len(self._buf)
+        offset = 0
+        while offset < total:
+            n = min(total - offset, size - self._len)
+            self._mv[self._len:self._len + n] = src[offset:offset + n]
+            self._len += n
+            offset += n
+            self._parse()
+
+    def _parse(self):
+        buf = self._buf
+        mv = self._mv
+        end = self._len
+        start = 0
+        while end - start >= FRAME_HEAD_LEN:
+            if buf[start] != FRAME_SOF:
+                start += 1
+                self.dropped_bytes += 1
+                continue
+            length = (buf[start + 1] << 8) | buf[start + 2]
+            if length > self._max:
+                start += 1
+                self.dropped_bytes += 1
+                continue
+            crc_pos = start + FRAME_HEAD_LEN + length
+            if end < crc_pos + FRAME_CRC_LEN:
+                break
+            if crc16(mv[start + 1:crc_pos]) != ((buf[crc_pos] << 8) | buf[crc_pos + 1]):
+                # 校验失败,从下一个字节开始重新寻找帧头
+                self.crc_errors += 1
+                start += 1
+                self.dropped_bytes += 1
+                continue
+            self.frames += 1
+            self._dispatch(buf[start + 3], mv[start + FRAME_HEAD_LEN:crc_pos])
+            start = crc_pos + FRAME_CRC_LEN
+        if start:
+            # 只把未解析完的残余数据移到缓冲区头部
+            remain = end - start
+            mv[:remain] = mv[start:end]
+            self._len = remain
+
+    def _dispatch(self, frame_type, payload):
+        handler = self._handlers.get(frame_type, self._default)
+        if handler is not None:
+            handler(frame_type, payload)
+
+    def reset(self):
+        self._len = 0
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'crc_errors': self.crc_errors,
+            'dropped_bytes': self.dropped_bytes,
+            'pending': self._len,
+        }
+
+
+class FrameWriter(object):
+    def __init__(self, stream):
+        self._stream = stream
+        self._head = bytearray(FRAME_HEAD_LEN)
+        self._tail = bytearray(FRAME_CRC_LEN)
+        self._head[0] = FRAME_SOF
+        self.rejected = 0
+
+    def write(self, frame_type, payload=b''):
+        # 只写入 SppStream 的发送缓冲区,调用 flush 后才真正发送;返回 0 表示整帧已写入
+        # 缓冲区剩余空间放不下整帧时先发送已有数据腾出空间,发送失败时不写入,返回发送函数的返回值;
+        # 整帧超过发送缓冲区容量时返回 FRAME_ERR_TOO_LONG
+        if isinstance(payload, str):
+            payload = payload.encode()
+        length = len(payload)
+        stream = self._stream
+        size = FRAME_HEAD_LEN + length + FRAME_CRC_LEN
+        if length > 0xffff or size > stream.tx_capacity():
+            self.rejected += 1
+            return FRAME_ERR_TOO_LONG
+        if size > stream.tx_space():
+            retval = stream.make_room(size)
+            if retval != 0:
+                self.rejected += 1
+                return retval
+        head = self._head
+        head[1] = (length >> 8) & 0xff
+        head[2] = length & 0xff
+        head[3] = frame_type
+        crc = crc16(payload, crc16(memoryview(head)[1:]))
+        self._tail[0] = crc >> 8
+        self._tail[1] = crc & 0xff
+        stream.write(head)
+        stream.write(payload)
+        stream.write(self._tail)
+        return 0
+
+    def send(self, frame_type, payload=b''):
+        retval = self.write(frame_type, payload)
+        if retval != 0:
+            return retval
+        return self._stream.flush()
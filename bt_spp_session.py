@@ -0,0 +1,182 @@
+#BT SPP 多连接会话公共模块
+
+"""
+说明:按对端地址管理多个 SPP 连接,每个连接有独立的接收缓冲区和发送缓冲区(均为 SppStream)
+连接:BT_SPP_CONNECT_IND/BT_SPP_DISCONNECT_IND 带有对端地址,connect/disconnect 按地址增删连接,
+     某个对端断开只删除该连接,不影响其他连接,也不需要停止BT
+接收:feed 把 BT_SPP_RECV_DATA_IND 的数据写入对应连接的接收缓冲区,事件中需要带有对端地址
+发送:write 只把数据写入该连接的发送缓冲区,pump 按轮询顺序每个连接每轮最多发送一个 MTU,
+     一个连接积压大量数据时不会占满链路,其他连接的回复不会被饿死
+注意:当前固件的 BT_SPP_RECV_DATA_IND 不带对端地址,bt.sppSend 也没有地址参数,实际上只有一条 SPP 数据通道:
+  收到的数据无法区分来自哪个连接,只有一个连接时才归属于该连接,有多个连接时 feed 返回 None 并计入 unrouted;
+  默认的 send(addr, data) 调用 bt.sppSend(data),忽略地址,各连接的数据都从同一通道发出,按连接轮询只在
+  固件提供带地址的接收事件和发送接口(通过 send 参数传入)时才有意义
+"""
+import bt
+from bt_addr import addr_to_mac, addr_key, addr_bytes
+from bt_spp_stream import SppStream, SPP_MTU, SPP_RX_SIZE
+
+SPP_MAX_PEERS = 4
+SPP_TX_SIZE = 2048
+
+
+def _default_send(addr, data):
+    return bt.sppSend(data)
+
+
+class SppSession(object):
+    def __init__(self, addr, rx_size, tx_size):
+        self.addr = addr
+        self.mac = addr_to_mac(addr)
+        self.rx = SppStream(rx_size)
+        # 发送缓冲区只作为字节队列使用,由 SppSessionManager.pump 按 MTU 取出发送
+        self.tx = SppStream(tx_size)
+        self._retry = None  # 上一次发送失败的数据块,下次优先重发
+        self.tx_bytes = 0
+        self.send_calls = 0
+
+    def write(self, data):
+        # 返回写入发送缓冲区的字节数,缓冲区满时超出部分被丢弃
+        return self.tx.feed(data)
+
+    def tx_pending(self):
+        return self._retry is not None or self.tx.any() > 0
+
+    def stats(self):
+        return {
+            'rx_bytes': self.rx.rx_bytes,
+            'rx_overflow': self.rx.rx_overflow,
+            'tx_bytes': self.tx_bytes,
+            'tx_overflow': self.tx.rx_overflow,
+            'tx_pending': self.tx.any(),
+            'send_calls': self.send_calls,
+        }
+
+
+class SppSessionManager(object):
+    def __init__(self, max_peers=SPP_MAX_PEERS, rx_size=SPP_RX_SIZE, tx_size=SPP_TX_SIZE, mtu=SPP_MTU, send=None):
+        self._max = max_peers
+        self._rx_size = rx_size
+        self._tx_size = tx_size
+        self._chunk = bytearray(mtu)
+        self._chunk_mv = memoryview(self._chunk)
+        self._send = send if send is not None else _default_send
+        self._sessions = {}  # 整数地址 -> SppSession
+        self._order = []  # 轮询发送的顺序
+        self._next = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.rejected = 0
+        self.send_failed = 0
+        self.unrouted = 0
+
+    def _key(self, addr):
+        return addr_key(addr)
+
+    def connect(self, addr):
+        # 返回该连接的会话,连接数已达上限时返回 None
+        key = self._key(addr)
+        session = self._sessions.get(key)
+        if session is None:
+            if len(self._sessions) >= self._max:
+                self.rejected += 1
+                return None
+            session = SppSession(addr_bytes(addr), self._rx_size, self._tx_size)
+            self._sessions[key] = session
+            self._order.append(key)
+            self.connects += 1
+        return session
+
+    def disconnect(self, addr):
+        # 返回剩余的连接数
+        key = self._key(addr)
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            index = self._order.index(key)
+            self._order.pop(index)
+            if index < self._next:
+                self._next -= 1
+            if self._next >= len(self._order):
+                self._next = 0
+            self.disconnects += 1
+        return len(self._sessions)
+
+    def session(self, addr):
+        return self._sessions.get(self._key(addr))
+
+    def sessions(self):
+        return self._sessions.values()
+
+    def feed(self, data, addr=None):
+        # 返回收到数据的会话,找不到对应的连接时返回 None
+        # addr 为 None(当前固件)时只有一个连接才能确定归属,不按最近活动的连接猜测
+        if addr is None:
+            session = self._sessions[self._order[0]] if len(self._order) == 1 else None
+        else:
+            session = self._sessions.get(self._key(addr))
+        if session is None:
+            self.unrouted += 1
+            return None
+        session.rx.feed(data)
+        return session
+
+    def write(self, addr, data):
+        session = self._sessions.get(self._key(addr))
+        if session is None:
+            return 0
+        return session.write(data)
+
+    def _send_one(self, session):
+        # 发送一个数据块,返回 bt 接口的返回值
+        data = session._retry
+        if data is None:
+            n = session.tx.readinto(self._chunk)
+            data = bytes(self._chunk_mv[:n])
+        retval = self._send(session.addr, data)
+        session.send_calls += 1
+        if retval == 0:
+            session._retry = None
+            session.tx_bytes += len(data)
+        else:
+            session._retry = data
+            self.send_failed += 1
+        return retval
+
+    def pump(self, max_chunks=-1):
+        # 轮询各连接,每个连接每轮最多发送一个 MTU;返回发送成功的数据块数
+        # max_chunks 限制本次最多发送的块数,小于 0 表示发送到所有缓冲区为空或全部发送失败
+        sent = 0
+        order = self._order
+        while order:
+            progress = False
+            for _ in range(len(order)):
+                if 0 <= max_chunks <= sent:
+                    return sent
+                if self._next >= len(order):
+                    self._next = 0
+                session = self._sessions[order[self._next]]
+                self._next += 1
+                if not session.tx_pending():
+                    continue
+                if self._send_one(session) == 0:
+                    sent += 1
+                    progress = True
+            if not progress:
+                break
+        return sent
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        stats = {
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'rejected': self.rejected,
+            'send_failed': self.send_failed,
+            'unrouted': self.unrouted,
+            'peers': {},
+        }
+        for session in self._sessions.values():
+            stats['peers'][session.mac] = session.stats()
+        return stats
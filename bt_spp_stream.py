@@ -0,0 +1,158 @@
+#BT SPP 数据流公共模块
+
+"""
+说明:把 SPP 的收发封装成类似串口的数据流接口
+接收方向:BT_SPP_RECV_DATA_IND 事件中把收到的数据 feed 到预先分配好的接收环形缓冲区,
+业务代码再通过 read/readinto/readline 按需读取,不必逐包处理
+发送方向:write 只把数据拷贝到发送缓冲区,缓冲区攒满一个 MTU 时才调用一次 bt.sppSend,
+剩余不足一个 MTU 的数据在 flush 时发送,避免每个小数据包都调用一次 bt.sppSend;
+发送缓冲区默认为一个 MTU,tx_size 更大时缓冲区写满或 flush 时按 MTU 分块发送,
+某一块发送失败时未发送的数据留在缓冲区中,下次 flush 时重发
+"""
+import bt
+
+SPP_MTU = 512
+SPP_RX_SIZE = 2048
+
+_NEWLINE = 10
+
+
+class SppStream(object):
+    def __init__(self, rx_size=SPP_RX_SIZE, mtu=SPP_MTU, send=None, tx_size=0):
+        self._rx = bytearray(rx_size)
+        self._rx_mv = memoryview(self._rx)
+        self._head = 0
+        self._count = 0
+        self._scanned = 0  # 已确认不含换行符的字节数,readline 不重复扫描
+        self._mtu = mtu
+        self._tx = bytearray(max(mtu, tx_size))
+        self._tx_mv = memoryview(self._tx)
+        self._tx_len = 0
+        self._send = send if send is not None else bt.sppSend
+
+        self.rx_bytes = 0
+        self.rx_overflow = 0
+        self.tx_bytes = 0
+        self.send_calls = 0
+
+    def any(self):
+        return self._count
+
+    def feed(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        src = memoryview(data)
+        size = len(self._rx)
+        n = len(src)
+        space = size - self._count
+        if n > space:
+            # 接收缓冲区已满,丢弃超出部分
+            self.rx_overflow += n - space
+            n = space
+        tail = (self._head + self._count) % size
+        first = min(n, size - tail)
+        self._rx_mv[tail:tail + first] = src[:first]
+        if n > first:
+            self._rx_mv[:n - first] = src[first:n]
+        self._count += n
+        self.rx_bytes += n
+        return n
+
+    def readinto(self, buf, nbytes=-1):
+        dst = memoryview(buf)
+        n = len(dst)
+        if 0 <= nbytes < n:
+            n = nbytes
+        if n > self._count:
+            n = self._count
+        size = len(self._rx)
+        head = self._head
+        first = min(n, size - head)
+        dst[:first] = self._rx_mv[head:head + first]
+        if n > first:
+            dst[first:n] = self._rx_mv[:n - first]
+        self._head = (head + n) % size
+        self._count -= n
+        self._scanned = max(0, self._scanned - n)
+        return n
+
+    def read(self, nbytes=-1):
+        if nbytes < 0 or nbytes > self._count:
+            nbytes = self._count
+        buf = bytearray(nbytes)
+        self.readinto(buf)
+        return bytes(buf)
+
+    def _find_newline(self):
+        rx = self._rx
+        size = len(rx)
+        head = self._head
+        for i in range(self._scanned, self._count):
+            if rx[(head + i) % size] == _NEWLINE:
+                return i
+        self._scanned = self._count
+        return -1
+
+    def readline(self):
+        index = self._find_newline()
+        if index >= 0:
+            return self.read(index + 1)
+        if self._count == len(self._rx):
+            # 缓冲区已满仍没有换行符,整体作为一行返回,避免接收停滞
+            return self.read()
+        return b''
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        src = memoryview(data)
+        total = len(src)
+        size = len(self._tx)
+        offset = 0
+        while offset < total:
+            n = min(total - offset, size - self._tx_len)
+            self._tx_mv[self._tx_len:self._tx_len + n] = src[offset:offset + n]
+            self._tx_len += n
+            offset += n
+            # 缓冲区写满时只发送整 MTU 的块,不足一个 MTU 的部分留给后面的数据
+            if self._tx_len == size and self.flush(size % self._mtu) != 0:
+                return offset
+        return total
+
+    def tx_capacity(self):
+        return len(self._tx)
+
+    def tx_space(self):
+        # 发送缓冲区中还能写入的字节数,写入不超过该长度的数据时 write 不会在中途发送
+        return len(self._tx) - self._tx_len
+
+    def make_room(self, nbytes):
+        # 发送缓冲区头部的数据,直到剩余空间不小于 nbytes,尽量只发送整 MTU 的块;返回 0 或发送函数的返回值
+        return self.flush(len(self._tx) - nbytes)
+
+    def flush(self, keep=0):
+        # keep 为允许留在缓冲区中不发送的字节数
+        sent = 0
+        retval = 0
+        while self._tx_len - sent > keep:
+            n = min(self._tx_len - sent, self._mtu)
+            retval = self._send(bytes(self._tx_mv[sent:sent + n]))
+            self.send_calls += 1
+            if retval != 0:
+                break
+            sent += n
+        if sent:
+            # 未发送的数据移到缓冲区头部
+            remain = self._tx_len - sent
+            self._tx_mv[:remain] = self._tx_mv[sent:self._tx_len]
+            self._tx_len = remain
+            self.tx_bytes += sent
+        return retval
+
+    def stats(self):
+        return {
+            'rx_bytes': self.rx_bytes,
+            'rx_overflow': self.rx_overflow,
+            'tx_bytes': self.tx_bytes,
+            'send_calls': self.send_calls,
+        }
@@ -0,0 +1,87 @@
+#BT 线程同步公共模块
+
+"""
+说明:提供事件处理线程和主线程之间的同步原语,替代 sleep 轮询
+Signal: 一个线程调用 set 通知,另一个线程在 wait 中阻塞等待,可以指定超时时间;
+        超时由 osTimer 唤醒等待线程,等待期间不需要周期性醒来检查状态
+Future: 基于 Signal,用于等待某个只发生一次的结果(例如 BT_START_STATUS_IND 上报的启动状态)
+同一时刻只支持一个线程等待
+wake(lock) 释放用作唤醒信号的锁,可以被多个线程同时调用
+"""
+import utime
+import _thread
+import osTimer
+
+
+def wake(lock):
+    # 两个线程可能同时看到锁处于锁定状态并先后释放,后一次释放会抛出异常;
+    # 此时等待方已经被唤醒,忽略即可
+    if lock.locked():
+        try:
+            lock.release()
+        except RuntimeError:
+            pass
+
+
+class Signal(object):
+    def __init__(self):
+        self._lock = _thread.allocate_lock()
+        self._lock.acquire()
+        self._set = False
+        self._timer = None
+
+    def _wake(self, args=None):
+        # set 和超时定时器可能同时唤醒
+        wake(self._lock)
+
+    def set(self):
+        self._set = True
+        self._wake()
+
+    def clear(self):
+        self._set = False
+        # 丢弃尚未被等待方消费的唤醒
+        self._lock.acquire(0)
+
+    def is_set(self):
+        return self._set
+
+    def wait(self, timeout_ms=-1):
+        # 返回 True 表示已经 set,False 表示超时
+        if timeout_ms >= 0:
+            deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+        while not self._set:
+            if timeout_ms >= 0:
+                remain = utime.ticks_diff(deadline, utime.ticks_ms())
+                if remain <= 0:
+                    break
+                if self._timer is None:
+                    self._timer = osTimer()
+                self._timer.start(remain, 0, self._wake)
+            self._lock.acquire()
+            if self._timer is not None:
+                self._timer.stop()
+        return self._set
+
+
+class Future(object):
+    def __init__(self):
+        self._signal = Signal()
+        self._result = None
+
+    def set_result(self, result):
+        self._result = result
+        self._signal.set()
+
+    def done(self):
+        return self._signal.is_set()
+
+    def reset(self):
+        self._result = None
+        self._signal.clear()
+
+    def result(self, timeout_ms=-1):
+        # 超时返回 None
+        if not self._signal.wait(timeout_ms):
+            return None
+        return self._result
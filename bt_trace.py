@@ -0,0 +1,159 @@
+#BT 事件记录与回放公共模块
+
+"""
+说明:记录 bt_callback 收到的原始事件,并可以把记录文件回放给事件处理函数,用于复现现场问题和离线分析处理耗时
+记录:TraceRecorder.record 在回调上下文中只把(时间戳, 事件)放入环形队列,不做编码和文件操作;
+     事件处理线程调用 flush 时才编码并写入文件
+文件格式(小端):
+  文件头  b'BTTR' + 版本(1字节)
+  每条记录 距上一条记录的时间(uint32,微秒) + 字段个数(uint8) + 各字段
+  字段    类型(1字节) + 数据,类型为 0:None 1:int32 2:int64 3:bytes 4:str,
+          bytes/str 的数据为长度(uint16) + 内容
+回放:replay 按记录的时间间隔(或不等待)把事件依次交给 deliver,并统计每种事件的处理耗时
+"""
+import utime
+from bt_queue import EventRing, DROP_NEWEST
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+TRACE_MAGIC = b'BTTR'
+TRACE_VERSION = 1
+
+_T_NONE = 0
+_T_INT32 = 1
+_T_INT64 = 2
+_T_BYTES = 3
+_T_STR = 4
+
+
+def _encode_field(out, value):
+    if value is None:
+        out.append(_T_NONE)
+    elif isinstance(value, int):
+        if -0x80000000 <= value <= 0x7fffffff:
+            out.append(_T_INT32)
+            out.extend(struct.pack('<i', value))
+        else:
+            out.append(_T_INT64)
+            out.extend(struct.pack('<q', value))
+    elif isinstance(value, str):
+        data = value.encode()
+        out.append(_T_STR)
+        out.extend(struct.pack('<H', len(data)))
+        out.extend(data)
+    else:
+        data = bytes(value)
+        out.append(_T_BYTES)
+        out.extend(struct.pack('<H', len(data)))
+        out.extend(data)
+
+
+class TraceRecorder(object):
+    def __init__(self, path, capacity=64):
+        self._ring = EventRing(capacity, DROP_NEWEST)
+        self._cap = capacity
+        self._file = open(path, 'wb')
+        self._file.write(TRACE_MAGIC + bytes([TRACE_VERSION]))
+        self._last = None
+        self._out = bytearray()
+        self.records = 0
+
+    def record(self, args):
+        # 运行在回调上下文中,只入队,不阻塞
+        self._ring.put_nowait((utime.ticks_us(), args))
+
+    def wrap(self, callback):
+        def traced_callback(args):
+            self.record(args)
+            callback(args)
+        return traced_callback
+
+    def flush(self, lazy=False):
+        # lazy 为 True 时,积压不到一半容量不写文件,减少 flash 写入次数
+        if self._file is None or (lazy and self._ring.qsize() < self._cap // 2):
+            return
+        out = self._out
+        while True:
+            item = self._ring.get_nowait()
+            if item is None:
+                break
+            ticks, args = item
+            delta = 0 if self._last is None else utime.ticks_diff(ticks, self._last)
+            self._last = ticks
+            out.extend(struct.pack('<IB', max(delta, 0), len(args)))
+            for value in args:
+                _encode_field(out, value)
+            self.records += 1
+        if out:
+            self._file.write(out)
+            self._out = bytearray()
+
+    def dropped(self):
+        return self._ring.dropped()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+def read_trace(path):
+    # 逐条返回 (距上一条记录的微秒数, 事件元组)
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != TRACE_MAGIC or data[4] != TRACE_VERSION:
+        raise ValueError('not a BT trace file: {}'.format(path))
+    pos = 5
+    end = len(data)
+    while pos < end:
+        delta, count = struct.unpack_from('<IB', data, pos)
+        pos += 5
+        fields = []
+        for _ in range(count):
+            tag = data[pos]
+            pos += 1
+            if tag == _T_NONE:
+                fields.append(None)
+            elif tag == _T_INT32:
+                fields.append(struct.unpack_from('<i', data, pos)[0])
+                pos += 4
+            elif tag == _T_INT64:
+                fields.append(struct.unpack_from('<q', data, pos)[0])
+                pos += 8
+            else:
+                size = struct.unpack_from('<H', data, pos)[0]
+                pos += 2
+                value = data[pos:pos + size]
+                pos += size
+                fields.append(value.decode() if tag == _T_STR else value)
+        yield delta, tuple(fields)
+
+
+def replay(path, deliver, realtime=True):
+    # deliver 一般为 bt_callback(经过事件队列)或 dispatcher.dispatch(直接调用处理函数)
+    # 返回 {事件ID: [次数, 总耗时us, 最大耗时us]}
+    profile = {}
+    start = utime.ticks_us()
+    due = 0
+    for delta, msg in read_trace(path):
+        due += delta
+        if realtime:
+            wait = due - utime.ticks_diff(utime.ticks_us(), start)
+            if wait > 0:
+                utime.sleep_us(wait)
+        t0 = utime.ticks_us()
+        deliver(msg)
+        cost = utime.ticks_diff(utime.ticks_us(), t0)
+        entry = profile.get(msg[0])
+        if entry is None:
+            profile[msg[0]] = [1, cost, cost]
+        else:
+            entry[0] += 1
+            entry[1] += cost
+            if cost > entry[2]:
+                entry[2] = cost
+    return profile